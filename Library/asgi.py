@@ -0,0 +1,13 @@
+"""
+ASGI config for Library project.
+
+It exposes the ASGI callable as a module-level variable named ``application``, see library/asgi.py.
+"""
+
+import os
+
+from library.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Library.settings')
+
+application = get_asgi_application()
@@ -52,12 +52,24 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny'
         # 'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'library.pagination.LibraryPagination',
     'PAGE_SIZE': API_PAGE_SIZE,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # orjson when it is installed, with the same output as DRF's JSONRenderer and JSONParser
+    'DEFAULT_RENDERER_CLASSES': [
+        'library.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'library.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 MIDDLEWARE = [
+    'library.timing.TimingMiddleware',
+    'library.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +77,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'Library.urls'
@@ -103,6 +116,97 @@ DATABASES = {
     }
 }
 
+# Read replicas of the default database as comma separated host[:port][/name], e.g.
+# DB_REPLICAS=replica1.internal,replica2.internal:5433 or DB_REPLICAS=localhost/library_replica for a local copy. Each
+# becomes a database alias replica_1, replica_2, ... with the default's other settings, see library/routers.py.
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), 1):
+    address, _, replica_name = replica.strip().partition('/')
+    replica_host, _, replica_port = address.partition(':')
+    DATABASES['replica_{}'.format(index)] = dict(
+        DATABASES['default'],
+        NAME=replica_name or DATABASES['default']['NAME'],
+        HOST=replica_host,
+        PORT=replica_port,
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['library.routers.ReplicaRouter']
+
+# GET requests to the api read from a random replica, except for STICKY_SECONDS after the client wrote, see
+# library/routers.py
+LIBRARY_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': 5,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Cache of rendered GET responses, see library/cache.py
+LIBRARY_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# How paginated listings are counted: 'exact', 'cached' or 'estimated', see library/counts.py
+LIBRARY_COUNT = {
+    'MODE': 'exact',
+    'TIMEOUT': 300,
+    'ESTIMATE_THRESHOLD': 10000,
+}
+
+# Threads of the ASGI application in Library/asgi.py, see library/asgi.py. QUERY_THREADS 0 runs the queries of a
+# request one after the other.
+LIBRARY_ASGI = {
+    'THREADS': 16,
+    'QUERY_THREADS': 16,
+}
+
+# Sampled per-request query, serialization and render timings, see library/timing.py. 0 turns them off.
+LIBRARY_TIMING = {
+    'SAMPLE_RATE': 0.0,
+    'HEADER': True,
+    'LOG': True,
+}
+
+# cProfile dumps of requests, see library/profiling.py. Set a TOKEN to profile requests sending it in the header.
+LIBRARY_PROFILING = {
+    'ENABLED': False,
+    'HEADER': 'X-Library-Profile',
+    'TOKEN': os.getenv('LIBRARY_PROFILING_TOKEN'),
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_FILES': 50,
+    'MAX_MEGABYTES': 200,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'library.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -26,5 +26,6 @@ router.register(r'books', views.BookViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('cache/stats/', views.cache_stats, name='cache-stats'),
     path('admin/', admin.site.urls),
 ]
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class LibraryConfig(AppConfig):
     name = 'library'
+
+    def ready(self):
+        # Connects the signal receivers
+        from library import signals
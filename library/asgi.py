@@ -0,0 +1,219 @@
+"""
+ASGI application of the api, served from Library/asgi.py by any ASGI server, e.g. `uvicorn Library.asgi:application`.
+
+Django 2.2 has neither async views nor an async ORM, so the event loop does what it can without them: it holds the
+connections, reads request bodies and writes responses, while Django handles each request on a bounded pool of
+threads. Waiting clients and slow readers don't tie up a thread, only the time a request spends in Django does.
+Catalog reads, the concurrent_actions of the viewsets, also get a second pool that the independent queries behind
+their response run on at the same time (see library.parallel): a page's rows and its count, and the authors and
+genres of the books on it.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import Resolver404, get_resolver
+
+from library import parallel
+
+DEFAULTS = {
+    # Threads handling requests, at most as many requests are in Django at once
+    'THREADS': 16,
+    # Threads running the concurrent queries of catalog reads, 0 runs them one after the other. Each thread holds its
+    # own database connection, so the database has to allow THREADS + QUERY_THREADS of them per process.
+    'QUERY_THREADS': 16,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LIBRARY_ASGI', {}))
+    return config
+
+
+def get_asgi_application():
+    """Like django.core.wsgi.get_wsgi_application()"""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
+
+
+class ASGIHandler:
+    """ASGI 3 application running Django's WSGIHandler in threads, see the module docstring"""
+
+    def __init__(self, threads=None, query_threads=None):
+        """
+        :param threads: int or None, LIBRARY_ASGI['THREADS'] if None
+        :param query_threads: int or None, LIBRARY_ASGI['QUERY_THREADS'] if None
+        """
+        config = get_config()
+        threads = config['THREADS'] if threads is None else threads
+        query_threads = config['QUERY_THREADS'] if query_threads is None else query_threads
+        self.wsgi = WSGIHandler()
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='library-request')
+        self.query_executor = (
+            ThreadPoolExecutor(query_threads, thread_name_prefix='library-query') if query_threads else None
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError('Unsupported ASGI scope type {}'.format(scope['type']))
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+        if self.query_executor is not None:
+            self.query_executor.shutdown(wait=True)
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            # The client went away before sending the whole body
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.handle, loop, send, scope, body)
+        finally:
+            body.close()
+
+    @staticmethod
+    async def read_body(receive):
+        """
+        Reads the request body, into a temporary file past FILE_UPLOAD_MAX_MEMORY_SIZE like Django does with uploads
+        :param receive: ASGI receive callable
+        :return: file or None, None if the client disconnected
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, mode='w+b')
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def handle(self, loop, send, scope, body):
+        """
+        Runs the request through Django and sends the response, in a request thread
+        :param loop: event loop the response is sent on
+        :param send: ASGI send callable
+        :param scope: dict, ASGI http scope
+        :param body: file, the request body
+        """
+        def send_message(message):
+            # Waits for each message to be sent, so a streamed response is produced no faster than the client reads it
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        environ = self.get_environ(scope, body)
+        executor = self.query_executor if self.is_catalog_read(environ) else None
+        with parallel.use_executor(executor):
+            response = self.wsgi(environ, start_response)
+            try:
+                status, headers = started
+                send_message({
+                    'type': 'http.response.start',
+                    'status': int(status.split(' ', 1)[0]),
+                    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+                })
+                if scope['method'] == 'HEAD':
+                    send_message({'type': 'http.response.body', 'body': b''})
+                elif getattr(response, 'streaming', True):
+                    for chunk in response:
+                        if chunk:
+                            send_message({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    send_message({'type': 'http.response.body', 'body': b''})
+                else:
+                    send_message({'type': 'http.response.body', 'body': b''.join(response)})
+            finally:
+                # Sends request_finished, which closes the thread's database connections past CONN_MAX_AGE
+                response.close()
+
+    @staticmethod
+    def get_environ(scope, body):
+        """
+        Builds the WSGI environ of an ASGI http scope
+        :param scope: dict
+        :param body: file
+        :return: dict
+        """
+        script_name = scope.get('root_path', '')
+        path = scope['path']
+        if script_name and path.startswith(script_name):
+            path = path[len(script_name):]
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            # WSGI strings are the bytes of the url as latin-1
+            'SCRIPT_NAME': script_name.encode('utf-8').decode('latin-1'),
+            'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+                key = name
+            else:
+                key = 'HTTP_' + name
+            # Repeated headers are joined, like a WSGI server does
+            environ[key] = environ[key] + ',' + value if key in environ else value
+        if 'CONTENT_LENGTH' not in environ:
+            # Chunked bodies have no length, and Django only reads as much of a body as it says
+            environ['CONTENT_LENGTH'] = str(body.seek(0, os.SEEK_END))
+            body.seek(0)
+        return environ
+
+    @staticmethod
+    def is_catalog_read(environ):
+        """
+        Checks whether a request is for one of the concurrent_actions of a viewset
+        :param environ: dict
+        :return: bool
+        """
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return False
+        path = environ['PATH_INFO'].encode('latin-1').decode('utf-8', 'replace')
+        try:
+            match = get_resolver().resolve(path)
+        except Resolver404:
+            return False
+        viewset = getattr(match.func, 'cls', None)
+        actions = getattr(match.func, 'actions', None) or {}
+        return actions.get('get') in getattr(viewset, 'concurrent_actions', ())
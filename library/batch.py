@@ -0,0 +1,244 @@
+"""
+Creates and updates many books in one request, for POST and PATCH /books/bulk/.
+
+Every item is validated first, then all the valid ones are written together in one transaction with a few bulk
+statements per table, whatever the number of books. Invalid items are reported and skipped.
+"""
+from django.db import transaction
+from rest_framework import status
+
+from library import cache
+from library.bulk import bulk_create_with_ids, get_or_create_names
+from library.listing import refresh_listings
+from library.stats import refresh_stats
+from library.models import *
+from library.serializers import BookBatchSerializer, BookValuesSerializer
+from library.signals import after_write
+
+BOOK_FIELDS = [field for field in BookValuesSerializer.book_fields if field != 'id']
+
+RELATIONS = [
+    # field, related model, through model
+    ('author', Author, Book.author.through),
+    ('genre', Genre, Book.genre.through),
+]
+
+
+def result(index, status_code, book_id=None, errors=None):
+    """
+    :return: dict, the result of one item
+    """
+    item = {'index': index, 'status': status_code}
+    if book_id is not None:
+        item['id'] = book_id
+    if errors is not None:
+        item['errors'] = errors
+    return item
+
+
+class BookBatch:
+    """Validates and writes the books of one bulk request"""
+
+    def __init__(self, valid_inventory):
+        """
+        :param valid_inventory: function, takes a dict with owned and available and checks them, see BookViewSet
+        """
+        self.valid_inventory = valid_inventory
+
+    def validate(self, items, partial):
+        """
+        Validates items with BookBatchSerializer
+        :param items: list, request data
+        :param partial: bool, whether fields can be left out
+        :return: (dict, dict), index -> validated data of the valid items and index -> result of the others
+        """
+        valid = {}
+        failed = {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                failed[index] = result(index, status.HTTP_400_BAD_REQUEST, errors={
+                    'non_field_errors': ['Expected a book object.'],
+                })
+                continue
+            serializer = BookBatchSerializer(data=item, partial=partial)
+            if serializer.is_valid():
+                valid[index] = serializer.validated_data
+            else:
+                failed[index] = result(index, status.HTTP_400_BAD_REQUEST, errors=serializer.errors)
+
+        # Related ids have to exist, checked for the whole batch at once
+        for field, model, through in RELATIONS:
+            given = {related for data in valid.values() for related in data.get(field, []) if isinstance(related, int)}
+            existing = set(model.objects.filter(id__in=given).values_list('id', flat=True))
+            for index, data in list(valid.items()):
+                missing = [related for related in data.get(field, []) if isinstance(related, int)
+                           and related not in existing]
+                if missing:
+                    del valid[index]
+                    failed[index] = result(index, status.HTTP_400_BAD_REQUEST, errors={
+                        field: ['{} {} does not exist.'.format(model.__name__, related) for related in missing],
+                    })
+        return valid, failed
+
+    def check_inventory(self, index, inventory, failed):
+        """
+        Applies the valid_inventory rules
+        :param inventory: dict with owned and available
+        :return: bool, False if the item failed and was added to failed
+        """
+        if 'owned' not in inventory or 'available' not in inventory:
+            failed[index] = result(index, status.HTTP_400_BAD_REQUEST, errors={
+                'inventory': ['inventory dictionary with owned and available must be part of the request data'],
+            })
+            return False
+        if not self.valid_inventory(inventory):
+            failed[index] = result(index, status.HTTP_400_BAD_REQUEST, errors={
+                'inventory': ['Invalid owned or available.'],
+            })
+            return False
+        return True
+
+    def create(self, items):
+        """
+        Creates a book with its inventory, authors and genres for every valid item
+        :param items: list, request data
+        :return: list of dict, the result of each item in order
+        """
+        valid, failed = self.validate(items, partial=False)
+        for index, data in list(valid.items()):
+            if not self.check_inventory(index, data.get('inventory', {}), failed):
+                del valid[index]
+
+        created = {}
+        if valid:
+            with transaction.atomic():
+                indexes = sorted(valid)
+                books = bulk_create_with_ids(Book, [
+                    Book(**{field: valid[index][field] for field in BOOK_FIELDS if field in valid[index]})
+                    for index in indexes
+                ])
+                Inventory.objects.bulk_create([
+                    Inventory(book_id=book.id, **valid[index]['inventory']) for index, book in zip(indexes, books)
+                ])
+                created = {index: book.id for index, book in zip(indexes, books)}
+
+                related_ids = self.set_links({created[index]: valid[index] for index in indexes})
+                self.after_write(list(created.values()), related_ids)
+
+        return [
+            result(index, status.HTTP_201_CREATED, book_id=created[index]) if index in created else failed[index]
+            for index in range(len(items))
+        ]
+
+    def update(self, items):
+        """
+        Updates the fields given by every valid item, which must have the id of an existing book. Giving author or
+        genre replaces the book's authors or genres.
+        :param items: list, request data
+        :return: list of dict, the result of each item in order
+        """
+        valid, failed = self.validate(items, partial=True)
+
+        ids = [data['id'] for data in valid.values() if 'id' in data]
+        books = Book.objects.in_bulk(ids)
+        inventories = {inventory.book_id: inventory for inventory in Inventory.objects.filter(book_id__in=ids)}
+
+        seen = set()
+        for index, data in sorted(valid.items()):
+            book_id = data.get('id')
+            if book_id is None:
+                failed[index] = result(index, status.HTTP_400_BAD_REQUEST, errors={'id': ['This field is required.']})
+            elif book_id not in books:
+                failed[index] = result(index, status.HTTP_404_NOT_FOUND, errors={
+                    'id': ['Book {} does not exist.'.format(book_id)],
+                })
+            elif book_id in seen:
+                failed[index] = result(index, status.HTTP_400_BAD_REQUEST, errors={
+                    'id': ['Book {} appears more than once.'.format(book_id)],
+                })
+            elif 'inventory' in data:
+                current = inventories.get(book_id)
+                inventory = {'owned': current.owned, 'available': current.available} if current else {}
+                inventory.update(data['inventory'])
+                if self.check_inventory(index, inventory, failed):
+                    data['inventory'] = inventory
+            if index in failed:
+                del valid[index]
+            else:
+                seen.add(book_id)
+
+        if valid:
+            with transaction.atomic():
+                updates = {data['id']: data for data in valid.values()}
+                fields = sorted({field for data in updates.values() for field in BOOK_FIELDS if field in data})
+                for book_id, data in updates.items():
+                    for field in fields:
+                        if field in data:
+                            setattr(books[book_id], field, data[field])
+                if fields:
+                    Book.objects.bulk_update([books[book_id] for book_id in updates], fields)
+
+                changed = []
+                new = []
+                for book_id, data in updates.items():
+                    if 'inventory' not in data:
+                        continue
+                    if book_id in inventories:
+                        inventories[book_id].owned = data['inventory']['owned']
+                        inventories[book_id].available = data['inventory']['available']
+                        changed.append(inventories[book_id])
+                    else:
+                        new.append(Inventory(book_id=book_id, **data['inventory']))
+                if changed:
+                    Inventory.objects.bulk_update(changed, ['owned', 'available'])
+                Inventory.objects.bulk_create(new)
+
+                # Books that lose an author or genre change its listings too
+                old_related = {field: cache.related_ids(through, field, updates) for field, model, through in RELATIONS}
+                related_ids = self.set_links(updates)
+                for field in old_related:
+                    related_ids[field] |= old_related[field]
+                self.after_write(list(updates), related_ids)
+
+        return [
+            result(index, status.HTTP_200_OK, book_id=valid[index]['id']) if index in valid else failed[index]
+            for index in range(len(items))
+        ]
+
+    def set_links(self, books):
+        """
+        Replaces the authors and genres of the books that give them
+        :param books: dict, book id -> validated data
+        :return: dict, 'author' and 'genre' -> set of the ids linked, and 'named' -> bool, whether any were given by
+            name, and so may have been created
+        """
+        linked = {'named': False}
+        for field, model, through in RELATIONS:
+            given = {book_id: data[field] for book_id, data in books.items() if field in data}
+            names = {related for values in given.values() for related in values if isinstance(related, str)}
+            ids = get_or_create_names(model, {}, names) if names else {}
+            linked['named'] = linked['named'] or bool(names)
+
+            rows = []
+            for book_id, values in given.items():
+                # dict.fromkeys() drops repeats but keeps the order
+                for related_id in dict.fromkeys(ids.get(value, value) for value in values):
+                    rows.append(through(book_id=book_id, **{field + '_id': related_id}))
+            through.objects.filter(book_id__in=list(given)).delete()
+            through.objects.bulk_create(rows)
+            linked[field] = {getattr(row, field + '_id') for row in rows}
+        return linked
+
+    def after_write(self, book_ids, related_ids):
+        """
+        Updates what the bulk statements bypassed the signals of: the listings, the author and genre stats and the
+        response cache
+        :param book_ids: list of int
+        :param related_ids: dict, as returned by set_links()
+        """
+        refresh_listings(book_ids)
+        refresh_stats(related_ids['author'], related_ids['genre'])
+        after_write(cache.invalidate_books, book_ids, related_ids['author'], related_ids['genre'])
+        after_write(cache.invalidate_stats, related_ids['author'], related_ids['genre'])
+        if related_ids['named']:
+            after_write(cache.invalidate, 'author:list', 'genre:list')
@@ -0,0 +1,135 @@
+"""
+Benchmark suites, run with `python manage.py benchmark <suite>`.
+Each suite module has add_arguments(parser) and run(**options), which returns a JSON serializable report.
+"""
+import math
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from library.listing import refresh_listings
+from library.models import *
+
+
+@contextmanager
+def benchmark_database(keepdb=False):
+    """
+    Runs the block against a throwaway test database, like the test runner does, so that benchmarks never touch the
+    configured database. Also sets up the test environment, so the test client can be used.
+    :param keepdb: bool, reuse the test database between runs
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite' and not old_test_name:
+        # SQLite's default in-memory test database fails writes from concurrent threads instead of waiting for them
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), 'library_benchmark.sqlite3')
+
+    setup_test_environment(debug=False)
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+        test_settings['NAME'] = old_test_name
+
+
+def seed_catalog(books, authors=None, genres=50, seed=0):
+    """
+    Fills the database with a synthetic catalog. Every book gets one to three authors, one to three genres and an
+    Inventory, and a description a few hundred characters long.
+    :param books: int, number of books
+    :param authors: int or None, number of authors, defaults to a third of books
+    :param genres: int, number of genres
+    :param seed: int, seed for the random generator, the same seed gives the same catalog
+    :return: list of int, ids of the books created
+    """
+    rng = random.Random(seed)
+    authors = authors or max(books // 3, 1)
+
+    Author.objects.bulk_create(Author(name='Author {}'.format(i)) for i in range(authors))
+    Genre.objects.bulk_create(Genre(name='Genre {}'.format(i)) for i in range(genres))
+    author_ids = list(Author.objects.order_by('-id').values_list('id', flat=True)[:authors])
+    genre_ids = list(Genre.objects.order_by('-id').values_list('id', flat=True)[:genres])
+
+    types = [choice for choice, label in Book.TYPES]
+    Book.objects.bulk_create((
+        Book(
+            isbn='9.78E+12',
+            title='Book {}'.format(i),
+            type=rng.choice(types),
+            edition='{}th'.format(rng.randint(1, 9)),
+            pages=rng.randint(50, 1200),
+            rating=round(rng.uniform(1, 5), 2),
+            rating_count=rng.randint(0, 100000),
+            review_count=rng.randint(0, 10000),
+            image_url='https://example.com/{}.jpg'.format(i),
+            description=' '.join('word{}'.format(rng.randint(0, 5000)) for _ in range(rng.randint(20, 120))),
+        ) for i in range(books)
+    ), batch_size=500)
+    book_ids = sorted(Book.objects.order_by('-id').values_list('id', flat=True)[:books])
+
+    book_authors = []
+    book_genres = []
+    inventories = []
+    for book_id in book_ids:
+        for author_id in rng.sample(author_ids, min(rng.randint(1, 3), len(author_ids))):
+            book_authors.append(Book.author.through(book_id=book_id, author_id=author_id))
+        for genre_id in rng.sample(genre_ids, min(rng.randint(1, 3), len(genre_ids))):
+            book_genres.append(Book.genre.through(book_id=book_id, genre_id=genre_id))
+        owned = rng.randint(1, 5)
+        inventories.append(Inventory(book_id=book_id, owned=owned, available=rng.randint(0, owned)))
+
+    Book.author.through.objects.bulk_create(book_authors, batch_size=500)
+    Book.genre.through.objects.bulk_create(book_genres, batch_size=500)
+    Inventory.objects.bulk_create(inventories, batch_size=500)
+    # bulk_create() doesn't send the signals that keep the listings up to date
+    refresh_listings(book_ids)
+    return book_ids
+
+
+def time_calls(func, repeat):
+    """
+    Calls func repeat times
+    :return: list of float, seconds taken by each call
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, percent):
+    """
+    Nearest rank percentile
+    :param samples: list of float
+    :param percent: float, between 0 and 100
+    :return: float
+    """
+    ordered = sorted(samples)
+    index = max(math.ceil(percent / 100.0 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(samples):
+    """
+    Summarizes timings in milliseconds
+    :param samples: list of float, seconds
+    :return: dict
+    """
+    return {
+        'runs': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'min_ms': round(min(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
@@ -0,0 +1,230 @@
+"""Load test of the REST API: drives list, detail, filter, ordering, nested and write requests through the WSGI app"""
+import io
+import json
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import urlencode
+
+from django.db import connection
+
+from Library.wsgi import application
+
+from library import cache
+from library.benchmarks import percentile, seed_catalog
+from library.models import *
+
+
+def add_arguments(parser):
+    parser.add_argument('--books', type=int, default=2000, help='books in the seeded catalog')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario, spread over the workers')
+    parser.add_argument('--warmup', type=int, default=10, help='requests per scenario before timing starts')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the catalog and the requests made')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help='scenarios to run, all by default')
+
+
+class Catalog:
+    """Ids and names of the seeded catalog, which scenarios pick their requests from"""
+
+    def __init__(self, book_ids):
+        self.book_ids = book_ids
+        self.author_ids = list(Author.objects.order_by('id').values_list('id', flat=True))
+        self.author_names = list(Author.objects.order_by('id').values_list('name', flat=True))
+        self.genre_ids = list(Genre.objects.order_by('id').values_list('id', flat=True))
+        self.types = [choice for choice, label in Book.TYPES]
+
+
+# Each scenario picks a request with rng: (method, path, query dict, JSON body or None)
+def book_list(rng, catalog):
+    return 'GET', '/books/', {'page': rng.randint(1, 5)}, None
+
+
+def book_detail(rng, catalog):
+    return 'GET', '/books/{}/'.format(rng.choice(catalog.book_ids)), {}, None
+
+
+def book_filter(rng, catalog):
+    if rng.random() < 0.5:
+        return 'GET', '/books/', {'type': rng.choice(catalog.types)}, None
+    return 'GET', '/books/', {'author__name': rng.choice(catalog.author_names)}, None
+
+
+def book_ordering(rng, catalog):
+    ordering = rng.choice(['title', 'pages', 'rating', 'edition'])
+    return 'GET', '/books/', {'ordering': rng.choice([ordering, '-' + ordering])}, None
+
+
+def nested(rng, catalog):
+    if rng.random() < 0.5:
+        return 'GET', '/authors/{}/books/'.format(rng.choice(catalog.author_ids)), {}, None
+    return 'GET', '/genres/{}/books/'.format(rng.choice(catalog.genre_ids)), {}, None
+
+
+def write(rng, catalog):
+    roll = rng.random()
+    if roll < 0.4:
+        return 'POST', '/books/', {}, {
+            'title': 'Load {}'.format(rng.randint(0, 10 ** 9)),
+            'type': rng.choice(catalog.types),
+            'rating': round(rng.uniform(1, 5), 2),
+            'author': [rng.choice(catalog.author_ids)],
+            'genre': [rng.choice(catalog.genre_ids)],
+            'inventory': {'owned': 2, 'available': 2},
+        }
+    if roll < 0.8:
+        return 'PATCH', '/books/{}/'.format(rng.choice(catalog.book_ids)), {}, {
+            'rating': round(rng.uniform(1, 5), 2),
+        }
+    return 'POST', '/books/{}/checkout/'.format(rng.choice(catalog.book_ids)), {}, None
+
+
+SCENARIOS = OrderedDict([
+    ('list', book_list),
+    ('detail', book_detail),
+    ('filter', book_filter),
+    ('ordering', book_ordering),
+    ('nested', nested),
+    ('write', write),
+])
+
+
+def wsgi_request(method, path, query, body):
+    """
+    Calls the WSGI app the way a server would, middleware included
+    :return: (int, bytes), the status code and the response body
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(query),
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(payload),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    try:
+        content = b''.join(response)
+    finally:
+        # Sends request_finished, like a server does once the body is written
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split(' ', 1)[0]), content
+
+
+def run_scenario(scenario, catalog, workers, requests, warmup, seed):
+    """
+    Makes requests from workers threads at once
+    :param scenario: function, see SCENARIOS
+    :return: dict
+    """
+    latencies = []
+    queries = []
+    statuses = Counter()
+    errors = []
+    failures = []
+    lock = threading.Lock()
+
+    def worker(index, count, timed):
+        rng = random.Random('{}-{}-{}'.format(seed, scenario.__name__, index))
+        query_count = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            query_count[0] += 1
+            return execute(sql, params, many, context)
+
+        try:
+            # Connections are per thread, so this only counts this worker's queries
+            with connection.execute_wrapper(count_queries):
+                for _ in range(count):
+                    request = scenario(rng, catalog)
+                    query_count[0] = 0
+                    start = time.perf_counter()
+                    try:
+                        status, content = wsgi_request(*request)
+                    except Exception as e:
+                        with lock:
+                            errors.append(repr(e))
+                        continue
+                    elapsed = time.perf_counter() - start
+                    if timed:
+                        with lock:
+                            latencies.append(elapsed)
+                            queries.append(query_count[0])
+                            statuses[status] += 1
+                            if status >= 500 and not failures:
+                                failures.append('{} {} -> {} {}'.format(request[0], request[1], status, content[:500]))
+        finally:
+            connection.close()
+
+    def run_workers(count, timed):
+        threads = [
+            threading.Thread(target=worker, args=(index, count // workers + (index < count % workers), timed))
+            for index in range(workers)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    if warmup:
+        run_workers(warmup, False)
+        del errors[:]
+    elapsed = run_workers(requests, True)
+
+    result = OrderedDict([
+        ('requests', len(latencies)),
+        ('seconds', round(elapsed, 3)),
+        ('requests_per_second', round(len(latencies) / elapsed, 1)),
+    ])
+    if latencies:
+        result.update([
+            ('mean_ms', round(sum(latencies) / len(latencies) * 1000, 3)),
+            ('p50_ms', round(percentile(latencies, 50) * 1000, 3)),
+            ('p95_ms', round(percentile(latencies, 95) * 1000, 3)),
+            ('p99_ms', round(percentile(latencies, 99) * 1000, 3)),
+            ('max_ms', round(max(latencies) * 1000, 3)),
+            ('queries_per_request', round(sum(queries) / len(queries), 2)),
+            ('max_queries', max(queries)),
+        ])
+    result['status_codes'] = OrderedDict((str(status), statuses[status]) for status in sorted(statuses))
+    result['errors'] = len(errors)
+    result['first_error'] = errors[0] if errors else None
+    result['first_server_error'] = failures[0] if failures else None
+    return result
+
+
+def run(books, workers, requests, warmup, seed, scenarios, **options):
+    catalog = Catalog(seed_catalog(books, seed=seed))
+
+    report = OrderedDict([
+        ('suite', 'api'),
+        ('database', connection.vendor),
+        ('response_cache', cache.enabled()),
+        ('books', books),
+        ('workers', workers),
+        ('requests', requests),
+        ('seed', seed),
+        ('scenarios', OrderedDict()),
+    ])
+    for name in scenarios:
+        report['scenarios'][name] = run_scenario(SCENARIOS[name], catalog, workers, requests, warmup, seed)
+    return report
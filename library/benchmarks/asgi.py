@@ -0,0 +1,188 @@
+"""
+Throughput of catalog reads from many concurrent connections, through the WSGI app and the ASGI app (Library/asgi.py)
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from library import cache
+from library.asgi import ASGIHandler
+from library.benchmarks import percentile, seed_catalog
+from library.benchmarks.api import SCENARIOS, Catalog, wsgi_request
+
+# Only reads, the ASGI app runs writes exactly like the WSGI one
+READ_SCENARIOS = ['list', 'detail', 'filter', 'ordering', 'nested']
+
+
+def add_arguments(parser):
+    parser.add_argument('--books', type=int, default=2000, help='books in the seeded catalog')
+    parser.add_argument('--connections', type=int, default=64, help='concurrent client connections')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='threads handling requests, of the WSGI server and of the ASGI app alike')
+    parser.add_argument('--query-threads', type=int, default=8,
+                        help='threads of the ASGI app running the concurrent queries of a request')
+    parser.add_argument('--requests', type=int, default=400, help='requests per scenario and app')
+    parser.add_argument('--warmup', type=int, default=20, help='requests per scenario and app before timing starts')
+    parser.add_argument('--latency', type=float, default=2.0,
+                        help='milliseconds added to every query, the round trip to a database on another host')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the catalog and the requests made')
+    parser.add_argument('--scenarios', nargs='+', choices=READ_SCENARIOS, default=READ_SCENARIOS,
+                        help='scenarios to run, all by default')
+
+
+class QueryLatency:
+    """Delays every query of every connection, including the ones threads open later"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def add(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        if self.seconds:
+            connection_created.connect(self.add)
+            connection.execute_wrappers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.add)
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+
+async def asgi_request(app, method, path, query, body):
+    """
+    Calls the ASGI app the way a server would
+    :return: (int, bytes), the status code and the response body
+    """
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'root_path': '',
+        'query_string': urlencode(query).encode('ascii'),
+        'headers': [
+            (b'host', b'testserver'),
+            (b'accept', b'application/json'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode()),
+        ],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }
+    received = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    status = []
+    content = []
+
+    async def receive():
+        return received.pop() if received else {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        else:
+            content.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return status[0], b''.join(content)
+
+
+async def run_clients(request, scenario, catalog, connections, count, seed):
+    """
+    Makes count requests from connections clients at once, each sending its next request once it has a response
+    :param request: coroutine function, (method, path, query, body) -> (status, content)
+    :return: (float, list of float, Counter), seconds taken, latencies and status codes
+    """
+    latencies = []
+    statuses = Counter()
+
+    async def client(index, requests):
+        rng = random.Random('{}-{}-{}'.format(seed, scenario.__name__, index))
+        for _ in range(requests):
+            start = time.perf_counter()
+            status, content = await request(*scenario(rng, catalog))
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(index, count // connections + (index < count % connections)) for index in range(connections)
+    ])
+    return time.perf_counter() - start, latencies, statuses
+
+
+def summarize_run(elapsed, latencies, statuses):
+    return OrderedDict([
+        ('requests', len(latencies)),
+        ('seconds', round(elapsed, 3)),
+        ('requests_per_second', round(len(latencies) / elapsed, 1)),
+        ('p50_ms', round(percentile(latencies, 50) * 1000, 3)),
+        ('p95_ms', round(percentile(latencies, 95) * 1000, 3)),
+        ('p99_ms', round(percentile(latencies, 99) * 1000, 3)),
+        ('status_codes', OrderedDict((str(status), statuses[status]) for status in sorted(statuses))),
+    ])
+
+
+async def run_scenario(scenario, catalog, connections, threads, query_threads, requests, warmup, seed):
+    loop = asyncio.get_running_loop()
+    # A threaded WSGI server: connections wait for one of its threads to be free
+    wsgi_threads = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+    asgi_app = ASGIHandler(threads=threads, query_threads=query_threads)
+
+    async def wsgi(*request):
+        return await loop.run_in_executor(wsgi_threads, wsgi_request, *request)
+
+    async def asgi(*request):
+        return await asgi_request(asgi_app, *request)
+
+    result = OrderedDict()
+    try:
+        for name, request in [('wsgi', wsgi), ('asgi', asgi)]:
+            if warmup:
+                await run_clients(request, scenario, catalog, connections, warmup, seed)
+            result[name] = summarize_run(*await run_clients(request, scenario, catalog, connections, requests, seed))
+    finally:
+        wsgi_threads.shutdown()
+        asgi_app.shutdown()
+    result['speedup'] = round(result['asgi']['requests_per_second'] / result['wsgi']['requests_per_second'], 2)
+    return result
+
+
+def run(books, connections, threads, query_threads, requests, warmup, latency, seed, scenarios, **options):
+    catalog = Catalog(seed_catalog(books, seed=seed))
+
+    report = OrderedDict([
+        ('suite', 'asgi'),
+        ('database', connection.vendor),
+        ('response_cache', cache.enabled()),
+        ('books', books),
+        ('connections', connections),
+        ('threads', threads),
+        ('query_threads', query_threads),
+        ('latency_ms', latency),
+        ('requests', requests),
+        ('seed', seed),
+        ('scenarios', OrderedDict()),
+    ])
+    with QueryLatency(latency / 1000):
+        for name in scenarios:
+            report['scenarios'][name] = asyncio.run(run_scenario(
+                SCENARIOS[name], catalog, connections, threads, query_threads, requests, warmup, seed,
+            ))
+    return report
@@ -0,0 +1,106 @@
+"""Compares checking books out with POST /books/<id>/checkout/ against reading and PATCHing the inventory"""
+import threading
+import time
+
+from django.db import connection
+from rest_framework.test import APIClient
+
+from library.benchmarks import seed_catalog
+from library.listing import refresh_listings
+from library.models import *
+
+
+def add_arguments(parser):
+    parser.add_argument('--threads', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--checkouts', type=int, default=400, help='checkouts per path, spread over the threads')
+    parser.add_argument('--books', type=int, default=1, help='books the checkouts are spread over')
+
+
+def patch_checkout(client, book_id):
+    """
+    Checks a copy out the way clients had to before the checkout action: read the inventory, write it back minus one
+    :return: bool, whether the client believes it took a copy
+    """
+    available = client.get('/books/{}/'.format(book_id)).data['inventory']['available']
+    if available < 1:
+        return False
+    response = client.patch('/books/{}/'.format(book_id), {'inventory': {'available': available - 1}}, format='json')
+    return response.status_code == 204
+
+
+def post_checkout(client, book_id):
+    """
+    Checks a copy out with the checkout action
+    :return: bool, whether a copy was taken
+    """
+    return client.post('/books/{}/checkout/'.format(book_id)).status_code == 200
+
+
+def run_path(checkout, book_ids, threads, checkouts):
+    """
+    Runs checkouts from threads at once against books that have a copy for every checkout
+    :param checkout: patch_checkout or post_checkout
+    :return: dict
+    """
+    Inventory.objects.filter(book_id__in=book_ids).update(owned=checkouts, available=checkouts)
+    refresh_listings(book_ids)
+
+    taken = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = APIClient()
+        try:
+            for i in range(checkouts // threads):
+                book_id = book_ids[(index + i) % len(book_ids)]
+                try:
+                    succeeded = checkout(client, book_id)
+                except Exception as e:
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                with lock:
+                    taken.append(succeeded)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    remaining = sum(Inventory.objects.filter(book_id__in=book_ids).values_list('available', flat=True))
+    removed = checkouts * len(book_ids) - remaining
+    return {
+        'requests': len(taken) + len(errors),
+        'seconds': round(elapsed, 3),
+        'checkouts_per_second': round(taken.count(True) / elapsed, 1),
+        'succeeded': taken.count(True),
+        'copies_taken': removed,
+        # Checkouts that reported success but didn't take a copy. Negative when requests failed after writing.
+        'lost_updates': taken.count(True) - removed,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def run(threads, checkouts, books, **options):
+    book_ids = seed_catalog(books)
+
+    report = {
+        'suite': 'checkout',
+        'database': connection.vendor,
+        'threads': threads,
+        'checkouts': checkouts,
+        'books': books,
+        'patch': run_path(patch_checkout, book_ids, threads, checkouts),
+        'checkout': run_path(post_checkout, book_ids, threads, checkouts),
+    }
+    report['speedup'] = round(
+        report['checkout']['checkouts_per_second'] / max(report['patch']['checkouts_per_second'], 0.1), 2,
+    )
+    return report
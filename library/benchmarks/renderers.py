@@ -0,0 +1,51 @@
+"""Compares DRF's JSONRenderer and JSONParser with FastJSONRenderer and FastJSONParser on pages of books"""
+import io
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from library.benchmarks import seed_catalog, summarize, time_calls
+from library.models import *
+from library.parsers import FastJSONParser
+from library.renderers import FastJSONRenderer, orjson
+from library.serializers import *
+
+
+def add_arguments(parser):
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25, 100, 1000], help='page sizes')
+    parser.add_argument('--repeat', type=int, default=50, help='runs per page size and renderer')
+
+
+def page(size):
+    """A page of books the way the api lists them, serialized but not rendered"""
+    rows = list(BookListing.objects.order_by('id').values(*BookListingSerializer.columns)[:size])
+    return {'count': size, 'next': None, 'previous': None, 'results': BookListingSerializer(rows, many=True).data}
+
+
+def run(sizes, repeat, **options):
+    seed_catalog(max(sizes))
+
+    report = {'suite': 'renderers', 'orjson': orjson is not None, 'repeat': repeat, 'results': []}
+    for size in sizes:
+        data = page(size)
+        expected = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != expected:
+            raise AssertionError('FastJSONRenderer output differs from JSONRenderer at page size {}'.format(size))
+        if FastJSONParser().parse(io.BytesIO(expected)) != JSONParser().parse(io.BytesIO(expected)):
+            raise AssertionError('FastJSONParser output differs from JSONParser at page size {}'.format(size))
+
+        render = summarize(time_calls(lambda: JSONRenderer().render(data), repeat))
+        fast_render = summarize(time_calls(lambda: FastJSONRenderer().render(data), repeat))
+        parse = summarize(time_calls(lambda: JSONParser().parse(io.BytesIO(expected)), repeat))
+        fast_parse = summarize(time_calls(lambda: FastJSONParser().parse(io.BytesIO(expected)), repeat))
+        report['results'].append({
+            'page_size': size,
+            'bytes': len(expected),
+            'json_renderer': render,
+            'fast_json_renderer': fast_render,
+            'render_speedup': round(render['p50_ms'] / fast_render['p50_ms'], 2),
+            'json_parser': parse,
+            'fast_json_parser': fast_parse,
+            'parse_speedup': round(parse['p50_ms'] / fast_parse['p50_ms'], 2),
+        })
+    return report
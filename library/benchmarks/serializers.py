@@ -0,0 +1,54 @@
+"""Compares BookSerializer with BookValuesSerializer and BookListingSerializer on pages of books"""
+from rest_framework.renderers import JSONRenderer
+
+from library.benchmarks import seed_catalog, summarize, time_calls
+from library.models import *
+from library.serializers import *
+
+
+def add_arguments(parser):
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25, 100, 250, 1000], help='page sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='runs per page size and serializer')
+
+
+def model_page(size):
+    """Fetches and renders a page of books the way BookSerializer is used"""
+    books = list(Book.objects.with_related().order_by('id')[:size])
+    return JSONRenderer().render(BookSerializer(books, many=True).data)
+
+
+def values_page(size):
+    """Fetches and renders a page of books the way BookValuesSerializer is used"""
+    rows = list(Book.objects.order_by('id').values(*BookValuesSerializer.columns)[:size])
+    return JSONRenderer().render(BookValuesSerializer(rows, many=True).data)
+
+
+def listing_page(size):
+    """Fetches and renders a page of books from BookListing"""
+    rows = list(BookListing.objects.order_by('id').values(*BookListingSerializer.columns)[:size])
+    return JSONRenderer().render(BookListingSerializer(rows, many=True).data)
+
+
+def run(sizes, repeat, **options):
+    seed_catalog(max(sizes))
+
+    report = {'suite': 'serializers', 'repeat': repeat, 'results': []}
+    for size in sizes:
+        expected = model_page(size)
+        if values_page(size) != expected:
+            raise AssertionError('BookValuesSerializer output differs from BookSerializer at page size {}'.format(size))
+        if listing_page(size) != expected:
+            raise AssertionError('BookListingSerializer output differs from BookSerializer at page size {}'.format(size))
+
+        model = summarize(time_calls(lambda: model_page(size), repeat))
+        values = summarize(time_calls(lambda: values_page(size), repeat))
+        listing = summarize(time_calls(lambda: listing_page(size), repeat))
+        report['results'].append({
+            'page_size': size,
+            'book_serializer': model,
+            'book_values_serializer': values,
+            'book_listing_serializer': listing,
+            'speedup': round(model['p50_ms'] / values['p50_ms'], 2),
+            'listing_speedup': round(model['p50_ms'] / listing['p50_ms'], 2),
+        })
+    return report
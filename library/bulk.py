@@ -0,0 +1,132 @@
+"""Helpers for writing many rows at once, for the loaders and other writes that bypass save() and its signals"""
+import time
+
+from django.db import connections, router
+from django.db.models import Max
+
+
+def bulk_create_with_ids(model, objs, batch_size=None):
+    """
+    bulk_create() that always sets the primary keys of the objects it creates, so they can be linked to afterwards.
+    Backends that return ids from a bulk insert (PostgreSQL) fill them in themselves. Elsewhere the ids are allocated
+    after the current largest one, which is only safe inside a transaction with no other writers to the table, and a
+    racing insert makes the bulk insert fail on the primary key rather than link the wrong rows.
+    :param model: Model class with an auto primary key
+    :param objs: iterable of unsaved model instances without a primary key
+    :param batch_size: int or None, passed to bulk_create
+    :return: list of model instances
+    """
+    objs = list(objs)
+    connection = connections[router.db_for_write(model)]
+    if objs and not connection.features.can_return_ids_from_bulk_insert:
+        last_id = model.objects.aggregate(last_id=Max('pk'))['last_id'] or 0
+        for offset, obj in enumerate(objs, 1):
+            obj.pk = last_id + offset
+    return model.objects.bulk_create(objs, batch_size=batch_size)
+
+
+def chunks(items, size):
+    """
+    Splits items into lists of at most size items
+    :param items: iterable
+    :param size: int
+    :return: generator of lists
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def find_names(model, names):
+    """
+    Looks up Authors or Genres by name
+    :param model: Author or Genre
+    :param names: iterable of str
+    :return: dict, name -> lowest id with that name, for the names that exist
+    """
+    ids = {}
+    # Chunked to stay under the limit on query parameters
+    for chunk in chunks(names, 500):
+        ids.update(model.objects.filter(name__in=chunk).order_by('-id').values_list('name', 'id'))
+    return ids
+
+
+def get_or_create_names(model, known, names):
+    """
+    Gets the ids of the Authors or Genres named names, creating the ones that don't exist yet with one bulk insert.
+    Like get_or_create(), the lowest id is used when names aren't unique.
+    :param model: Author or Genre
+    :param known: dict, name -> id of the ones already looked up
+    :param names: set of str
+    :return: dict, name -> id of the ones in names
+    """
+    ids = {name: known[name] for name in names if name in known}
+    missing = set(names) - set(ids)
+    if missing:
+        ids.update(find_names(model, missing))
+    missing = sorted(missing - set(ids))
+    if missing:
+        model.objects.bulk_create([model(name=name) for name in missing])
+        ids.update(find_names(model, missing))
+    return ids
+
+
+class Progress:
+    """Reports the throughput of a long running load and how long it has left, estimated from the bytes read"""
+
+    def __init__(self, total_bytes, interval=5):
+        """
+        :param total_bytes: int, size of the input
+        :param interval: float, seconds between reports
+        """
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.rows = 0
+        self.position = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    def update(self, rows, position):
+        """
+        Records that rows more rows are done, reporting if the last report is more than interval seconds old
+        :param rows: int
+        :param position: int, bytes of the input read so far
+        """
+        self.rows += rows
+        self.position = position
+        if time.perf_counter() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self):
+        now = time.perf_counter()
+        self.last_report = now
+        elapsed = max(now - self.start, 1e-9)
+        done = self.position / self.total_bytes if self.total_bytes else 1.0
+        eta = elapsed / done * (1 - done) if done else None
+
+        print('{} rows, {:.1%}, {:.0f} rows/s, {} elapsed, {} left'.format(
+            self.rows,
+            done,
+            self.rows / elapsed,
+            format_duration(elapsed),
+            format_duration(eta) if eta is not None else 'unknown',
+        ), flush=True)
+
+
+def format_duration(seconds):
+    """
+    :param seconds: float
+    :return: str, e.g. '1h02m03s'
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '{}h{:02d}m{:02d}s'.format(hours, minutes, seconds)
+    if minutes:
+        return '{}m{:02d}s'.format(minutes, seconds)
+    return '{}s'.format(seconds)
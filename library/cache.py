@@ -0,0 +1,404 @@
+"""
+Server-side cache of rendered GET responses.
+
+Entries are tagged with what they depend on: the resource they list or show ('book:list', 'author:3') and every book,
+author and genre that appears in them ('book:7', 'genre:2'). Each tag has a version token, and an entry is only served
+while all of its tags still have the versions they had when it was stored, so a write just replaces the tokens of the
+tags it affects (see library.signals) and never has to find the entries themselves.
+
+Entries also hold their content compressed with gzip, and with brotli when it is installed, so that clients that
+accept either get it without compressing the content on every request. The variants are compressed when an entry is
+stored and replaced with it, i.e. only after it was invalidated or expired.
+"""
+import gzip
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+
+from library.models import *
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Alias in CACHES
+    'ALIAS': 'default',
+    # Seconds an entry is kept. Also bounds how long a write racing a cache fill can leave a stale entry behind.
+    'TIMEOUT': 300,
+    'KEY_PREFIX': 'library',
+    # Entries shorter than this many bytes aren't compressed, like GZipMiddleware's 200
+    'COMPRESS_MIN_LENGTH': 200,
+    # Variants are compressed once per entry, so slower, smaller settings than per response compression pay off
+    'GZIP_LEVEL': 9,
+    'BROTLI_QUALITY': 9,
+}
+
+# Every entry depends on this tag, so replacing it invalidates the whole cache
+ALL = 'all'
+
+# Headers of a cached response that are replayed on a hit
+CACHED_HEADERS = ['Content-Type', 'Vary', 'Allow']
+
+# Content codings of the compressed variants, preferred first when a client accepts several equally
+ENCODINGS = ['br', 'gzip']
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LIBRARY_RESPONSE_CACHE', {}))
+    return config
+
+
+def enabled():
+    return get_config()['ENABLED']
+
+
+def get_cache():
+    return caches[get_config()['ALIAS']]
+
+
+def make_key(*parts):
+    return ':'.join([get_config()['KEY_PREFIX']] + [str(part) for part in parts])
+
+
+def response_key(request):
+    """
+    Builds the cache key of a request from its scheme, host, path, query parameters sorted by name and Accept header.
+    Responses hold absolute links, e.g. the next and previous pages, so each scheme and host gets its own entries.
+    :param request: HttpRequest
+    :return: str
+    """
+    params = sorted((key, value) for key in request.GET for value in request.GET.getlist(key))
+    identity = '{}://{}{}?{}|{}'.format(
+        request.scheme, request.get_host(), request.path, urlencode(params), request.META.get('HTTP_ACCEPT', ''),
+    )
+    return make_key('response', hashlib.md5(identity.encode('utf-8')).hexdigest())
+
+
+def tag_key(tag):
+    return make_key('tag', tag)
+
+
+def new_version():
+    # Random rather than a counter, so a tag that was evicted and recreated never matches an old entry
+    return uuid.uuid4().hex
+
+
+def get_versions(tags):
+    """
+    Gets the current version of each tag, creating the ones that don't have a version yet
+    :param tags: iterable of str
+    :return: dict, tag -> version
+    """
+    cache = get_cache()
+    keys = {tag_key(tag): tag for tag in tags}
+    found = cache.get_many(keys.keys())
+
+    versions = {}
+    for key, tag in keys.items():
+        if key not in found:
+            # add() loses to a concurrent add(), in which case the winner's version is the one to use
+            cache.add(key, new_version(), None)
+            found[key] = cache.get(key)
+        versions[tag] = found[key]
+    return versions
+
+
+def invalidate(*tags):
+    """
+    Invalidates every cached response tagged with any of tags
+    :param tags: str
+    """
+    if not enabled() or not tags:
+        return
+    versions = {tag_key(tag): new_version() for tag in set(tags)}
+    versions[make_key('last_write')] = time.time()
+    get_cache().set_many(versions, None)
+
+
+def last_write():
+    """
+    :return: float, when the last invalidation happened as a timestamp, 0 if never or it was evicted
+    """
+    return get_cache().get(make_key('last_write'), 0)
+
+
+def invalidate_all():
+    invalidate(ALL)
+
+
+def related_ids(through, field, book_ids):
+    """
+    Gets the ids on the other side of a Book many to many relation
+    :param through: through model, e.g. Book.author.through
+    :param field: str, e.g. 'author'
+    :param book_ids: iterable of int
+    :return: set of int
+    """
+    return set(through.objects.filter(book_id__in=list(book_ids)).values_list(field + '_id', flat=True))
+
+
+def invalidate_books(book_ids, author_ids=None, genre_ids=None):
+    """
+    Invalidates everything that shows or lists the books: book listings, the books themselves and the nested
+    listings of their authors and genres, since a change can move a book into or out of any of their pages.
+    :param book_ids: iterable of int
+    :param author_ids: iterable of int or None, the books' authors, looked up if None
+    :param genre_ids: iterable of int or None, the books' genres, looked up if None
+    """
+    if not enabled():
+        return
+    book_ids = set(book_ids)
+    if author_ids is None:
+        author_ids = related_ids(Book.author.through, 'author', book_ids)
+    if genre_ids is None:
+        genre_ids = related_ids(Book.genre.through, 'genre', book_ids)
+
+    invalidate(
+        'book:list',
+        *['book:{}'.format(book_id) for book_id in book_ids],
+        *['author:{}'.format(author_id) for author_id in author_ids],
+        *['genre:{}'.format(genre_id) for genre_id in genre_ids],
+    )
+
+
+def invalidate_book_content(book_ids):
+    """
+    Invalidates the responses that include the books, for changes that can't move a book between pages, e.g. Inventory
+    :param book_ids: iterable of int
+    """
+    invalidate(*['book:{}'.format(book_id) for book_id in book_ids])
+
+
+def invalidate_authors(author_ids):
+    """
+    Invalidates the authors, everything they appear in, and book listings, which can be filtered on author__name.
+    Also the nested author listings of their books' genres, since a rename can reorder them.
+    :param author_ids: iterable of int
+    """
+    if not enabled():
+        return
+    author_ids = set(author_ids)
+    genre_ids = Book.genre.through.objects.filter(book__author__in=author_ids).values_list('genre_id', flat=True)
+
+    invalidate(
+        'author:list',
+        'book:list',
+        *['author:{}'.format(author_id) for author_id in author_ids],
+        *['genre:{}'.format(genre_id) for genre_id in set(genre_ids)],
+    )
+
+
+def invalidate_genres(genre_ids):
+    """
+    Invalidates the genres, everything they appear in, and book listings, which can be filtered on genre__name.
+    Also the nested genre listings of their books' authors, since a rename can reorder them.
+    :param genre_ids: iterable of int
+    """
+    if not enabled():
+        return
+    genre_ids = set(genre_ids)
+    author_ids = Book.author.through.objects.filter(book__genre__in=genre_ids).values_list('author_id', flat=True)
+
+    invalidate(
+        'genre:list',
+        'book:list',
+        *['genre:{}'.format(genre_id) for genre_id in genre_ids],
+        *['author:{}'.format(author_id) for author_id in set(author_ids)],
+    )
+
+
+def invalidate_stats(author_ids, genre_ids):
+    """
+    Invalidates the stats of authors and genres, and the author and genre listings, which can be ordered by them
+    :param author_ids: iterable of int
+    :param genre_ids: iterable of int
+    """
+    author_ids = set(author_ids)
+    genre_ids = set(genre_ids)
+    tags = ['author:{}'.format(author_id) for author_id in author_ids]
+    tags += ['genre:{}'.format(genre_id) for genre_id in genre_ids]
+    if author_ids:
+        tags.append('author:list')
+    if genre_ids:
+        tags.append('genre:list')
+    invalidate(*tags)
+
+
+def content_tags(data, item_tag):
+    """
+    Gets the tags of every book, author and genre in serialized data
+    :param data: dict or list, response data, paginated or not
+    :param item_tag: str, tag of the listed resource, e.g. 'book'
+    :return: set of str
+    """
+    if isinstance(data, dict) and 'results' in data:
+        items = data['results']
+    elif isinstance(data, dict):
+        items = [data]
+    else:
+        items = data
+
+    tags = set()
+    for item in items:
+        if not isinstance(item, dict) or 'id' not in item:
+            continue
+        tags.add('{}:{}'.format(item_tag, item['id']))
+        for author in item.get('author') or []:
+            tags.add('author:{}'.format(author['id']))
+        for genre in item.get('genre') or []:
+            tags.add('genre:{}'.format(genre['id']))
+    return tags
+
+
+def compress(content, config):
+    """
+    Compresses content with every coding available
+    :param content: bytes
+    :param config: dict, see get_config()
+    :return: dict, coding -> bytes, only the variants smaller than content
+    """
+    if len(content) < config['COMPRESS_MIN_LENGTH']:
+        return {}
+    variants = {'gzip': gzip.compress(content, compresslevel=config['GZIP_LEVEL'], mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content, mode=brotli.MODE_TEXT, quality=config['BROTLI_QUALITY'])
+    return {coding: variant for coding, variant in variants.items() if len(variant) < len(content)}
+
+
+def accepted_encodings(header):
+    """
+    Parses an Accept-Encoding header
+    :param header: str, e.g. 'gzip;q=0.8, br, *;q=0'
+    :return: dict, coding -> quality between 0 and 1, with '*' for codings the header doesn't name
+    """
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+def choose_encoding(request, variants):
+    """
+    Picks the compressed variant a client accepts best
+    :param request: HttpRequest
+    :param variants: dict, coding -> bytes, see compress()
+    :return: str or None, the coding, None for the uncompressed content
+    """
+    qualities = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    best = None
+    best_quality = 0.0
+    for coding in ENCODINGS:
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if coding in variants and quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def encode_response(request, response, variants):
+    """
+    Replaces the content of a response with the variant the client accepts best, if any
+    :param request: HttpRequest
+    :param response: HttpResponse
+    :param variants: dict, coding -> bytes, see compress()
+    """
+    # Shared caches must tell compressed and uncompressed responses apart, even when this one isn't compressed
+    patch_vary_headers(response, ['Accept-Encoding'])
+    coding = choose_encoding(request, variants)
+    if coding is not None:
+        response.content = variants[coding]
+        response['Content-Encoding'] = coding
+
+
+def get_response(request):
+    """
+    Gets the cached response for request if there is one and none of its tags have been invalidated
+    :param request: HttpRequest
+    :return: HttpResponse or None
+    """
+    cache = get_cache()
+    entry = cache.get(response_key(request))
+    if entry is not None:
+        current = cache.get_many([tag_key(tag) for tag in entry['tags']])
+        if all(current.get(tag_key(tag)) == version for tag, version in entry['tags'].items()):
+            record('hits')
+            response = HttpResponse(entry['content'], status=entry['status'])
+            for header, value in entry['headers']:
+                response[header] = value
+            encode_response(request, response, entry.get('encodings', {}))
+            response['X-Cache'] = 'HIT'
+            return response
+
+    record('misses')
+    return None
+
+
+def set_response(request, response, versions, store=True):
+    """
+    Stores a rendered response with its compressed variants, and compresses the response like a hit would be
+    :param request: HttpRequest
+    :param response: HttpResponse, rendered
+    :param versions: dict, tag -> version, the versions of the tags when the response was built
+    :param store: bool, False only compresses the response, for responses that mustn't be served to others
+    """
+    config = get_config()
+    headers = [(header, response[header]) for header in CACHED_HEADERS if response.has_header(header)]
+    entry = {
+        'tags': versions,
+        'content': response.content,
+        'encodings': compress(response.content, config),
+        'status': response.status_code,
+        'headers': headers,
+    }
+    if store:
+        get_cache().set(response_key(request), entry, config['TIMEOUT'])
+    encode_response(request, response, entry['encodings'])
+    response['X-Cache'] = 'MISS'
+
+
+def record(counter):
+    """Increments the hits or misses counter"""
+    cache = get_cache()
+    key = make_key('stats', counter)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def stats():
+    """
+    Gets the hit and miss counters
+    :return: dict
+    """
+    counters = get_cache().get_many([make_key('stats', 'hits'), make_key('stats', 'misses')])
+    hits = counters.get(make_key('stats', 'hits'), 0)
+    misses = counters.get(make_key('stats', 'misses'), 0)
+    return {
+        'enabled': enabled(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
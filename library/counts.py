@@ -0,0 +1,136 @@
+"""
+Counts the rows of paginated listings, which otherwise costs a COUNT(*) over the filtered queryset on every page.
+
+Three modes, set by LIBRARY_COUNT in settings or a viewset's count_mode attribute:
+* exact: COUNT(*) every time.
+* cached: COUNT(*) once per filtered query, kept until a write invalidates the listing. Entries carry the versions of
+  the response cache's tags (see library.cache), so they are invalidated by the same writes as cached responses.
+  Needs the response cache to be enabled, since tags aren't versioned otherwise, and counts exactly if it isn't.
+* estimated: the planner's estimate on PostgreSQL, pg_class.reltuples for an unfiltered table and the row estimate of
+  EXPLAIN otherwise. Estimates below ESTIMATE_THRESHOLD are counted exactly, since they are cheap to count and the
+  planner is least accurate for them, and so are all counts on other databases.
+The mode that actually produced a count is returned with it, and paginated responses include it as count_mode.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import connections
+
+from library import cache, routers
+
+EXACT = 'exact'
+CACHED = 'cached'
+ESTIMATED = 'estimated'
+MODES = [EXACT, CACHED, ESTIMATED]
+
+DEFAULTS = {
+    'MODE': EXACT,
+    # Seconds a cached count is kept
+    'TIMEOUT': 300,
+    # Estimates of fewer rows are counted exactly instead
+    'ESTIMATE_THRESHOLD': 10000,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LIBRARY_COUNT', {}))
+    return config
+
+
+def get_scope(view):
+    """
+    Gets the tags a listing's count depends on, i.e. that writes changing which rows it has invalidate
+    :param view: APIView or None
+    :return: list of str
+    """
+    scope = getattr(view, 'count_scope', None)
+    if scope is not None:
+        return scope
+    if hasattr(view, 'get_cache_scope'):
+        return view.get_cache_scope({})
+    return [cache.ALL]
+
+
+def count(queryset, mode=None, scope=None):
+    """
+    Counts the rows of queryset
+    :param queryset: QuerySet, not sliced
+    :param mode: str or None, one of MODES, the configured mode if None
+    :param scope: list of str or None, tags whose invalidation invalidates a cached count, see get_scope()
+    :return: (int, str), the count and the mode that produced it
+    """
+    mode = mode or get_config()['MODE']
+    if mode not in MODES:
+        raise ValueError('Unknown count mode {!r}, expected one of {}'.format(mode, MODES))
+
+    if mode == CACHED and cache.enabled():
+        return cached_count(queryset, scope or [cache.ALL]), CACHED
+    if mode == ESTIMATED:
+        estimate = estimate_count(queryset)
+        if estimate is not None and estimate >= get_config()['ESTIMATE_THRESHOLD']:
+            return estimate, ESTIMATED
+    return queryset.count(), EXACT
+
+
+def count_key(queryset):
+    """
+    Builds the cache key of a count from the query's SQL, which has every filter in it. The ordering doesn't change
+    the count, so it is left out.
+    :param queryset: QuerySet
+    :return: str
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    identity = '{}|{}|{}'.format(queryset.db, sql, json.dumps(params, default=str))
+    return cache.make_key('count', hashlib.md5(identity.encode('utf-8')).hexdigest())
+
+
+def cached_count(queryset, scope):
+    """
+    Gets the count of queryset from the cache, counting and storing it if it isn't there or was invalidated
+    :param queryset: QuerySet
+    :param scope: list of str, tags the count depends on
+    :return: int
+    """
+    store = cache.get_cache()
+    key = count_key(queryset)
+    entry = store.get(key)
+    if entry is not None:
+        current = store.get_many([cache.tag_key(tag) for tag in entry['tags']])
+        if all(current.get(cache.tag_key(tag)) == version for tag, version in entry['tags'].items()):
+            return entry['count']
+
+    # Versions are read before counting, so that a write happening meanwhile invalidates the count
+    versions = cache.get_versions(scope)
+    rows = queryset.count()
+    if not routers.may_be_stale():
+        store.set(key, {'tags': versions, 'count': rows}, get_config()['TIMEOUT'])
+    return rows
+
+
+def estimate_count(queryset):
+    """
+    Gets the planner's estimate of the number of rows of queryset
+    :param queryset: QuerySet
+    :return: int or None, None if the database can't estimate it or the table was never analyzed
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            # reltuples is -1 (or 0 before PostgreSQL 14) for a table that was never vacuumed or analyzed
+            if row is None or row[0] <= 0:
+                return None
+            return int(row[0])
+
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
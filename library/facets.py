@@ -0,0 +1,69 @@
+"""
+Facet counts for book listings, e.g. /books/?facets=genre,type: how many of the books matching the current filters
+have each genre, type or author, the most common first.
+
+Each facet is one grouped query over the ids of the filtered books, so a response costs one extra query per facet
+whatever the number of values. When nothing is filtered, the genre and author facets are read from the book_count
+column the authors and genres maintain (see library.stats) instead, a top-N read of its index.
+"""
+from collections import OrderedDict
+from functools import partial
+
+from django.db.models import Count
+
+from library.models import *
+
+
+def type_buckets(queryset, size):
+    """
+    :param queryset: QuerySet of Book or BookListing, the filtered books
+    :param size: int, most buckets returned
+    :return: list of OrderedDict with value and count
+    """
+    rows = queryset.order_by().values('type').annotate(count=Count('id')).order_by('-count', 'type')[:size]
+    return [OrderedDict([('value', row['type']), ('count', row['count'])]) for row in rows]
+
+
+def related_buckets(model, through, field, queryset, size):
+    """
+    :param model: Author or Genre
+    :param through: through model of the relation, e.g. Book.author.through
+    :param field: str, name of the related model's foreign key on through, e.g. 'author'
+    :param queryset: QuerySet of Book or BookListing, the filtered books
+    :param size: int, most buckets returned
+    :return: list of OrderedDict with id, name and count
+    """
+    if queryset.query.where:
+        # Only some of the books, so their links are grouped. Compiled on its own rather than as a subquery, which
+        # would relabel the tables that the raw SQL of a search (see library.search) refers to
+        sql, params = queryset.order_by().values('id').query.sql_with_params()
+        rows = through.objects.extra(
+            where=['"{}"."book_id" IN ({})'.format(through._meta.db_table, sql)], params=params,
+        ).values(
+            field + '_id', field + '__name',
+        ).annotate(count=Count('book_id')).order_by('-count', field + '_id')[:size]
+        rows = [(row[field + '_id'], row[field + '__name'], row['count']) for row in rows]
+    else:
+        # Every book, which book_count already counts
+        rows = model.objects.filter(book_count__gt=0).order_by('-book_count', 'id').values_list(
+            'id', 'name', 'book_count',
+        )[:size]
+    return [OrderedDict([('id', related_id), ('name', name), ('count', count)]) for related_id, name, count in rows]
+
+
+FACETS = OrderedDict([
+    ('genre', partial(related_buckets, Genre, Book.genre.through, 'genre')),
+    ('type', type_buckets),
+    ('author', partial(related_buckets, Author, Book.author.through, 'author')),
+])
+
+
+def facet_counts(queryset, names, size):
+    """
+    Counts the books of queryset by each facet
+    :param queryset: QuerySet of Book or BookListing, the books after filtering, before pagination
+    :param names: list of str, keys of FACETS
+    :param size: int, most buckets per facet
+    :return: OrderedDict, facet name -> list of buckets, most books first
+    """
+    return OrderedDict((name, FACETS[name](queryset, size)) for name in names)
@@ -0,0 +1,127 @@
+"""
+Sparse fieldsets for book responses: ?fields=title,rating,inventory.available returns only those fields of each book,
+?omit=description,author returns all but those. Fields of the nested objects are named with a dot. Ids are always
+returned, of books and of their authors and genres, since the response cache tracks what a response shows by them.
+
+Fieldsets are not only applied to the serialized data: the queries fetch only the columns asked for and skip the
+authors, genres and inventory of books when they aren't, see BookViewSet.get_queryset().
+"""
+from collections import OrderedDict
+
+from rest_framework.exceptions import ParseError
+
+# Fields of a book in responses, in order, with the fields of nested objects
+BOOK_FIELDS = OrderedDict([
+    ('id', None),
+    ('isbn', None),
+    ('title', None),
+    ('type', None),
+    ('edition', None),
+    ('pages', None),
+    ('rating', None),
+    ('rating_count', None),
+    ('review_count', None),
+    ('image_url', None),
+    ('description', None),
+    ('author', ['id', 'name']),
+    ('genre', ['id', 'name']),
+    ('inventory', ['available', 'owned']),
+])
+
+# Always returned
+REQUIRED = ['id']
+
+
+class Fieldset:
+    """The fields of a book that a request asked for"""
+
+    def __init__(self, selected):
+        """
+        :param selected: OrderedDict, field name -> list of str, the nested fields of the field, empty if it has none
+        """
+        self.selected = selected
+
+    @classmethod
+    def from_query_params(cls, query_params, fields_param='fields', omit_param='omit'):
+        """
+        :param query_params: QueryDict
+        :param fields_param: str
+        :param omit_param: str
+        :return: Fieldset or None, None if the request didn't restrict the fields
+        """
+        fields = cls.parse(query_params.get(fields_param, ''))
+        omit = cls.parse(query_params.get(omit_param, ''))
+        if not fields and not omit:
+            return None
+
+        selected = OrderedDict()
+        for name, nested in BOOK_FIELDS.items():
+            nested = nested or []
+            if fields and name not in REQUIRED:
+                if name not in fields:
+                    continue
+                # author.name asks for some of the nested fields, author for all of them
+                if fields[name]:
+                    nested = [field for field in nested if field in fields[name] or field in REQUIRED]
+            if name in omit and name not in REQUIRED:
+                if not omit[name]:
+                    continue
+                nested = [field for field in nested if field not in omit[name] or field in REQUIRED]
+                if not nested:
+                    continue
+            selected[name] = nested
+        return cls(selected)
+
+    @staticmethod
+    def parse(param):
+        """
+        :param param: str, comma separated field names, nested ones as field.nested
+        :return: dict, field name -> set of nested field names, empty for the whole field
+        """
+        parsed = {}
+        for name in param.split(','):
+            name = name.strip()
+            if not name:
+                continue
+            field, _, nested = name.partition('.')
+            if field not in BOOK_FIELDS or (nested and nested not in (BOOK_FIELDS[field] or [])):
+                choices = [
+                    '{}.{}'.format(field, nested) if nested else field
+                    for field, nested_fields in BOOK_FIELDS.items() for nested in [None] + (nested_fields or [])
+                ]
+                raise ParseError('Unknown field: {}. Choose from: {}.'.format(name, ', '.join(choices)))
+            if nested:
+                if field not in parsed or parsed[field]:
+                    parsed.setdefault(field, set()).add(nested)
+            else:
+                # The whole field, even if some of its nested fields were named too
+                parsed[field] = set()
+        return parsed
+
+    def __contains__(self, name):
+        return name in self.selected
+
+    def nested(self, name):
+        """
+        :param name: str, e.g. 'inventory'
+        :return: list of str, the nested fields asked for
+        """
+        return self.selected.get(name, [])
+
+    def prune(self, data):
+        """
+        Drops the fields that weren't asked for from a serialized book
+        :param data: OrderedDict
+        :return: OrderedDict
+        """
+        book = OrderedDict()
+        for name, value in data.items():
+            if name not in self.selected:
+                continue
+            nested = self.selected[name]
+            if nested and isinstance(value, dict):
+                value = OrderedDict((field, value[field]) for field in nested)
+            elif nested and isinstance(value, list):
+                value = [OrderedDict((field, item[field]) for field in nested) for item in value]
+            book[name] = value
+        return book
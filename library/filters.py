@@ -0,0 +1,29 @@
+from django_filters import rest_framework as filters
+
+from library.models import *
+
+
+def filter_books(queryset, name, value):
+    """Filters BookListings by a lookup on Book, e.g. author__name, with a subquery on the Book tables"""
+    return queryset.filter(id__in=Book.objects.filter(**{name: value}).values('id'))
+
+
+class BookListingFilter(filters.FilterSet):
+    """The same filters as BookViewSet.filterset_fields, for BookListing"""
+    author__name = filters.CharFilter(method=filter_books)
+    genre__name = filters.CharFilter(method=filter_books)
+
+    class Meta:
+        model = BookListing
+        fields = [
+            'isbn',
+            'title',
+            'type',
+            'edition',
+            'pages',
+            'rating',
+            'rating_count',
+            'review_count',
+            'author__name',
+            'genre__name',
+        ]
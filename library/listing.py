@@ -0,0 +1,92 @@
+"""
+Maintains BookListing, the denormalized copy of each book that book listings are read from.
+
+Writes that go through the models are picked up by library.signals. Writes that bypass signals (bulk_create,
+queryset.update()) have to call refresh_listings() with the books they touched.
+"""
+import json
+
+from django.db import transaction
+
+from library.bulk import chunks
+from library.models import *
+from library.serializers import BookValuesSerializer
+
+BOOK_FIELDS = BookValuesSerializer.book_fields
+
+# Ids per query, under SQLite's limit on query parameters
+CHUNK_SIZE = 500
+
+
+def related_pairs(through, field, book_ids):
+    """
+    :param through: through model of the relation, e.g. Book.author.through
+    :param field: str, name of the related model's foreign key on through, e.g. 'author'
+    :param book_ids: list of int
+    :return: dict, book id -> list of [id, name] ordered by id
+    """
+    related = {}
+    rows = through.objects.filter(book_id__in=book_ids).order_by(field + '_id').values_list(
+        'book_id', field + '_id', field + '__name',
+    )
+    for book_id, related_id, name in rows:
+        related.setdefault(book_id, []).append([related_id, name])
+    return related
+
+
+def refresh_listings(book_ids, book_model=Book, listing_model=BookListing):
+    """
+    Rebuilds the listings of books from the book tables, deleting the listings of books that no longer exist
+    :param book_ids: iterable of int
+    :param book_model: Book, or its historical model in a migration
+    :param listing_model: BookListing, or its historical model in a migration
+    """
+    for chunk in chunks(sorted(set(book_ids)), CHUNK_SIZE):
+        with transaction.atomic(using=listing_model.objects.db):
+            rows = book_model.objects.filter(id__in=chunk).values(
+                *BOOK_FIELDS, 'inventory__available', 'inventory__owned',
+            )
+            authors = related_pairs(book_model.author.through, 'author', chunk)
+            genres = related_pairs(book_model.genre.through, 'genre', chunk)
+
+            listings = []
+            for row in rows:
+                listing = listing_model(**{field: row[field] for field in BOOK_FIELDS})
+                listing.authors = json.dumps(authors.get(row['id'], []), ensure_ascii=False)
+                listing.genres = json.dumps(genres.get(row['id'], []), ensure_ascii=False)
+                listing.available = row['inventory__available']
+                listing.owned = row['inventory__owned']
+                listings.append(listing)
+
+            listing_model.objects.filter(id__in=chunk).delete()
+            listing_model.objects.bulk_create(listings)
+
+
+def rebuild_listings(book_model=Book, listing_model=BookListing):
+    """
+    Rebuilds every listing
+    :param book_model: Book, or its historical model in a migration
+    :param listing_model: BookListing, or its historical model in a migration
+    """
+    listing_model.objects.all().delete()
+    refresh_listings(book_model.objects.values_list('id', flat=True), book_model, listing_model)
+
+
+def set_inventory(book_id, available, owned):
+    """
+    Copies a book's inventory counts to its listing after a queryset.update() of Inventory. Run in the same
+    transaction, after the update: the update keeps the Inventory row locked until commit, so concurrent calls for a
+    book write its listing in the same order they wrote the Inventory.
+    :param book_id: int
+    :param available: int
+    :param owned: int
+    """
+    BookListing.objects.filter(id=book_id).update(available=available, owned=owned)
+
+
+def author_book_ids(author_ids):
+    return Book.author.through.objects.filter(author_id__in=list(author_ids)).values_list('book_id', flat=True)
+
+
+def genre_book_ids(genre_ids):
+    return Book.genre.through.objects.filter(genre_id__in=list(genre_ids)).values_list('book_id', flat=True)
@@ -0,0 +1,41 @@
+import json
+from importlib import import_module
+
+from django.core.management import BaseCommand
+
+from library.benchmarks import benchmark_database
+
+# Suite name -> module in library.benchmarks
+SUITES = {
+    'serializers': 'library.benchmarks.serializers',
+    'checkout': 'library.benchmarks.checkout',
+    'api': 'library.benchmarks.api',
+    'renderers': 'library.benchmarks.renderers',
+    'asgi': 'library.benchmarks.asgi',
+}
+
+
+class Command(BaseCommand):
+    help = 'Runs a benchmark suite against a throwaway test database and prints a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='also write the JSON report to this file')
+        parser.add_argument('--keepdb', action='store_true', help='reuse the test database between runs')
+
+        subparsers = parser.add_subparsers(dest='suite', title='suites')
+        subparsers.required = True
+        for name, module in SUITES.items():
+            suite = import_module(module)
+            suite.add_arguments(subparsers.add_parser(name, help=suite.__doc__))
+
+    def handle(self, *args, **options):
+        suite = import_module(SUITES[options['suite']])
+
+        with benchmark_database(keepdb=options['keepdb']):
+            report = suite.run(**options)
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as report_file:
+                report_file.write(output + '\n')
@@ -0,0 +1,206 @@
+import csv
+import math
+import sys
+from random import Random
+
+from django.core.management import BaseCommand
+
+from library.renderers import CSV_COLUMNS
+
+# The distributions below are taken from book_data.csv
+
+FORMATS = [
+    ('Hardcover', 442), ('Kindle Edition', 294), ('Paperback', 188), ('ebook', 148), ('', 34), ('Audiobook', 10),
+    ('Mass Market Paperback', 8), ('Audible Audio', 8), ('Audio CD', 6),
+]
+EDITIONS = [('', 1036), ('1st edition', 31), ('1st Edition', 27), ('1 edition', 6), ('Unabridged', 6), ('First', 2)]
+ISBNS = [('9.78E+12', 690), ('', 450), ('9.79E+12', 1)]
+AUTHORS_PER_ROW = [(1, 997), (2, 110), (3, 16), (4, 6), (5, 2), (8, 1), (13, 1), (18, 4)]
+GENRES_PER_ROW = [
+    (1, 38), (2, 44), (3, 103), (4, 185), (5, 225), (6, 190), (7, 128), (8, 81), (9, 57), (10, 22), (11, 17),
+    (12, 15), (13, 17), (14, 9), (15, 8), (16, 2),
+]
+# Most common first, the rest are named Genre <rank>
+GENRE_NAMES = [
+    'Romance', 'Fiction', 'Contemporary', 'Fantasy', 'Mystery', 'Historical', 'Thriller', 'Young Adult',
+    'Contemporary Romance', 'Historical Fiction', 'Suspense', 'Adult', 'Paranormal', 'Audiobook', 'Mystery Thriller',
+    'Science Fiction', 'Crime', 'Adult Fiction', 'Chick Lit', 'Womens Fiction', 'Nonfiction', 'Horror', 'Humor',
+    'Literary Fiction', 'New Adult', 'Magic', 'Drama', 'Family', 'Adventure', 'Biography',
+]
+FIRST_NAMES = [
+    'Kristin', 'Madeline', 'Stephen', 'Samantha', 'Penelope', 'Vi', 'Colleen', 'Tana', 'Liane', 'Nora', 'Sarah',
+    'John', 'Emily', 'James', 'Karen', 'David', 'Lisa', 'Michael', 'Jennifer', 'Robert', 'Laura', 'Daniel', 'Ruth',
+    'Thomas', 'Anna', 'Mark', 'Julia', 'Paul', 'Helen', 'Peter',
+]
+LAST_NAMES = [
+    'Hannah', 'Miller', 'King', 'Chase', 'Ward', 'Keeland', 'Hoover', 'French', 'Moriarty', 'Roberts', 'Maas',
+    'Grisham', 'Giffin', 'Patterson', 'Slaughter', 'Baldacci', 'Jewell', 'Connelly', 'Weiner', 'Galbraith', 'Penny',
+    'Lehane', 'Ware', 'Harper', 'Koontz', 'Quinn', 'Kepnes', 'Gaiman', 'Ng', 'Tyler',
+]
+WORDS = (
+    'the a of and to in her his their with for on from as by at an that is was into over under after before when '
+    'while family love secret war night house city sea winter summer light dark truth lies heart mother father '
+    'daughter son sister brother friend stranger town island river forest road home world life death time king '
+    'queen girl boy woman man journey story past future memory promise fire storm shadow dream hope fear danger '
+    'discovers returns finds loses must learns hides fights leaves meets remembers believes chooses survives'
+).split()
+
+# Popularity falls off with rank like Zipf's law, as 1 / rank ** skew. Fitted so that the most common genre is on about
+# half of the books and the most prolific author on a percent of them
+GENRE_SKEW = 0.9
+AUTHOR_SKEW = 0.6
+
+
+def weighted(choices):
+    """
+    :param choices: list of (value, weight)
+    :return: (list, list of float), the values and their cumulative weights, for pick()
+    """
+    values = [value for value, weight in choices]
+    cumulative = []
+    total = 0
+    for value, weight in choices:
+        total += weight
+        cumulative.append(total)
+    return values, cumulative
+
+
+def pick(rng, choices):
+    """
+    :param rng: Random
+    :param choices: tuple, see weighted()
+    :return: one of the values, drawn by weight
+    """
+    values, cumulative = choices
+    return rng.choices(values, cum_weights=cumulative)[0]
+
+
+def zipf_rank(rng, n, skew):
+    """
+    Draws a rank between 1 and n with a probability about proportional to 1 / rank ** skew, by inverting the
+    continuous distribution rather than building a table of n weights, so memory doesn't grow with n
+    :param rng: Random
+    :param n: int
+    :param skew: float, above 0
+    :return: int
+    """
+    u = rng.random()
+    if skew == 1:
+        x = (n + 1) ** u
+    else:
+        x = (((n + 1) ** (1 - skew) - 1) * u + 1) ** (1 / (1 - skew))
+    return min(int(x), n)
+
+
+def author_name(rank):
+    """
+    :param rank: int, 1 is the most prolific author
+    :return: str, a name unique to the rank
+    """
+    index = rank - 1
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[index // len(FIRST_NAMES) % len(LAST_NAMES)]
+    name = '{} {}'.format(first, last)
+    cycle = index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return '{} {}'.format(name, cycle + 1) if cycle else name
+
+
+def genre_name(rank):
+    """
+    :param rank: int, 1 is the most common genre
+    :return: str
+    """
+    return GENRE_NAMES[rank - 1] if rank <= len(GENRE_NAMES) else 'Genre {}'.format(rank)
+
+
+def distinct(rng, count, n, skew, name):
+    """
+    :return: list of str, count different names drawn by popularity, fewer if n is smaller
+    """
+    ranks = []
+    while len(ranks) < min(count, n):
+        rank = zipf_rank(rng, n, skew)
+        if rank not in ranks:
+            ranks.append(rank)
+    return [name(rank) for rank in ranks]
+
+
+def words(rng, count):
+    return ' '.join(rng.choices(WORDS, k=count))
+
+
+def generate_rows(rows, seed=0, authors=None, genres=300):
+    """
+    Generates rows in the layout of book_data.csv, one at a time
+    :param rows: int, number of rows
+    :param seed: int, the same seed gives the same rows
+    :param authors: int or None, number of different authors, defaults to rows
+    :param genres: int, number of different genres
+    :return: generator of dict, column -> str
+    """
+    rng = Random(seed)
+    authors = authors or max(rows, 1)
+    formats = weighted(FORMATS)
+    editions = weighted(EDITIONS)
+    isbns = weighted(ISBNS)
+    authors_per_row = weighted(AUTHORS_PER_ROW)
+    genres_per_row = weighted(GENRES_PER_ROW)
+
+    for index in range(rows):
+        rating_count = int(rng.lognormvariate(7.43, 1.8)) + 1
+        # Descriptions are a median of about 1000 characters, some a few thousand, a few empty
+        description_words = int(rng.lognormvariate(5.1, 0.6)) if rng.random() > 0.005 else 0
+        yield {
+            'book_authors': '|'.join(distinct(rng, pick(rng, authors_per_row), authors, AUTHOR_SKEW, author_name)),
+            'book_desc': words(rng, description_words).capitalize(),
+            'book_edition': pick(rng, editions),
+            'book_format': pick(rng, formats),
+            'book_isbn': pick(rng, isbns),
+            'book_pages': '{} pages'.format(min(max(int(rng.gauss(328, 118)), 1), 2000)) if rng.random() > 0.06 else '',
+            'book_rating': '{:.2f}'.format(min(max(rng.gauss(4.03, 0.33), 1.0), 5.0)),
+            'book_rating_count': str(rating_count),
+            'book_review_count': str(int(rating_count * min(rng.lognormvariate(math.log(0.19), 0.5), 1.0))),
+            'book_title': words(rng, rng.randint(1, 5)).title(),
+            'genres': '|'.join(distinct(rng, pick(rng, genres_per_row), genres, GENRE_SKEW, genre_name)),
+            'image_url': 'https://images.gr-assets.com/books/{}l/{}.jpg'.format(
+                rng.randint(1300000000, 1550000000), index + 1,
+            ),
+        }
+
+
+def write_csv(output, rows, seed=0, authors=None, genres=300):
+    """
+    Writes generated rows to a file as they are generated, so memory use doesn't depend on the number of rows
+    :param output: file opened for writing text, with newline=''
+    :param rows: int
+    :param seed: int
+    :param authors: int or None
+    :param genres: int
+    """
+    writer = csv.DictWriter(output, CSV_COLUMNS, quotechar='"')
+    writer.writeheader()
+    for row in generate_rows(rows, seed, authors, genres):
+        writer.writerow(row)
+
+
+class Command(BaseCommand):
+    help = 'Writes a synthetic csv in the layout of book_data.csv, to be loaded with load_book_data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='path of the csv to write, - for stdout')
+        parser.add_argument('--rows', type=int, default=10000, help='number of books (default %(default)s)')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='the same seed writes the same file (default %(default)s)')
+        parser.add_argument('--authors', type=int, help='number of different authors (default --rows)')
+        parser.add_argument('--genres', type=int, default=300,
+                            help='number of different genres (default %(default)s)')
+
+    def handle(self, *args, **options):
+        arguments = (options['rows'], options['seed'], options['authors'], options['genres'])
+        if options['output'] == '-':
+            write_csv(sys.stdout, *arguments)
+            return
+        # ASCII only, so it reads the same whatever encoding load_book_data opens it with
+        with open(options['output'], 'w', newline='', encoding='ascii') as output:
+            write_csv(output, *arguments)
+        self.stdout.write('Finished writing {} rows to {}'.format(options['rows'], options['output']))
@@ -1,8 +1,21 @@
 import csv
+import hashlib
+import locale
+import multiprocessing
+import os
 import random
+from collections import deque
+import django
 from django.core.management import BaseCommand
+from django.db import DatabaseError, transaction
+from library import cache
+from library.bulk import Progress, bulk_create_with_ids, chunks, find_names, get_or_create_names
+from library.listing import refresh_listings
+from library.stats import refresh_stats
 from library.models import *
 
+DEFAULT_BATCH_SIZE = 5000
+
 
 def __get_authors(row):
     """
@@ -59,77 +72,294 @@ def __get_pages(row):
     return pages
 
 
-def load_csv(data_csv):
+def __get_number(value, convert):
     """
-    Loads the data for a csv similar to book_data
-    :param data_csv: str, path to book_data.csv or equivalent
+    Converts a number, blanks are None like they are exported by GET /books/export/?format=csv
+    :param value: str
+    :param convert: int or float
+    :return: int, float or None
     """
+    return convert(value) if len(value) > 0 else None
 
-    with open(data_csv, 'r') as csv_file:
-        reader = csv.DictReader(csv_file, quotechar='"')
 
-        for row in reader:
+BOOK_FIELDS = ['isbn', 'title', 'type', 'edition', 'pages', 'rating', 'rating_count', 'review_count', 'image_url',
+               'description']
 
-            # This is wrapped in a try except so that if a single line fails, the rest of the rows are still loaded.
-            # If the desired behavior is to instead have the entire load fail on a single error, this should be replaced
-            # with from "django.db import transaction" at the top and with transaction.atomic() instead of try-except
-            try:
-                authors = __get_authors(row)
 
-                genres = __get_genres(row)
+def parse_row(row):
+    """
+    Converts a row to the values of its Book, without touching the database
+    :param row: dict, row of book_data.csv
+    :return: dict, Book field -> value, plus 'authors' and 'genres', lists of names
+    """
+    return {
+        'isbn': row['book_isbn'],
+        'title': row['book_title'],
+        'type': row['book_format'],
+        'edition': row['book_edition'],
+        'pages': __get_pages(row),
+        'rating': __get_number(row['book_rating'], float),
+        'rating_count': __get_number(row['book_rating_count'], int),
+        'review_count': __get_number(row['book_review_count'], int),
+        'image_url': row['image_url'],
+        'description': row['book_desc'],
+        'authors': row['book_authors'].split('|'),
+        'genres': row['genres'].split('|'),
+    }
+
+
+def book_key(values):
+    """
+    Identifies a book by all of its fields, the way the row by row load matches existing books
+    :param values: iterable, the values of BOOK_FIELDS in order
+    :return: bytes
+    """
+    return hashlib.md5(repr(tuple(values)).encode('utf-8')).digest()
 
-                description = row['book_desc']
 
-                edition = row['book_edition']
+def parse_rows(rows):
+    """
+    Parses a batch of rows, the part of a bulk load that runs in the worker processes
+    :param rows: list of dict, rows of book_data.csv
+    :return: list of (values, key, error), one per row, values and key are None and error is a str if the row can't be
+        parsed. The rows themselves aren't sent back, the caller still has them.
+    """
+    parsed = []
+    for row in rows:
+        try:
+            values = parse_row(row)
+        except Exception as e:
+            parsed.append((None, None, str(e)))
+        else:
+            parsed.append((values, book_key(values[field] for field in BOOK_FIELDS), None))
+    return parsed
+
+
+def read_batches(data_csv, batch_size):
+    """
+    Reads a csv a batch of rows at a time
+    :param data_csv: str, path to book_data.csv or equivalent
+    :param batch_size: int, rows per batch
+    :return: generator of (list of dict, int), each batch and how many bytes of the file have been read after it
+    """
+    encoding = locale.getpreferredencoding(False)
+    position = 0
 
-                format = row['book_format']
+    def lines(csv_file):
+        # Counting bytes here because tell() isn't available while iterating over a file
+        nonlocal position
+        for line in csv_file:
+            position += len(line)
+            yield line.decode(encoding)
 
-                isbn = row['book_isbn']
+    with open(data_csv, 'rb') as csv_file:
+        reader = csv.DictReader(lines(csv_file), quotechar='"')
+        for rows in chunks(reader, batch_size):
+            yield rows, position
 
-                pages = __get_pages(row)
 
-                rating = float(row['book_rating'])
+def report_error(error, row):
+    print('Row could not be loaded due to {}: {}'.format(error, row))
 
-                rating_count = int(row['book_rating_count'])
 
-                review_count = int(row['book_review_count'])
+def load_row(row):
+    """
+    Loads a single row, reusing the authors, genres and book if they already exist
+    :param row: dict, row of book_data.csv
+    :return: bool, whether the row was loaded
+    """
+    # This is wrapped in a try except so that if a single line fails, the rest of the rows are still loaded.
+    # If the desired behavior is to instead have the entire load fail on a single error, this should be replaced
+    # with from "django.db import transaction" at the top and with transaction.atomic() instead of try-except
+    try:
+        values = parse_row(row)
+
+        authors = __get_authors(row)
+
+        genres = __get_genres(row)
 
-                title = row['book_title']
+        book, created = Book.objects.get_or_create(**{field: values[field] for field in BOOK_FIELDS})
 
-                image_url = row['image_url']
+        for author in authors:
+            book.author.add(author)
+        for genre in genres:
+            book.genre.add(genre)
 
-                book, created = Book.objects.get_or_create(
-                    isbn=isbn,
-                    title=title,
-                    type=format,
-                    edition=edition,
-                    pages=pages,
-                    rating=rating,
-                    rating_count=rating_count,
-                    review_count=review_count,
-                    image_url=image_url,
-                    description=description,
-                )
-                book.save()
+        copies = random.randint(1, 5)
+        inventory = Inventory.objects.filter(book=book)
+        if not inventory.exists():
+            inventory = Inventory.objects.create(
+                book=book,
+                available=copies,
+                owned=copies,
+            )
 
-                for author in authors:
-                    book.author.add(author)
-                for genre in genres:
-                    book.genre.add(genre)
+    except Exception as e:
+        report_error(e, row)
+        return False
+    return True
 
-                book.save()
 
-                copies = random.randint(1, 5)
-                inventory = Inventory.objects.filter(book=book)
-                if not inventory.exists():
-                    inventory = Inventory.objects.create(
-                        book=book,
-                        available=copies,
-                        owned=copies,
-                    )
+class BulkLoader:
+    """
+    Loads rows a batch at a time, with one transaction and a handful of bulk inserts per batch instead of dozens of
+    queries per row. Authors and genres are looked up in name -> id maps that are filled as the load goes, and books
+    that are already in the database are skipped, so loading the same file twice doesn't duplicate anything.
+    Bulk inserts don't send signals, so the book listings and the stats of the batch's authors and genres are
+    refreshed with each batch and the response cache is invalidated once at the end instead.
+
+    Parsing can be spread over a pool of worker processes. The batches they parse are written in file order by this
+    process alone, so the name -> id maps and the skipping of books already loaded work exactly as without workers.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        :param batch_size: int, rows per transaction
+        """
+        self.batch_size = batch_size
+        # Author names aren't unique, like get_or_create() the lowest id is used
+        self.author_ids = dict(Author.objects.order_by('-id').values_list('name', 'id'))
+        self.genre_ids = dict(Genre.objects.values_list('name', 'id'))
+        self.book_keys = {book_key(values) for values in Book.objects.values_list(*BOOK_FIELDS).iterator()}
+        self.loaded = 0
+
+    def load_file(self, data_csv, workers=1, progress=False):
+        """
+        Loads the data for a csv similar to book_data
+        :param data_csv: str, path to book_data.csv or equivalent
+        :param workers: int, processes parsing rows, 1 parses them in this process
+        :param progress: bool, print the throughput and time left every few seconds
+        """
+        tracker = Progress(os.path.getsize(data_csv)) if progress else None
+        batches = read_batches(data_csv, self.batch_size)
+
+        if workers > 1:
+            # Spawned rather than forked, so the workers don't inherit this process's database connections
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(workers, initializer=django.setup) as pool:
+                # At most two batches per worker are read ahead, so memory use doesn't grow with the file
+                pending = deque()
+                for rows, position in batches:
+                    pending.append((pool.apply_async(parse_rows, (rows,)), rows, position))
+                    if len(pending) >= workers * 2:
+                        self.write_parsed(*pending.popleft(), tracker)
+                while pending:
+                    self.write_parsed(*pending.popleft(), tracker)
+        else:
+            for rows, position in batches:
+                self.load_batch(rows)
+                if tracker:
+                    tracker.update(len(rows), position)
+
+        if tracker:
+            tracker.report()
+        cache.invalidate_all()
+
+    def write_parsed(self, result, rows, position, tracker):
+        self.write_batch(rows, result.get())
+        if tracker:
+            tracker.update(len(rows), position)
+
+    def load_batch(self, rows):
+        """
+        Parses and loads rows in one transaction
+        :param rows: list of dict
+        """
+        self.write_batch(rows, parse_rows(rows))
+
+    def write_batch(self, rows, parsed):
+        """
+        Loads parsed rows in one transaction. Rows that couldn't be parsed are reported and skipped, and if the batch
+        fails in the database it is loaded again row by row, so only the rows at fault are reported and left out.
+        :param rows: list of dict
+        :param parsed: list, parse_rows(rows)
+        """
+        batch = []
+        parsed_rows = []
+        keys = set()
+        for row, (values, key, error) in zip(rows, parsed):
+            if error is not None:
+                report_error(error, row)
+                continue
+            if key in self.book_keys or key in keys:
+                continue
+            keys.add(key)
+            batch.append(values)
+            parsed_rows.append(row)
+
+        if not batch:
+            return
+        try:
+            with transaction.atomic():
+                authors = {name for values in batch for name in values['authors']}
+                genres = {name for values in batch for name in values['genres']}
+                author_ids = get_or_create_names(Author, self.author_ids, authors)
+                genre_ids = get_or_create_names(Genre, self.genre_ids, genres)
+                self.insert(batch, author_ids, genre_ids)
+        except DatabaseError:
+            self.load_rows(parsed_rows)
+        else:
+            # Only kept once the transaction has committed
+            self.author_ids.update(author_ids)
+            self.genre_ids.update(genre_ids)
+            self.book_keys.update(keys)
+            self.loaded += len(batch)
+
+    def load_rows(self, rows):
+        """
+        Loads rows one at a time with load_row(), reporting the ones that fail
+        :param rows: list of dict, rows that parse
+        """
+        for row in rows:
+            if load_row(row):
+                self.loaded += 1
+                self.book_keys.add(book_key(parse_row(row)[field] for field in BOOK_FIELDS))
+
+        # load_row() may have created authors and genres that the maps don't have yet
+        self.author_ids.update(find_names(Author, {name for row in rows for name in row['book_authors'].split('|')}))
+        self.genre_ids.update(find_names(Genre, {name for row in rows for name in row['genres'].split('|')}))
+
+    def insert(self, batch, author_ids, genre_ids):
+        books = bulk_create_with_ids(Book, [
+            Book(**{field: values[field] for field in BOOK_FIELDS}) for values in batch
+        ])
+
+        book_authors = []
+        book_genres = []
+        inventories = []
+        for book, values in zip(books, batch):
+            # dict.fromkeys() drops repeated names but keeps their order
+            for name in dict.fromkeys(values['authors']):
+                book_authors.append(Book.author.through(book_id=book.id, author_id=author_ids[name]))
+            for name in dict.fromkeys(values['genres']):
+                book_genres.append(Book.genre.through(book_id=book.id, genre_id=genre_ids[name]))
+            copies = random.randint(1, 5)
+            inventories.append(Inventory(book_id=book.id, available=copies, owned=copies))
+
+        Book.author.through.objects.bulk_create(book_authors)
+        Book.genre.through.objects.bulk_create(book_genres)
+        Inventory.objects.bulk_create(inventories)
+        refresh_listings([book.id for book in books])
+        refresh_stats({link.author_id for link in book_authors}, {link.genre_id for link in book_genres})
+
+
+def load_csv(data_csv, bulk=False, batch_size=DEFAULT_BATCH_SIZE, workers=1, progress=False):
+    """
+    Loads the data for a csv similar to book_data
+    :param data_csv: str, path to book_data.csv or equivalent
+    :param bulk: bool, load in batches with BulkLoader instead of row by row
+    :param batch_size: int, rows per batch when bulk
+    :param workers: int, processes parsing rows when bulk
+    :param progress: bool, report throughput and time left when bulk
+    """
+    if bulk:
+        BulkLoader(batch_size).load_file(data_csv, workers=workers, progress=progress)
+    else:
+        with open(data_csv, 'r') as csv_file:
+            reader = csv.DictReader(csv_file, quotechar='"')
 
-            except Exception as e:
-                print('Row could not be loaded due to {}: {}'.format(e, row))
+            for row in reader:
+                load_row(row)
 
     print('Finished loading')
 
@@ -139,6 +369,19 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('csv_file', help='path to book_data.csv or equivalent')
+        parser.add_argument('--bulk', action='store_true',
+                            help='load in batches with bulk inserts, much faster for large files')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='rows per transaction with --bulk (default %(default)s)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='processes parsing rows, implies --bulk (default %(default)s)')
 
     def handle(self, *args, **options):
-        load_csv(options['csv_file'])
+        bulk = options['bulk'] or options['workers'] > 1
+        load_csv(
+            options['csv_file'],
+            bulk=bulk,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            progress=bulk and options['verbosity'] > 0,
+        )
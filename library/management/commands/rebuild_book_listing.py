@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+from library import cache
+from library.listing import rebuild_listings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the BookListing table that book listings are read from, e.g. after writes that bypassed signals'
+
+    def handle(self, *args, **options):
+        rebuild_listings()
+        cache.invalidate_all()
+        print('Finished rebuilding')
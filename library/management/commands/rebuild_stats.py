@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+from library import cache
+from library.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the book stats of every author and genre, e.g. after writes that bypassed signals'
+
+    def handle(self, *args, **options):
+        rebuild_stats()
+        cache.invalidate_all()
+        print('Finished rebuilding')
@@ -0,0 +1,101 @@
+from django.db import migrations
+
+# The search index is kept out of the Book model so that normal queries never load it. Triggers keep it up to date on
+# every write, including bulk_create and queryset.update(), which bypass model signals.
+#
+# Note for SQLite: migrations that rebuild library_book (e.g. AlterField) drop its triggers, so such a migration has to
+# recreate them from CREATE_SQLITE afterwards.
+
+POSTGRESQL_VECTOR = (
+    "setweight(to_tsvector('english', coalesce({0}title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({0}description, '')), 'B')"
+)
+
+CREATE_POSTGRESQL = [
+    'ALTER TABLE library_book ADD COLUMN search_vector tsvector',
+    'UPDATE library_book SET search_vector = {}'.format(POSTGRESQL_VECTOR.format('')),
+    'CREATE INDEX library_book_search_vector_gin ON library_book USING gin (search_vector)',
+    """
+    CREATE FUNCTION library_book_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := {};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """.format(POSTGRESQL_VECTOR.format('NEW.')),
+    """
+    CREATE TRIGGER library_book_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON library_book
+    FOR EACH ROW EXECUTE PROCEDURE library_book_search_vector_update()
+    """,
+]
+
+DROP_POSTGRESQL = [
+    'DROP TRIGGER library_book_search_vector_trigger ON library_book',
+    'DROP FUNCTION library_book_search_vector_update()',
+    'DROP INDEX library_book_search_vector_gin',
+    'ALTER TABLE library_book DROP COLUMN search_vector',
+]
+
+# External content table, so the text is stored once, in library_book
+CREATE_SQLITE = [
+    "CREATE VIRTUAL TABLE library_book_fts USING fts5(title, description, content='library_book', content_rowid='id')",
+    "INSERT INTO library_book_fts(library_book_fts) VALUES ('rebuild')",
+    """
+    CREATE TRIGGER library_book_fts_insert AFTER INSERT ON library_book BEGIN
+        INSERT INTO library_book_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER library_book_fts_delete AFTER DELETE ON library_book BEGIN
+        INSERT INTO library_book_fts(library_book_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER library_book_fts_update AFTER UPDATE OF title, description ON library_book BEGIN
+        INSERT INTO library_book_fts(library_book_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO library_book_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+DROP_SQLITE = [
+    'DROP TRIGGER library_book_fts_update',
+    'DROP TRIGGER library_book_fts_delete',
+    'DROP TRIGGER library_book_fts_insert',
+    'DROP TABLE library_book_fts',
+]
+
+
+def run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run(schema_editor, CREATE_POSTGRESQL)
+    elif vendor == 'sqlite':
+        run(schema_editor, CREATE_SQLITE)
+
+
+def drop_search(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        run(schema_editor, DROP_POSTGRESQL)
+    elif vendor == 'sqlite':
+        run(schema_editor, DROP_SQLITE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+
+
+def build_listings(apps, schema_editor):
+    from library.listing import rebuild_listings
+    rebuild_listings(apps.get_model('library', 'Book'), apps.get_model('library', 'BookListing'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_book_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookListing',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('isbn', models.CharField(blank=True, max_length=20)),
+                ('title', models.TextField()),
+                ('type', models.CharField(blank=True, choices=[('Kindle Edition', 'Kindle Edition'), ('Hardcover', 'Hardcover'), ('ebook', 'ebook'), ('Paperback', 'Paperback')], max_length=25)),
+                ('edition', models.TextField(blank=True)),
+                ('pages', models.IntegerField(null=True)),
+                ('rating', models.FloatField(null=True)),
+                ('rating_count', models.IntegerField(null=True)),
+                ('review_count', models.IntegerField(null=True)),
+                ('image_url', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('authors', models.TextField(default='[]')),
+                ('genres', models.TextField(default='[]')),
+                ('available', models.PositiveIntegerField(null=True)),
+                ('owned', models.PositiveIntegerField(null=True)),
+            ],
+        ),
+        migrations.RunPython(build_listings, migrations.RunPython.noop),
+    ]
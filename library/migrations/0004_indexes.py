@@ -0,0 +1,49 @@
+# Generated by Django 2.2.18 on 2026-10-17 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_book_listing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['name'], name='author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['title', 'id'], name='listing_title_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['edition', 'id'], name='listing_edition_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['pages', 'id'], name='listing_pages_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['rating', 'id'], name='listing_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['isbn'], name='listing_isbn_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['type'], name='listing_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['rating_count'], name='listing_rating_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklisting',
+            index=models.Index(fields=['review_count'], name='listing_review_count_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 2.2.18 on 2026-10-17 18:10
+
+from django.db import migrations, models
+
+
+def build_stats(apps, schema_editor):
+    from library.stats import rebuild_stats
+    rebuild_stats(
+        apps.get_model('library', 'Book'),
+        apps.get_model('library', 'Author'),
+        apps.get_model('library', 'Genre'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='avg_rating',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='copies_owned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='rated_book_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='author',
+            name='rating_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='avg_rating',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='book_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='copies_owned',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='rated_book_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='rating_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['book_count', 'id'], name='author_book_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['avg_rating', 'id'], name='author_avg_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['book_count', 'id'], name='genre_book_count_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='genre',
+            index=models.Index(fields=['avg_rating', 'id'], name='genre_avg_rating_id_idx'),
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,128 @@
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from library import cache, counts, routers
+from library.timing import timed
+
+
+class CachedResponseMixin:
+    """
+    Serves GET requests for cached_actions from the response cache in library.cache, and stores successful JSON
+    responses in it. Only for public reads, since a hit is returned before authentication and permissions run.
+    """
+    # Tag of the viewset's resource, e.g. 'book'
+    cache_tag = None
+    cached_actions = ['list', 'retrieve']
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get('get') if request.method == 'GET' else None
+        if action not in self.cached_actions or not cache.enabled():
+            return super().dispatch(request, *args, **kwargs)
+
+        response = cache.get_response(request)
+        if response is not None:
+            return response
+
+        # Versions are read before the response is built, so that a write happening meanwhile invalidates it
+        versions = cache.get_versions(self.get_cache_scope(kwargs))
+        response = super().dispatch(request, *args, **kwargs)
+
+        renderer = getattr(response, 'accepted_renderer', None)
+        if response.status_code == 200 and renderer is not None and renderer.format == 'json':
+            with timed('render'):
+                response.render()
+            item_tag = getattr(self, 'nested_view', self).cache_tag
+            tags = cache.content_tags(response.data, item_tag)
+            versions.update(cache.get_versions(tags - set(versions)))
+            # A replica that hasn't caught up with a write yet would otherwise cache its old data under new versions
+            cache.set_response(request, response, versions, store=not routers.may_be_stale())
+        return response
+
+    def get_cache_scope(self, kwargs):
+        """
+        Gets the tags for what a request lists or shows, e.g. 'book:list' or 'author:3' for /authors/3/books/
+        :param kwargs: dict, the url's keyword arguments
+        :return: list of str
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in kwargs:
+            return [cache.ALL, '{}:{}'.format(self.cache_tag, kwargs[lookup_url_kwarg])]
+        return [cache.ALL, '{}:list'.format(self.cache_tag)]
+
+
+class NestedListMixin:
+    """
+    Lists a resource related to a viewset's object, e.g. /authors/1/books/, exactly the way the related resource's own
+    viewset lists it: same prefetching, filters, ordering, pagination class and serializer.
+    """
+
+    def get_parent_object(self):
+        """
+        Gets the object a nested action belongs to. Unlike get_object this doesn't filter by the query parameters,
+        since they are meant for the nested resource.
+        :return: Model
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        obj = get_object_or_404(self.get_queryset(), **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def get_nested_view(self, viewset_class):
+        """
+        Builds an instance of viewset_class for the current request, set up as if it were handling its list action
+        :param viewset_class: ViewSet class of the nested resource, e.g. BookViewSet
+        :return: ViewSet
+        """
+        return viewset_class(
+            request=self.request,
+            args=(),
+            kwargs={},
+            format_kwarg=self.format_kwarg,
+            action='list',
+        )
+
+    def nested_list(self, viewset_class, distinct=False, count=None, **lookups):
+        """
+        Lists the nested resource's rows matching lookups
+        :param viewset_class: ViewSet class of the nested resource, e.g. BookViewSet
+        :param distinct: bool, whether lookups span a many to many relation and can return duplicates
+        :param count: int or None, number of rows matching lookups if already known, so that no COUNT(*) is run.
+                      Ignored when the request filters the nested resource.
+        :param lookups: filter arguments restricting the nested resource to this viewset's object. A nested viewset
+                        with a filter_related(queryset, **lookups) method applies them itself.
+        :return: Response
+        """
+        view = self.get_nested_view(viewset_class)
+        self.nested_view = view
+        # A cached count of the nested rows also has to be invalidated by writes to this view's object
+        parent_scope = self.get_cache_scope(self.kwargs) if hasattr(self, 'get_cache_scope') else []
+        view.count_scope = parent_scope + counts.get_scope(view)
+
+        if hasattr(view, 'filter_related'):
+            # The nested view reads from a table the lookups don't apply to directly, e.g. BookListing
+            queryset = view.filter_related(view.get_queryset(), **lookups)
+        else:
+            queryset = view.get_queryset().filter(**lookups)
+        if distinct:
+            queryset = queryset.distinct()
+        queryset = view.filter_queryset(queryset)
+
+        filter_params = list(getattr(view, 'filterset_fields', None) or [])
+        filter_params += [backend.search_param for backend in view.filter_backends if hasattr(backend, 'search_param')]
+        if any(param in self.request.query_params for param in filter_params):
+            # A known count is for the unfiltered rows
+            count = None
+
+        if count is None:
+            page = view.paginate_queryset(queryset)
+        else:
+            page = view.paginator.paginate_queryset(queryset, view.request, view=view, count=count)
+
+        if page is None:
+            serializer = view.get_serializer(queryset, many=True)
+            return Response(serializer.data)
+
+        # Keep the paginator on this view as well so the browsable API renders its controls
+        self._paginator = view.paginator
+        serializer = view.get_serializer(page, many=True)
+        return view.get_paginated_response(serializer.data)
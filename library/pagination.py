@@ -0,0 +1,304 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models import Q
+from django.template import loader
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from library import counts, parallel
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination that seeks on the queryset's ordering fields plus the primary key, so a page costs one indexed
+    range scan no matter how deep it is and no COUNT(*) is ever run.
+
+    The ordering is read from the queryset, so it works with whatever OrderingFilter applied. NULLs are kept where the
+    database puts them by default, which lets the (field, id) indexes serve the ordering on both SQLite and PostgreSQL.
+    """
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+    template = 'rest_framework/pagination/previous_and_next.html'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = remove_query_param(request.build_absolute_uri(), self.page_query_param)
+        self.ordering = self.get_ordering(queryset)
+
+        ordering, position, reverse = self.decode_cursor(request)
+        if ordering is not None and ordering != self.ordering:
+            # The cursor was made for a different ?ordering=
+            raise NotFound(self.invalid_cursor_message)
+
+        # Going backwards flips every field, which keeps the same index usable
+        traverse = [self.__flip(field) for field in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*traverse)
+
+        if position is not None:
+            seek = self.seek_filter(queryset, traverse, position)
+            queryset = queryset.filter(seek) if seek is not None else queryset.none()
+
+        # Fetch one extra row to find out whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.first_position = self.get_position(results[0]) if results else None
+        self.last_position = self.get_position(results[-1]) if results else None
+        if reverse:
+            self.has_next = bool(results)
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None and bool(results)
+
+        return results
+
+    def get_ordering(self, queryset):
+        """
+        Gets the ordering of queryset with the primary key appended as a tie breaker
+        :param queryset: QuerySet
+        :return: list of str, field names prefixed with '-' when descending
+        """
+        pk_name = queryset.model._meta.pk.name
+        ordering = []
+        for field in queryset.query.order_by or queryset.model._meta.ordering:
+            if not isinstance(field, str):
+                raise ValueError('Keyset pagination only supports ordering by field names, not {!r}'.format(field))
+            if field.lstrip('-') == 'pk':
+                field = field.replace('pk', pk_name)
+            ordering.append(field)
+
+        if not any(field.lstrip('-') == pk_name for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-' + pk_name if descending else pk_name)
+
+        return ordering
+
+    def get_position(self, instance):
+        """
+        Gets the values of the ordering fields for a model instance or a values() row
+        :param instance: Model or dict
+        :return: list
+        """
+        if isinstance(instance, dict):
+            return [instance[field.lstrip('-')] for field in self.ordering]
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def seek_filter(self, queryset, ordering, position):
+        """
+        Builds the filter selecting the rows that come after position, i.e. a row comparison
+        (f1, f2, ..., id) > (v1, v2, ..., pk) spelled out so that it handles NULLs and mixed directions.
+        :param queryset: QuerySet
+        :param ordering: list of str, the ordering the rows are being read in
+        :param position: list, values of the ordering fields for the last row already returned
+        :return: Q or None, None if no rows can come after position
+        """
+        nulls_largest = connections[queryset.db].features.nulls_order_largest
+        seek = None
+        equal = Q()
+
+        for field, value in zip(ordering, position):
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            after = self.__after(queryset.model, name, value, descending, nulls_largest != descending)
+            if after is not None:
+                seek = equal & after if seek is None else seek | (equal & after)
+
+            if value is None:
+                equal &= Q(**{name + '__isnull': True})
+            else:
+                equal &= Q(**{name: value})
+
+        return seek
+
+    @staticmethod
+    def __after(model, name, value, descending, nulls_last):
+        """
+        Builds the filter for the values of a single field that sort strictly after value
+        :return: Q or None
+        """
+        try:
+            nullable = model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            # Annotations, e.g. a search rank
+            nullable = True
+
+        if value is None:
+            # Everything that isn't NULL sorts after NULL when NULLs come first
+            return None if nulls_last else Q(**{name + '__isnull': False})
+
+        after = Q(**{name + ('__lt' if descending else '__gt'): value})
+        if nullable and nulls_last:
+            after |= Q(**{name + '__isnull': True})
+        return after
+
+    @staticmethod
+    def __flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def decode_cursor(self, request):
+        """
+        Decodes the cursor query parameter. A missing or empty cursor is the first page.
+        :return: (list or None, list or None, bool), ordering, position and whether to read backwards
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, None, False
+
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            ordering, position, reverse = cursor['o'], cursor['p'], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(ordering, list) or not isinstance(position, list) or len(ordering) != len(position):
+            raise NotFound(self.invalid_cursor_message)
+
+        return ordering, position, reverse
+
+    def encode_cursor(self, position, reverse):
+        """
+        Builds the url for a cursor. The cursor carries the ordering so it can't be replayed against another one.
+        :return: str, url
+        """
+        cursor = {'o': self.ordering, 'p': position, 'r': int(reverse)}
+        encoded = urlsafe_b64encode(json.dumps(cursor, cls=JSONEncoder, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_position, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.first_position, True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_html_context(self):
+        return {
+            'previous_url': self.get_previous_link(),
+            'next_url': self.get_next_link(),
+        }
+
+    def to_html(self):
+        template = loader.get_template(self.template)
+        return template.render(self.get_html_context())
+
+
+class LibraryPagination(PageNumberPagination):
+    """
+    Page number pagination, unless the request has a cursor query parameter (it may be empty for the first page),
+    in which case KeysetPagination is used instead and no count is returned.
+    The count is made by library.counts, in the view's count_mode or the configured one, and count_mode in the
+    response says which mode produced it.
+    """
+    keyset_class = KeysetPagination
+
+    @classmethod
+    def uses_cursor(cls, request):
+        """Checks whether the client asked for keyset pagination"""
+        return cls.keyset_class.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None, count=None):
+        """
+        Paginates queryset, either by page number or by cursor
+        :param count: int or None, number of rows in queryset when the caller already knows it, saves the COUNT(*)
+        :return: list or None
+        """
+        self.keyset = None
+        if self.uses_cursor(request):
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.get_page_size(request)
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        offset = self.get_offset(page_number, page_size)
+
+        rows = None
+        if count is None and offset is not None and parallel.enabled():
+            # The page's rows don't depend on the count, only checking that the page exists does
+            rows, (count, self.count_mode) = parallel.run(
+                lambda: list(queryset[offset:offset + page_size]),
+                lambda: counts.count(queryset, getattr(view, 'count_mode', None), counts.get_scope(view)),
+            )
+        elif count is None:
+            count, self.count_mode = counts.count(queryset, getattr(view, 'count_mode', None), counts.get_scope(view))
+        else:
+            self.count_mode = counts.EXACT
+        # Paginator.count is a cached_property, so setting it means it is never queried
+        paginator.count = count
+
+        if page_number in self.last_page_strings:
+            page_number = paginator.num_pages
+
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+        if rows is not None:
+            self.page.object_list = rows
+
+        if paginator.num_pages > 1 and self.template is not None:
+            # The browsable API should display pagination controls.
+            self.display_page_controls = True
+
+        self.request = request
+        return list(self.page)
+
+    def get_offset(self, page_number, page_size):
+        """
+        :param page_number: str or int, the page query parameter
+        :param page_size: int
+        :return: int or None, the offset of the page's first row, None if it needs the count, e.g. 'last'
+        """
+        try:
+            number = int(page_number)
+        except (TypeError, ValueError):
+            return None
+        return (number - 1) * page_size if number >= 1 else None
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_mode', self.count_mode),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def to_html(self):
+        if self.keyset is not None:
+            return self.keyset.to_html()
+        return super().to_html()
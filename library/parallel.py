@@ -0,0 +1,88 @@
+"""
+Runs the independent queries behind one response at the same time, e.g. a page's rows and its count, each on its own
+database connection. The executor's threads keep their connections open from one call to the next, whatever
+CONN_MAX_AGE is, so a query doesn't pay for connecting to the database on top of its own time.
+
+Only requests handled under use_executor() do, which library.asgi does for the catalog reads of the viewsets'
+concurrent_actions. Everywhere else run() makes its calls one after the other on the request's own connection, so the
+WSGI entry point, transactions and tests behave as they always did.
+"""
+import threading
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar, copy_context
+
+from django.db import connections
+
+from library import timing
+
+# Executor of the request being handled, None to run calls one after the other
+_executor = ContextVar('library_query_executor', default=None)
+# Set in the executor's threads, so that calls made from a call don't wait on the executor they are running on
+_worker = threading.local()
+
+
+@contextmanager
+def use_executor(executor):
+    """
+    Makes run() use executor in the block
+    :param executor: concurrent.futures.Executor or None
+    """
+    token = _executor.set(executor)
+    try:
+        yield
+    finally:
+        _executor.reset(token)
+
+
+def enabled():
+    """
+    :return: bool, whether run() runs calls concurrently here
+    """
+    return _executor.get() is not None and not getattr(_worker, 'active', False)
+
+
+def work(call):
+    """Runs a call in an executor thread, with the request's timing if it is sampled"""
+    _worker.active = True
+    try:
+        with ExitStack() as stack:
+            request_timing = timing.current()
+            if request_timing is not None:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(request_timing.execute))
+            return call()
+    finally:
+        _worker.active = False
+        release_connections()
+
+
+def release_connections():
+    """
+    Closes the connections of an executor thread that an error left unusable, or that are older than a CONN_MAX_AGE
+    other than 0. A CONN_MAX_AGE of 0 would close them after every call, while the threads are few and long lived.
+    """
+    for connection in connections.all():
+        if not connection.settings_dict['CONN_MAX_AGE']:
+            connection.close_at = None
+        connection.close_if_unusable_or_obsolete()
+
+
+def run(*calls):
+    """
+    Calls each function, concurrently if enabled(). The first one runs in this thread and the others in the executor.
+    :param calls: functions without arguments, that don't depend on each other
+    :return: list, what each function returned, in order
+    """
+    if len(calls) < 2 or not enabled():
+        return [call() for call in calls]
+
+    executor = _executor.get()
+    # A context can't be entered by two threads at once, so each call gets a copy
+    futures = [executor.submit(copy_context().run, work, call) for call in calls[1:]]
+    try:
+        first = calls[0]()
+    finally:
+        # Never leave a call running after an error, it could still be using the request's data
+        for future in futures:
+            future.exception()
+    return [first] + [future.result() for future in futures]
@@ -0,0 +1,37 @@
+"""FastJSONParser, the JSON parser of the api"""
+import codecs
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from library.renderers import FastJSONRenderer, orjson
+
+# orjson reads integers past 64 bits as floats, json as ints. Integers of 19 digits can already be past them, and
+# bodies with 19 digits in a row anywhere are left to json. Found by turning every digit into 0 and anything else into
+# a space, as a regular expression takes longer than parsing.
+DIGITS = bytes(ord('0') if ord('0') <= byte <= ord('9') else ord(' ') for byte in range(256))
+LONG_NUMBER = b'0' * 19
+
+
+class FastJSONParser(JSONParser):
+    """
+    Parses request bodies into the same data as DRF's JSONParser, with orjson when it is installed. Falls back to
+    JSONParser without orjson, for encodings other than utf-8, long integers and bodies orjson rejects, so that
+    invalid JSON gets the error message it always got.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if LONG_NUMBER not in body.translate(DIGITS):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,193 @@
+"""
+On-demand profiling of requests with cProfile.
+
+ProfilingMiddleware profiles every request when LIBRARY_PROFILING['ENABLED'] is set, and otherwise only requests that
+send the profiling header with the secret in LIBRARY_PROFILING['TOKEN'], so that it can stay installed in production
+and be used against real traffic. Each profiled request writes a .pstats file, to be read with pstats or snakeviz, and
+a .collapsed file of sampled stacks for flamegraph.pl or speedscope. The file name is returned in the profiling header.
+Only the newest profiles are kept, up to MAX_FILES of them and MAX_MEGABYTES in all.
+"""
+import cProfile
+import hmac
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+DEFAULTS = {
+    # Profile every request, for local use
+    'ENABLED': False,
+    # Requests with this header set to TOKEN are profiled. No token disables the header.
+    'HEADER': 'X-Library-Profile',
+    'TOKEN': None,
+    # Defaults to profiles/ in BASE_DIR
+    'DIRECTORY': None,
+    'MAX_FILES': 50,
+    'MAX_MEGABYTES': 200,
+    # Milliseconds between the stack samples of the collapsed file
+    'SAMPLE_INTERVAL': 1,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LIBRARY_PROFILING', {}))
+    config['DIRECTORY'] = config['DIRECTORY'] or os.path.join(settings.BASE_DIR, 'profiles')
+    return config
+
+
+def wants_profile(request, config):
+    """
+    :param request: HttpRequest
+    :param config: dict, see get_config()
+    :return: bool
+    """
+    if config['ENABLED']:
+        return True
+    token = config['TOKEN']
+    sent = request.META.get('HTTP_' + config['HEADER'].upper().replace('-', '_'))
+    return bool(token and sent) and hmac.compare_digest(sent.encode('utf-8'), token.encode('utf-8'))
+
+
+def frame_name(code):
+    """
+    :param code: code object of a frame
+    :return: str, e.g. views.py:132:get_queryset
+    """
+    return '{}:{}:{}'.format(os.path.basename(code.co_filename), code.co_firstlineno, code.co_name)
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of a thread at an interval, for the collapsed file. cProfile only records who called whom, which
+    can't tell apart the places the same function appears in a request's stack (every middleware is called through the
+    same wrapper), so flame graphs are built from real stacks instead.
+    """
+
+    def __init__(self, thread_id, interval, root):
+        """
+        :param thread_id: int, thread to sample
+        :param interval: float, seconds between samples
+        :param root: code object, this frame and the ones that called it are left out
+        """
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None and frame.f_code is not self.root:
+                names.append(frame_name(frame.f_code))
+                frame = frame.f_back
+            if names:
+                stack = ';'.join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        """
+        :return: list of str, lines of 'frame;frame;frame samples'
+        """
+        return ['{} {}'.format(stack, count) for stack, count in sorted(self.stacks.items())]
+
+
+def profile_name(request):
+    """
+    :param request: HttpRequest
+    :return: str, file name without extension, sorting in the order requests were made
+    """
+    path = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-')[:80] or 'root'
+    return '{}-{}-{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), request.method, path, uuid.uuid4().hex[:8])
+
+
+def write_profile(profile, sampler, directory, name):
+    """
+    :param profile: cProfile.Profile, disabled
+    :param sampler: StackSampler, stopped
+    :param directory: str
+    :param name: str, see profile_name()
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    profile.dump_stats(path + '.pstats')
+    with open(path + '.collapsed', 'w') as collapsed_file:
+        for line in sampler.collapsed():
+            collapsed_file.write(line + '\n')
+
+
+def prune(directory, max_files, max_megabytes):
+    """
+    Deletes the oldest profiles until at most max_files are left and they take at most max_megabytes
+    :param directory: str
+    :param max_files: int
+    :param max_megabytes: float
+    """
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.pstats'):
+            base = entry.path[:-len('.pstats')]
+            size = entry.stat().st_size
+            if os.path.exists(base + '.collapsed'):
+                size += os.path.getsize(base + '.collapsed')
+            profiles.append((entry.stat().st_mtime, entry.name, base, size))
+    # Newest first
+    profiles.sort(reverse=True)
+
+    total = 0
+    for index, (mtime, name, base, size) in enumerate(profiles):
+        total += size
+        if index >= max_files or total > max_megabytes * 1024 * 1024:
+            for extension in ('.pstats', '.collapsed'):
+                try:
+                    os.remove(base + extension)
+                except FileNotFoundError:
+                    # Pruned by another worker
+                    pass
+
+
+class ProfilingMiddleware:
+    """Profiles requests with cProfile, see the module docstring"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        if not wants_profile(request, config):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already running in this thread
+            return self.get_response(request)
+        sampler = StackSampler(threading.get_ident(), config['SAMPLE_INTERVAL'] / 1000, self.profile.__code__)
+        sampler.start()
+        try:
+            response = self.profile(request)
+        finally:
+            profile.disable()
+            sampler.stop()
+
+        name = profile_name(request)
+        write_profile(profile, sampler, config['DIRECTORY'], name)
+        prune(config['DIRECTORY'], config['MAX_FILES'], config['MAX_MEGABYTES'])
+        response[config['HEADER']] = name
+        return response
+
+    def profile(self, request):
+        # Separate from __call__, so that sampled stacks start below it
+        return self.get_response(request)
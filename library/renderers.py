@@ -0,0 +1,142 @@
+"""
+FastJSONRenderer, the JSON renderer of the api, and the renderers for GET /books/export/. Besides render(), which
+renders a list of books at once, the export renderers have stream(), which renders an iterable of chunks of books a
+chunk at a time for a StreamingHttpResponse.
+"""
+import csv
+import io
+import json
+import re
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Non str keys are written like json writes them, dates and times are left to DRF's encoder
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+    if orjson is not None else None
+)
+# orjson writes exponents as 1e16 and 5e-8, json as 1e+16 and 5e-08. Matches inside strings only cost a fallback.
+# Starts with the e, which re finds far faster than a digit.
+ORJSON_EXPONENT = re.compile(rb'e(?<=[0-9]e)-?[0-9]')
+
+# The columns of book_data.csv, so that an export can be loaded again with load_book_data
+CSV_COLUMNS = [
+    'book_authors',
+    'book_desc',
+    'book_edition',
+    'book_format',
+    'book_isbn',
+    'book_pages',
+    'book_rating',
+    'book_rating_count',
+    'book_review_count',
+    'book_title',
+    'genres',
+    'image_url',
+]
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders the same bytes as DRF's JSONRenderer, with orjson when it is installed, which is several times faster on
+    pages of books. Falls back to JSONRenderer without orjson, for indented output (the browsable api), settings that
+    orjson can't follow, and data it writes differently: floats with exponents, integers past 64 bits and objects it
+    doesn't know. The one difference left is NaN and infinity, which orjson writes as null where JSONRenderer raises.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # Raises json's own error if json can't render it either
+            return super().render(data, accepted_media_type, renderer_context)
+        if ORJSON_EXPONENT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does, see there
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class BookStreamRenderer(BaseRenderer):
+    charset = 'utf-8'
+    # File extension of the download
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict):
+            # Errors such as 404 are dicts and not books
+            return json.dumps(data).encode(self.charset)
+        return b''.join(self.stream([data]))
+
+    def stream(self, chunks):
+        """
+        :param chunks: iterable of lists of books, as BookSerializer represents them
+        :return: generator of bytes
+        """
+        raise NotImplementedError
+
+
+class NDJSONRenderer(BookStreamRenderer):
+    """One JSON object per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    extension = 'ndjson'
+
+    def stream(self, chunks):
+        for books in chunks:
+            yield ''.join(json.dumps(book, ensure_ascii=False) + '\n' for book in books).encode(self.charset)
+
+
+class CSVRenderer(BookStreamRenderer):
+    """The format of book_data.csv"""
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, chunks):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, CSV_COLUMNS, quotechar='"')
+        writer.writeheader()
+        for books in chunks:
+            writer.writerows(self.to_row(book) for book in books)
+            yield buffer.getvalue().encode(self.charset)
+            buffer.seek(0)
+            buffer.truncate()
+        # Only the header if there were no books
+        if buffer.tell():
+            yield buffer.getvalue().encode(self.charset)
+
+    @staticmethod
+    def to_row(book):
+        """
+        :param book: dict, as BookSerializer represents a book
+        :return: dict, a row of book_data.csv
+        """
+        def number(value):
+            return '' if value is None else value
+
+        return {
+            'book_authors': '|'.join(author['name'] for author in book['author']),
+            'book_desc': book['description'],
+            'book_edition': book['edition'],
+            'book_format': book['type'],
+            'book_isbn': book['isbn'],
+            'book_pages': '' if book['pages'] is None else '{} pages'.format(book['pages']),
+            'book_rating': number(book['rating']),
+            'book_rating_count': number(book['rating_count']),
+            'book_review_count': number(book['review_count']),
+            'book_title': book['title'],
+            'genres': '|'.join(genre['name'] for genre in book['genre']),
+            'image_url': book['image_url'],
+        }
@@ -0,0 +1,126 @@
+"""
+Read replica routing.
+
+ReplicaMiddleware picks the database alias each api request reads from: one of LIBRARY_REPLICAS['ALIASES'] at random
+for GET, HEAD and OPTIONS requests, the primary (default) for everything else. ReplicaRouter sends reads there, and
+always sends writes, reads inside a transaction such as select_for_update(), and sessions and users to the primary.
+
+Replicas lag behind the primary, so for STICKY_SECONDS after a client writes, a cookie keeps its reads on the primary
+and it sees its own writes. Other clients may read the old data meanwhile; responses and counts read from a replica
+that soon after any write aren't stored in the response cache, so that they aren't served after replication caught
+up. The cookie only makes reads go to the primary, so a forged one costs nothing but replica offloading.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from library import cache
+
+DEFAULTS = {
+    # Database aliases of the replicas, none reads everything from the primary
+    'ALIASES': [],
+    # How long replicas may lag behind the primary: reads stay on it for as long after a write
+    'STICKY_SECONDS': 5,
+    'COOKIE': 'library_primary',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Apps always read from the primary. DRF authenticates in the view, after the middleware picked a replica, and a
+# session or user written just before must be found.
+PRIMARY_APPS = ('sessions', 'auth')
+
+# Alias the request being handled reads from, None for the primary
+_read_alias = ContextVar('library_read_alias', default=None)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LIBRARY_REPLICAS', {}))
+    return config
+
+
+def read_alias():
+    """
+    :return: str or None, the replica the current request reads from, None for the primary
+    """
+    return _read_alias.get()
+
+
+def choose_alias(request, config):
+    """
+    :param request: HttpRequest
+    :param config: dict, see get_config()
+    :return: str or None, a replica for a safe request from a client that hasn't just written, else None
+    """
+    if request.method not in SAFE_METHODS or not config['ALIASES']:
+        return None
+    try:
+        written = float(request.COOKIES.get(config['COOKIE'], 0))
+    except ValueError:
+        written = 0
+    if time.time() - written < config['STICKY_SECONDS']:
+        return None
+    return random.choice(config['ALIASES'])
+
+
+def may_be_stale():
+    """
+    Checks whether the current request may have read data older than the latest write, i.e. it read from a replica
+    within STICKY_SECONDS of a write
+    :return: bool
+    """
+    if read_alias() is None:
+        return False
+    return time.time() - cache.last_write() < get_config()['STICKY_SECONDS']
+
+
+class ReplicaRouter:
+    """Routes reads to the replica ReplicaMiddleware picked, see the module docstring"""
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        if alias is None or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads in a transaction are part of a write, or lock rows with select_for_update()
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas have the same rows as the primary
+        return True
+
+
+class ReplicaMiddleware:
+    """Picks the database each api request reads from, and sets the cookie that keeps writers on the primary"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Streamed responses are read after this returns, and so from the primary
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+        config = get_config()
+        if request.method not in SAFE_METHODS and config['ALIASES']:
+            response.set_cookie(
+                config['COOKIE'], repr(time.time()), max_age=config['STICKY_SECONDS'], httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Only the api's views, which DRF marks with their class, so the admin reads from the primary. Sessions and
+        # users do too, see PRIMARY_APPS.
+        if getattr(view_func, 'cls', None) is not None:
+            _read_alias.set(choose_alias(request, get_config()))
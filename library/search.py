@@ -0,0 +1,78 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+# Titles count for more than descriptions when ranking
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def search_books(queryset, terms):
+    """
+    Filters a Book queryset down to the books whose title or description match terms, ranked by relevance.
+    Uses the search_vector column and its GIN index on PostgreSQL and the library_book_fts FTS5 table on SQLite,
+    both of which are created and kept up to date by database triggers (see migration 0002_book_search).
+    :param queryset: QuerySet of Book
+    :param terms: str, what the user typed
+    :return: QuerySet annotated with search_rank (higher is more relevant) and ordered by it
+    """
+    table = queryset.model._meta.db_table
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+        query = "plainto_tsquery('english', %s)"
+        queryset = queryset.extra(
+            where=['"{}"."search_vector" @@ {}'.format(table, query)],
+            params=[terms],
+        ).annotate(search_rank=RawSQL(
+            'ts_rank("{}"."search_vector", {})'.format(table, query), [terms], output_field=FloatField()
+        ))
+
+    elif vendor == 'sqlite':
+        match = _fts5_query(terms)
+        if match is None:
+            return queryset.none()
+        queryset = queryset.extra(
+            where=['"{0}"."id" IN (SELECT rowid FROM {0}_fts WHERE {0}_fts MATCH %s)'.format(table)],
+            params=[match],
+        ).annotate(search_rank=RawSQL(
+            # bm25 is lower for better matches, so negate it
+            '(SELECT -bm25({0}_fts, %s, %s) FROM {0}_fts WHERE {0}_fts MATCH %s AND rowid = "{0}"."id")'.format(table),
+            [TITLE_WEIGHT, DESCRIPTION_WEIGHT, match],
+            output_field=FloatField(),
+        ))
+
+    else:
+        # No full-text index, so fall back to a scan that at least finds every term
+        for term in terms.split():
+            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    return queryset.order_by('-search_rank', 'id')
+
+
+def _fts5_query(terms):
+    """
+    Turns user input into an FTS5 query matching rows that contain every word. Each word is quoted so that FTS5
+    operators and punctuation in the input are matched literally instead of being parsed.
+    :param terms: str
+    :return: str or None, None if terms has no words
+    """
+    words = re.findall(r'\w+', terms)
+    if not words:
+        return None
+    return ' '.join('"{}"'.format(word) for word in words)
+
+
+class BookSearchFilter(BaseFilterBackend):
+    """Full-text search over Book title and description with ?search="""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        terms = request.query_params.get(self.search_param, '').strip()
+        if not terms:
+            return queryset
+        return search_books(queryset, terms)
@@ -1,8 +1,13 @@
+import json
+from collections import OrderedDict
+
 from rest_framework import serializers
+from library import parallel
 from library.models import *
+from library.timing import TimedSerializerMixin, timed
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Author
         fields = [
@@ -11,7 +16,7 @@ class AuthorSerializer(serializers.ModelSerializer):
         ]
 
 
-class GenreSerializer(serializers.ModelSerializer):
+class GenreSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Genre
         fields = [
@@ -20,7 +25,25 @@ class GenreSerializer(serializers.ModelSerializer):
         ]
 
 
-class InventorySerializer(serializers.ModelSerializer):
+class AuthorStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Author
+        fields = [
+            'id',
+            'name',
+            'book_count',
+            'avg_rating',
+            'copies_owned',
+        ]
+
+
+class GenreStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Genre
+        fields = AuthorStatsSerializer.Meta.fields
+
+
+class InventorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Inventory
         fields = [
@@ -38,7 +61,7 @@ class InventorySerializer(serializers.ModelSerializer):
         return instance
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = AuthorSerializer(many=True, read_only=True)
     genre = GenreSerializer(many=True, read_only=True)
     inventory = InventorySerializer(required=False)
@@ -63,6 +86,24 @@ class BookSerializer(serializers.ModelSerializer):
         ]
         depth = 1
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Fields left out by ?fields= or ?omit=, see library.fieldsets
+        fieldset = self.context.get('fieldset')
+        if fieldset is None:
+            return
+        for name in list(self.fields):
+            if name not in fieldset:
+                self.fields.pop(name)
+                continue
+            # The serializer of a nested object, or of each item of a nested list
+            field = getattr(self.fields[name], 'child', self.fields[name])
+            nested = fieldset.nested(name)
+            if nested and hasattr(field, 'fields'):
+                for nested_name in list(field.fields):
+                    if nested_name not in nested:
+                        field.fields.pop(nested_name)
+
     def create(self, validated_data):
         # DRF's HTML form passes in '' instead of None, so I have to manually override fields that take int
         pages = validated_data.get('pages', None)
@@ -105,3 +146,218 @@ class BookSerializer(serializers.ModelSerializer):
         instance.description = validated_data.get('description', instance.description)
         instance.save()
         return instance
+
+
+class RelatedField(serializers.Field):
+    """
+    An author or genre of a book in a bulk write: its id, its name, or an object with either, the way the API returns
+    them. Names that don't exist yet are created.
+    """
+    default_error_messages = {
+        'invalid': 'Expected an id, a name or an object with either.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            data = data.get('id', data.get('name'))
+        if isinstance(data, int) and not isinstance(data, bool):
+            return data
+        if isinstance(data, str) and data:
+            return data
+        self.fail('invalid')
+
+
+class BookBatchSerializer(BookSerializer):
+    """
+    Validates one book of POST or PATCH /books/bulk/. Unlike BookSerializer the authors and genres can be written,
+    replacing the book's, and id identifies the book to update.
+    """
+    id = serializers.IntegerField(required=False)
+    author = serializers.ListField(child=RelatedField(), required=False)
+    genre = serializers.ListField(child=RelatedField(), required=False)
+
+    def validate_genre(self, value):
+        max_length = Genre._meta.get_field('name').max_length
+        for genre in value:
+            if isinstance(genre, str) and len(genre) > max_length:
+                raise serializers.ValidationError(
+                    'Genre names have at most {} characters: {}'.format(max_length, genre)
+                )
+        return value
+
+
+class BookValuesSerializer:
+    """
+    Read only equivalent of BookSerializer for values() rows, used for GET requests.
+    Skips DRF's per-field machinery and builds the nested authors and genres from two lookup maps, while producing
+    exactly the same data as BookSerializer does for books fetched with Book.objects.with_related().
+    Takes the same instance and many arguments, so it can be returned from get_serializer.
+    """
+    book_fields = [
+        'id',
+        'isbn',
+        'title',
+        'type',
+        'edition',
+        'pages',
+        'rating',
+        'rating_count',
+        'review_count',
+        'image_url',
+        'description',
+    ]
+    # available and owned are NOT NULL, so None means the book has no Inventory and inventory is null, like
+    # BookSerializer returns it
+    inventory_fields = [
+        'inventory__available',
+        'inventory__owned',
+    ]
+    columns = book_fields + inventory_fields
+    # Nested fields of inventory, in the order of inventory_fields
+    inventory_nested = ['available', 'owned']
+    # Columns holding the nested authors and genres, BookValuesSerializer queries them separately
+    related_columns = {}
+
+    # to_representation of each book field on BookSerializer
+    conversions = {
+        'id': int,
+        'isbn': str,
+        'title': str,
+        'type': str,
+        'edition': str,
+        'pages': int,
+        'rating': float,
+        'rating_count': int,
+        'review_count': int,
+        'image_url': str,
+        'description': str,
+    }
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        # Fields asked for with ?fields= or ?omit=, None for all of them, see library.fieldsets
+        self.fieldset = self.context.get('fieldset')
+
+    @classmethod
+    def get_columns(cls, fieldset=None):
+        """
+        Gets the columns to read for the fields of a fieldset
+        :param fieldset: Fieldset or None, None for every field
+        :return: list of str
+        """
+        if fieldset is None:
+            return cls.columns
+        columns = [field for field in cls.book_fields if field in fieldset]
+        columns += [column for name, column in cls.related_columns.items() if name in fieldset]
+        nested = fieldset.nested('inventory')
+        columns += [column for name, column in zip(cls.inventory_nested, cls.inventory_fields) if name in nested]
+        return columns
+
+    def includes(self, name):
+        return self.fieldset is None or name in self.fieldset
+
+    def nested_fields(self, name, default):
+        return default if self.fieldset is None else self.fieldset.nested(name)
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        book_ids = [row['id'] for row in rows]
+        authors, genres = parallel.run(
+            lambda: self.related_map(Book.author.through, 'author', book_ids) if self.includes('author') else {},
+            lambda: self.related_map(Book.genre.through, 'genre', book_ids) if self.includes('genre') else {},
+        )
+
+        with timed('serialize'):
+            books = [
+                self.to_representation(row, authors.get(row['id'], []), genres.get(row['id'], [])) for row in rows
+            ]
+        return books if self.many else books[0]
+
+    def related_map(self, through, field, book_ids):
+        """
+        Gets the nested representation of a many to many relation for a list of books in a single query
+        :param through: through model of the relation, e.g. Book.author.through
+        :param field: str, name of the related model's foreign key on through, e.g. 'author'
+        :param book_ids: list of int
+        :return: dict, book id -> list of OrderedDict with id and name, ordered by id
+        """
+        related = {}
+        queryset = through.objects.filter(book_id__in=book_ids).order_by(field + '_id')
+        if 'name' not in self.nested_fields(field, ['name']):
+            # Leaves out the join to the related table
+            for book_id, related_id in queryset.values_list('book_id', field + '_id'):
+                related.setdefault(book_id, []).append(OrderedDict([('id', related_id)]))
+            return related
+        for book_id, related_id, name in queryset.values_list('book_id', field + '_id', field + '__name'):
+            related.setdefault(book_id, []).append(OrderedDict([('id', related_id), ('name', name)]))
+        return related
+
+    def to_representation(self, row, authors, genres):
+        """
+        :param row: dict, with the keys in columns
+        :param authors: list of OrderedDict, the book's nested authors
+        :param genres: list of OrderedDict, the book's nested genres
+        :return: OrderedDict
+        """
+        book = OrderedDict()
+        fieldset = self.fieldset
+        for field in self.book_fields:
+            if fieldset is None or field in fieldset:
+                value = row[field]
+                book[field] = None if value is None else self.conversions[field](value)
+        if fieldset is None or 'author' in fieldset:
+            book['author'] = authors
+        if fieldset is None or 'genre' in fieldset:
+            book['genre'] = genres
+
+        if fieldset is None or 'inventory' in fieldset:
+            nested = self.nested_fields('inventory', self.inventory_nested)
+            columns = [(name, column) for name, column in zip(self.inventory_nested, self.inventory_fields)
+                       if name in nested]
+            if row[columns[0][1]] is None:
+                book['inventory'] = None
+            else:
+                book['inventory'] = OrderedDict((name, int(row[column])) for name, column in columns)
+        return book
+
+
+class BookListingSerializer(BookValuesSerializer):
+    """
+    Read only equivalent of BookSerializer for BookListing values() rows, which have the nested authors and genres
+    inline, so serializing a page needs no queries at all
+    """
+    inventory_fields = [
+        'available',
+        'owned',
+    ]
+    columns = BookValuesSerializer.book_fields + ['authors', 'genres'] + inventory_fields
+    related_columns = OrderedDict([('author', 'authors'), ('genre', 'genres')])
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        author_names = 'name' in self.nested_fields('author', ['name'])
+        genre_names = 'name' in self.nested_fields('genre', ['name'])
+        with timed('serialize'):
+            books = [
+                self.to_representation(
+                    row,
+                    self.nested(row['authors'], author_names) if self.includes('author') else None,
+                    self.nested(row['genres'], genre_names) if self.includes('genre') else None,
+                ) for row in rows
+            ]
+        return books if self.many else books[0]
+
+    @staticmethod
+    def nested(pairs, names=True):
+        """
+        :param pairs: str, JSON list of [id, name] pairs
+        :param names: bool, include the names
+        :return: list of OrderedDict with id and name
+        """
+        if not names:
+            return [OrderedDict([('id', related_id)]) for related_id, name in json.loads(pairs)]
+        return [OrderedDict([('id', related_id), ('name', name)]) for related_id, name in json.loads(pairs)]
@@ -0,0 +1,162 @@
+"""Keeps derived data in step with writes to the library models. Connected in LibraryConfig.ready()"""
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from library import cache, listing, stats
+from library.models import *
+
+
+def after_write(func, *args):
+    """
+    Runs func now, and again when the surrounding transaction commits, so that a read racing the write can't put
+    data from before the commit back into the cache
+    """
+    func(*args)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: func(*args))
+
+
+def saved_value(model, instance, field, default=None):
+    """
+    Reads a field as it is in the database, before a pending save() of instance
+    :return: the value, or default if instance isn't saved yet
+    """
+    if instance.pk is None:
+        return default
+    values = model.objects.filter(pk=instance.pk).values_list(field, flat=True)
+    return next(iter(values), default)
+
+
+@receiver(pre_save, sender=Book)
+def book_saving(sender, instance, **kwargs):
+    # The rating the book's authors' and genres' stats include until this save
+    instance._saved_rating = saved_value(Book, instance, 'rating')
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    listing.refresh_listings([instance.id])
+    after_write(cache.invalidate_books, [instance.id])
+
+    saved_rating = getattr(instance, '_saved_rating', None)
+    if not created and saved_rating != instance.rating:
+        author_ids, genre_ids = stats.apply_to_book(instance.id, **stats.rating_changes(saved_rating, instance.rating))
+        after_write(cache.invalidate_stats, author_ids, genre_ids)
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    # The links and the inventory are gone by post_delete
+    instance._deleted_author_ids = list(instance.author.values_list('id', flat=True))
+    instance._deleted_genre_ids = list(instance.genre.values_list('id', flat=True))
+    instance._deleted_owned = next(iter(Inventory.objects.filter(book=instance).values_list('owned', flat=True)), 0)
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    listing.refresh_listings([instance.id])
+    after_write(cache.invalidate_books, [instance.id], instance._deleted_author_ids, instance._deleted_genre_ids)
+
+    changes = stats.rating_changes(instance.rating, None)
+    changes.update(books=-1, owned=-instance._deleted_owned)
+    stats.apply(Author, instance._deleted_author_ids, **changes)
+    stats.apply(Genre, instance._deleted_genre_ids, **changes)
+    after_write(cache.invalidate_stats, instance._deleted_author_ids, instance._deleted_genre_ids)
+
+
+@receiver(pre_save, sender=Inventory)
+def inventory_saving(sender, instance, **kwargs):
+    instance._saved_owned = saved_value(Inventory, instance, 'owned', 0)
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def inventory_changed(sender, instance, signal, **kwargs):
+    listing.refresh_listings([instance.book_id])
+    after_write(cache.invalidate_book_content, [instance.book_id])
+
+    # When the book itself is being deleted its links are already gone, and book_deleted() subtracts the copies
+    if signal is post_delete:
+        owned = -instance.owned
+    else:
+        owned = instance.owned - getattr(instance, '_saved_owned', 0)
+    if owned:
+        author_ids, genre_ids = stats.apply_to_book(instance.book_id, owned=owned)
+        after_write(cache.invalidate_stats, author_ids, genre_ids)
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Genre)
+def related_deleting(sender, instance, **kwargs):
+    # The links are gone by post_delete
+    instance._deleted_book_ids = list(instance.book_set.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def author_changed(sender, instance, **kwargs):
+    book_ids = getattr(instance, '_deleted_book_ids', None)
+    listing.refresh_listings(listing.author_book_ids([instance.id]) if book_ids is None else book_ids)
+    after_write(cache.invalidate_authors, [instance.id])
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    book_ids = getattr(instance, '_deleted_book_ids', None)
+    listing.refresh_listings(listing.genre_book_ids([instance.id]) if book_ids is None else book_ids)
+    after_write(cache.invalidate_genres, [instance.id])
+
+
+def link_changes(instance, action, reverse, model, pk_set, field):
+    """
+    Gets the books and related objects affected by an m2m_changed signal on Book.author or Book.genre
+    :param field: str, 'author' or 'genre'
+    :return: (list of int, list of int) or None, book ids and related ids, or None for pre_* actions
+    """
+    linked = instance.book_set if reverse else getattr(instance, field)
+    if action == 'pre_clear':
+        # pk_set is None for clear(), so remember what is about to be removed
+        instance._cleared_ids = list(linked.values_list('id', flat=True))
+        return None
+    if action == 'pre_remove':
+        # pk_set has every id passed to remove(), including ones that weren't linked
+        instance._removed_ids = list(linked.filter(id__in=pk_set).values_list('id', flat=True))
+        return None
+    if action == 'post_clear':
+        changed = instance._cleared_ids
+    elif action == 'post_remove':
+        changed = instance._removed_ids
+    elif action == 'post_add':
+        # Only the ids that weren't linked yet
+        changed = list(pk_set)
+    else:
+        return None
+
+    if reverse:
+        # e.g. author.book_set.add(book)
+        return changed, [instance.id]
+    return [instance.id], changed
+
+
+@receiver(m2m_changed, sender=Book.author.through)
+def book_authors_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    changes = link_changes(instance, action, reverse, model, pk_set, 'author')
+    if changes is not None:
+        book_ids, author_ids = changes
+        listing.refresh_listings(book_ids)
+        after_write(cache.invalidate_books, book_ids)
+        stats.apply(Author, author_ids, **stats.book_totals(book_ids, 1 if action == 'post_add' else -1))
+        after_write(cache.invalidate_stats, author_ids, [])
+
+
+@receiver(m2m_changed, sender=Book.genre.through)
+def book_genres_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    changes = link_changes(instance, action, reverse, model, pk_set, 'genre')
+    if changes is not None:
+        book_ids, genre_ids = changes
+        listing.refresh_listings(book_ids)
+        after_write(cache.invalidate_books, book_ids)
+        stats.apply(Genre, genre_ids, **stats.book_totals(book_ids, 1 if action == 'post_add' else -1))
+        after_write(cache.invalidate_stats, [], genre_ids)
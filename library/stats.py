@@ -0,0 +1,137 @@
+"""
+Maintains the BookStats columns of Author and Genre: how many books each has, their average rating and how many
+copies of them the library owns.
+
+Writes through the models are picked up by library.signals, which apply the difference they make with a single
+UPDATE of F() expressions on the authors and genres concerned, so no book is read again. Writes that bypass signals
+(bulk_create, queryset.update()) have to call refresh_stats() with the authors and genres they touched, which
+recomputes them from the books.
+"""
+from django.db import transaction
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Sum
+from django.db.models.functions import NullIf
+
+from library.bulk import chunks
+from library.models import *
+
+STAT_FIELDS = BookStats.stat_fields
+
+# Ids per query, under SQLite's limit on query parameters
+CHUNK_SIZE = 500
+
+
+def book_totals(book_ids, sign=1):
+    """
+    Sums what books add to the stats of an author or genre
+    :param book_ids: iterable of int
+    :param sign: int, 1 when the books are added, -1 when they are removed
+    :return: dict, the changes to pass to apply()
+    """
+    totals = {'books': 0, 'rated': 0, 'rating': 0.0, 'owned': 0}
+    for rating, owned in Book.objects.filter(id__in=list(book_ids)).values_list('rating', 'inventory__owned'):
+        totals['books'] += sign
+        if rating is not None:
+            totals['rated'] += sign
+            totals['rating'] += sign * rating
+        totals['owned'] += sign * (owned or 0)
+    return totals
+
+
+def apply(model, ids, books=0, rated=0, rating=0.0, owned=0):
+    """
+    Adds to the stats of authors or genres in one UPDATE. Every SET expression reads the values from before the
+    update, so avg_rating is computed from the new sum and count.
+    :param model: Author or Genre
+    :param ids: iterable of int, or a queryset of ids
+    :param books: int, change in book_count
+    :param rated: int, change in rated_book_count
+    :param rating: float, change in rating_sum
+    :param owned: int, change in copies_owned
+    """
+    if not (books or rated or rating or owned):
+        return
+    rating_sum = F('rating_sum') + rating
+    model.objects.filter(id__in=ids).update(
+        book_count=F('book_count') + books,
+        rated_book_count=F('rated_book_count') + rated,
+        rating_sum=rating_sum,
+        avg_rating=ExpressionWrapper(rating_sum / NullIf(F('rated_book_count') + rated, 0), output_field=FloatField()),
+        copies_owned=F('copies_owned') + owned,
+    )
+
+
+def apply_to_book(book_id, **changes):
+    """
+    Adds to the stats of a book's authors and genres
+    :param book_id: int
+    :param changes: see apply()
+    :return: (list of int, list of int), the ids of the authors and genres
+    """
+    author_ids = list(Book.author.through.objects.filter(book_id=book_id).values_list('author_id', flat=True))
+    genre_ids = list(Book.genre.through.objects.filter(book_id=book_id).values_list('genre_id', flat=True))
+    apply(Author, author_ids, **changes)
+    apply(Genre, genre_ids, **changes)
+    return author_ids, genre_ids
+
+
+def rating_changes(old, new):
+    """
+    :param old: float or None, a book's rating before a write
+    :param new: float or None, its rating after
+    :return: dict, the changes to pass to apply()
+    """
+    return {
+        'rated': (new is not None) - (old is not None),
+        'rating': (new or 0.0) - (old or 0.0),
+    }
+
+
+def refresh_stats(author_ids=(), genre_ids=(), book_model=Book, author_model=Author, genre_model=Genre):
+    """
+    Recomputes the stats of authors and genres from their books
+    :param author_ids: iterable of int
+    :param genre_ids: iterable of int
+    :param book_model: Book, or its historical model in a migration
+    :param author_model: Author, or its historical model in a migration
+    :param genre_model: Genre, or its historical model in a migration
+    """
+    relations = [
+        (author_model, book_model.author.through, 'author', author_ids),
+        (genre_model, book_model.genre.through, 'genre', genre_ids),
+    ]
+    for model, through, field, ids in relations:
+        for chunk in chunks(sorted(set(ids)), CHUNK_SIZE):
+            with transaction.atomic(using=model.objects.db):
+                totals = {
+                    row[field + '_id']: row
+                    for row in through.objects.filter(**{field + '_id__in': chunk}).values(field + '_id').annotate(
+                        book_count=Count('book_id'),
+                        rated_book_count=Count('book__rating'),
+                        rating_sum=Sum('book__rating'),
+                        avg_rating=Avg('book__rating'),
+                        copies_owned=Sum('book__inventory__owned'),
+                    )
+                }
+                objs = list(model.objects.filter(id__in=chunk).only('id'))
+                for obj in objs:
+                    row = totals.get(obj.id, {})
+                    obj.book_count = row.get('book_count', 0)
+                    obj.rated_book_count = row.get('rated_book_count', 0)
+                    obj.rating_sum = row.get('rating_sum') or 0.0
+                    obj.avg_rating = row.get('avg_rating')
+                    obj.copies_owned = row.get('copies_owned') or 0
+                model.objects.bulk_update(objs, STAT_FIELDS)
+
+
+def rebuild_stats(book_model=Book, author_model=Author, genre_model=Genre):
+    """
+    Recomputes the stats of every author and genre
+    :param book_model: Book, or its historical model in a migration
+    :param author_model: Author, or its historical model in a migration
+    :param genre_model: Genre, or its historical model in a migration
+    """
+    refresh_stats(
+        author_model.objects.values_list('id', flat=True),
+        genre_model.objects.values_list('id', flat=True),
+        book_model, author_model, genre_model,
+    )
@@ -0,0 +1,54 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from Library.settings import API_PAGE_SIZE
+
+
+class QueryBudgetMixin:
+    """
+    Mixin for test cases that need to check how many queries an endpoint runs.
+    Expects self.client to be set, as APITestCase and TestCase do.
+    """
+
+    def count_queries(self, url):
+        """
+        Send Get request to URL and count the queries it runs. Checks status code for 200
+        :param url: str, url
+        :return: (int, list of str), number of queries and the SQL that was run
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), [query['sql'] for query in context.captured_queries]
+
+    def assertQueryBudget(self, url, budget):
+        """
+        Asserts that a Get request to URL runs at most budget queries
+        :param url: str, url
+        :param budget: int, maximum number of queries
+        """
+        count, queries = self.count_queries(url)
+        self.assertLessEqual(count, budget, '{} ran {} queries, budget is {}:\n{}'.format(
+            url, count, budget, '\n'.join(queries)
+        ))
+
+    def assertConstantQueries(self, url, seed, budget=None):
+        """
+        Asserts that the number of queries a Get request to URL runs does not grow with the number of rows returned.
+        The url is requested once after seeding a single row and again after filling a whole page.
+        :param url: str, url
+        :param seed: callable taking an int, creates that many more rows that url returns
+        :param budget: int or None, optional maximum number of queries
+        """
+        seed(1)
+        small_count, small_queries = self.count_queries(url)
+
+        seed(API_PAGE_SIZE)
+        large_count, large_queries = self.count_queries(url)
+
+        self.assertEqual(small_count, large_count, '{} ran {} queries for 1 row but {} for a full page:\n{}'.format(
+            url, small_count, large_count, '\n'.join(large_queries)
+        ))
+        if budget is not None:
+            self.assertQueryBudget(url, budget)
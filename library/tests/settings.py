@@ -51,12 +51,24 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny'
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'library.pagination.LibraryPagination',
     'PAGE_SIZE': API_PAGE_SIZE,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # orjson when it is installed, with the same output as DRF's JSONRenderer and JSONParser
+    'DEFAULT_RENDERER_CLASSES': [
+        'library.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'library.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 MIDDLEWARE = [
+    'library.timing.TimingMiddleware',
+    'library.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +76,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'library.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'Library.urls'
@@ -95,9 +108,91 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+    },
+    # A second database rather than a mirror, so tests can tell which one a request read from
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'test_replica.sqlite3'),
+    },
+}
+
+DATABASE_ROUTERS = ['library.routers.ReplicaRouter']
+
+# No replicas, so tests read from default. library/tests/test_routers.py reads from replica.
+LIBRARY_REPLICAS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': 5,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
+# Cache of rendered GET responses, see library/cache.py. Off for tests, since rolled back test data doesn't
+# invalidate it. library/tests/test_cache.py turns it on.
+LIBRARY_RESPONSE_CACHE = {
+    'ENABLED': False,
+    'ALIAS': 'default',
+    'TIMEOUT': 300,
+}
+
+# How paginated listings are counted: 'exact', 'cached' or 'estimated', see library/counts.py
+LIBRARY_COUNT = {
+    'MODE': 'exact',
+    'TIMEOUT': 300,
+    'ESTIMATE_THRESHOLD': 10000,
+}
+
+# Threads of the ASGI application in Library/asgi.py, see library/asgi.py. QUERY_THREADS 0 runs the queries of a
+# request one after the other.
+LIBRARY_ASGI = {
+    'THREADS': 16,
+    'QUERY_THREADS': 16,
+}
+
+# Sampled per-request query, serialization and render timings, see library/timing.py. 0 turns them off.
+LIBRARY_TIMING = {
+    'SAMPLE_RATE': 0.0,
+    'HEADER': True,
+    'LOG': True,
+}
+
+# cProfile dumps of requests, see library/profiling.py. Set a TOKEN to profile requests sending it in the header.
+LIBRARY_PROFILING = {
+    'ENABLED': False,
+    'HEADER': 'X-Library-Profile',
+    'TOKEN': os.getenv('LIBRARY_PROFILING_TOKEN'),
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_FILES': 50,
+    'MAX_MEGABYTES': 200,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'library.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from library import parallel
+from library.asgi import ASGIHandler
+from library.benchmarks.asgi import asgi_request
+from library.models import *
+
+
+class TestParallel(TestCase):
+    """Tests library.parallel"""
+
+    def test_without_executor(self):
+        threads = parallel.run(threading.get_ident, threading.get_ident)
+        self.assertEqual(threads, [threading.get_ident()] * 2)
+        self.assertFalse(parallel.enabled())
+
+    def test_with_executor(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def call(value):
+            # Only returns if all three calls run at once
+            barrier.wait()
+            return value, threading.get_ident()
+
+        with ThreadPoolExecutor(2) as executor, parallel.use_executor(executor):
+            self.assertTrue(parallel.enabled())
+            results = parallel.run(lambda: call(1), lambda: call(2), lambda: call(3))
+            # Calls made from a call run in its thread
+            nested = executor.submit(parallel.run, threading.get_ident, threading.get_ident).result()
+        self.assertEqual([value for value, thread in results], [1, 2, 3])
+        self.assertEqual(results[0][1], threading.get_ident())
+        self.assertEqual(len(set(thread for value, thread in results)), 3)
+        self.assertEqual(nested[0], nested[1])
+
+    def test_error(self):
+        def fail():
+            raise ValueError('failed')
+
+        with ThreadPoolExecutor(1) as executor, parallel.use_executor(executor):
+            with self.assertRaises(ValueError):
+                parallel.run(lambda: 1, fail)
+
+    def test_connections_kept(self):
+        # CONN_MAX_AGE is 0, which would close the connection after each call
+        wrapper = type(connections['default'])
+        with mock.patch.object(wrapper, 'close') as close, ThreadPoolExecutor(1) as executor:
+            for _ in range(2):
+                executor.submit(parallel.work, lambda: connections['default'].ensure_connection()).result()
+        close.assert_not_called()
+
+
+class TestASGI(TransactionTestCase):
+    """Tests the ASGI application against the WSGI one. Queries run on other threads, so the data is committed."""
+
+    def setUp(self):
+        self.app = ASGIHandler(threads=2, query_threads=2)
+        self.author = Author.objects.create(name='村上 春樹')
+        self.genre = Genre.objects.create(name='Fiction')
+        for i in range(30):
+            book = Book.objects.create(title='Book {}'.format(i), type='Hardcover', rating=4.25, pages=100 + i)
+            book.author.add(self.author)
+            book.genre.add(self.genre)
+            Inventory.objects.create(book=book, owned=2, available=1)
+        self.book = book
+
+    def tearDown(self):
+        self.app.shutdown()
+
+    def request(self, method, path, query=None, body=None):
+        return asyncio.run(asgi_request(self.app, method, path, query or {}, body))
+
+    def test_same_as_wsgi(self):
+        paths = [
+            ('/books/', {}),
+            ('/books/', {'page': 2}),
+            ('/books/', {'page': 'last'}),
+            ('/books/', {'search': 'Book'}),
+            ('/books/', {'fields': 'title,author'}),
+            ('/books/{}/'.format(self.book.id), {}),
+            ('/authors/{}/books/'.format(self.author.id), {'page': 2}),
+            ('/genres/{}/authors/'.format(self.genre.id), {}),
+            ('/authors/', {'name': '村上 春樹'}),
+        ]
+        for path, query in paths:
+            with self.subTest(path=path, query=query):
+                status, content = self.request('GET', path, query)
+                expected = self.client.get(path, query, HTTP_ACCEPT='application/json')
+                self.assertEqual(status, expected.status_code)
+                self.assertEqual(json.loads(content.decode()), expected.json())
+
+    def test_invalid_page(self):
+        for page in ['9', '0', 'x']:
+            with self.subTest(page):
+                status, content = self.request('GET', '/books/', {'page': page})
+                self.assertEqual(status, 404)
+
+    def test_concurrent_queries(self):
+        threads = set()
+        work = parallel.work
+
+        def record(call):
+            threads.add(threading.current_thread().name)
+            return work(call)
+
+        with mock.patch('library.parallel.work', record):
+            self.request('POST', '/authors/', body={'name': 'Other'})
+            self.assertEqual(threads, set())
+            self.request('GET', '/books/')
+        self.assertTrue(all(name.startswith('library-query') for name in threads))
+        self.assertTrue(threads)
+
+    def test_write(self):
+        status, content = self.request('POST', '/authors/', body={'name': 'New'})
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(content.decode())['name'], 'New')
+
+        status, content = self.request('HEAD', '/books/')
+        self.assertEqual((status, content), (200, b''))
+
+    def test_lifespan(self):
+        app = ASGIHandler(threads=1, query_threads=0)
+        received = [{'type': 'lifespan.shutdown'}, {'type': 'lifespan.startup'}]
+        sent = []
+
+        async def receive():
+            return received.pop()
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
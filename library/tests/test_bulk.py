@@ -0,0 +1,152 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+from library.serializers import *
+
+
+class TestBulkBooks(APITestCase):
+    """Tests POST and PATCH /books/bulk/"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.author = Author.objects.create(
+            id=1,
+            name='John Doe',
+        )
+        self.genre = Genre.objects.create(
+            id=1,
+            name='Fiction',
+        )
+
+        self.book = Book.objects.create(
+            id=1,
+            title='Test',
+            type='ebook',
+            rating=4,
+        )
+        self.book.author.add(self.author)
+        self.book.genre.add(self.genre)
+        Inventory.objects.create(
+            book=self.book,
+            owned=2,
+            available=2,
+        )
+
+    def new_book(self, title, **fields):
+        book = {
+            'title': title,
+            'type': 'Hardcover',
+            'inventory': {
+                'owned': 3,
+                'available': 1,
+            },
+        }
+        book.update(fields)
+        return book
+
+    def bulk(self, method, data):
+        return getattr(self.client, method)('/books/bulk/', data, format='json')
+
+    def test_create(self):
+        response = self.bulk('post', [
+            self.new_book('First', author=[1, 'Jane Doe'], genre=[{'id': 1, 'name': 'Fiction'}, 'Fantasy']),
+            self.new_book('Second', author=['Jane Doe'], pages=100),
+        ])
+        self.assertEqual(response.status_code, 201)
+        results = response.data['results']
+        self.assertEqual([item['status'] for item in results], [201, 201])
+
+        first = Book.objects.with_related().get(id=results[0]['id'])
+        self.assertEqual(first.title, 'First')
+        self.assertEqual([author.name for author in first.author.all()], ['John Doe', 'Jane Doe'])
+        self.assertEqual([genre.name for genre in first.genre.all()], ['Fiction', 'Fantasy'])
+        self.assertEqual((first.inventory.owned, first.inventory.available), (3, 1))
+
+        second = Book.objects.get(id=results[1]['id'])
+        self.assertEqual(second.pages, 100)
+        # Created once and shared
+        self.assertEqual(Author.objects.filter(name='Jane Doe').count(), 1)
+
+        # Listings are written too
+        response = self.client.get('/books/{}/'.format(first.id))
+        self.assertEqual(response.data, BookSerializer(first).data)
+
+    def test_create_partly_invalid(self):
+        response = self.bulk('post', [
+            self.new_book('Valid'),
+            self.new_book('No inventory', inventory=None),
+            self.new_book('Too many available', inventory={'owned': 1, 'available': 2}),
+            self.new_book('Bad type', type='Scroll'),
+            self.new_book('Unknown author', author=[99]),
+            'not a book',
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.data['results']
+        self.assertEqual([item['status'] for item in results], [201, 400, 400, 400, 400, 400])
+        self.assertEqual([item['index'] for item in results], list(range(6)))
+        self.assertIn('type', results[3]['errors'])
+        self.assertEqual(results[4]['errors'], {'author': ['Author 99 does not exist.']})
+
+        self.assertEqual(list(Book.objects.order_by('id').values_list('title', flat=True)), ['Test', 'Valid'])
+
+    def test_all_invalid(self):
+        response = self.bulk('post', [self.new_book('Invalid', inventory={'owned': 0, 'available': 0})])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_not_a_list(self):
+        self.assertEqual(self.bulk('post', self.new_book('Single')).status_code, 400)
+        self.assertEqual(self.bulk('post', []).status_code, 400)
+
+    def test_update(self):
+        other = Book.objects.create(id=2, title='Other', type='ebook')
+
+        response = self.bulk('patch', [
+            {'id': 1, 'title': 'Updated', 'inventory': {'available': 1}, 'genre': ['Fantasy']},
+            {'id': 2, 'inventory': {'owned': 1, 'available': 1}, 'author': [1]},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [1, 2])
+
+        book = Book.objects.with_related().get(id=1)
+        self.assertEqual(book.title, 'Updated')
+        self.assertEqual(book.rating, 4)
+        self.assertEqual((book.inventory.owned, book.inventory.available), (2, 1))
+        self.assertEqual([genre.name for genre in book.genre.all()], ['Fantasy'])
+        self.assertEqual([author.name for author in book.author.all()], ['John Doe'])
+
+        other = Book.objects.with_related().get(id=2)
+        self.assertEqual((other.inventory.owned, other.inventory.available), (1, 1))
+        self.assertEqual([author.name for author in other.author.all()], ['John Doe'])
+
+        # Listings are updated, including the one of the genre's nested books
+        self.assertEqual(self.client.get('/books/1/').data, BookSerializer(book).data)
+        self.assertEqual(self.client.get('/genres/1/books/').data['count'], 0)
+
+    def test_update_errors(self):
+        response = self.bulk('patch', [
+            {'title': 'No id'},
+            {'id': 99, 'title': 'Missing'},
+            {'id': 1, 'inventory': {'available': 3}},
+            {'id': 1, 'title': 'Valid'},
+            {'id': 1, 'title': 'Twice'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([item['status'] for item in response.data['results']], [400, 404, 400, 200, 400])
+        self.assertEqual(Book.objects.get(id=1).title, 'Valid')
+        self.assertEqual(Inventory.objects.get(book_id=1).available, 2)
+
+    def test_constant_queries(self):
+        """Creating any number of books takes the same number of queries"""
+        def create(count):
+            with CaptureQueriesContext(connection) as context:
+                response = self.bulk('post', [
+                    self.new_book('Book{}'.format(i), author=['Author{}'.format(i), 1], genre=[1])
+                    for i in range(count)
+                ])
+            self.assertEqual(response.status_code, 201)
+            return len(context.captured_queries)
+
+        self.assertEqual(create(2), create(20))
@@ -0,0 +1,278 @@
+import gzip
+from unittest import mock
+
+from django.core.cache import cache as default_cache
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIClient
+from library import cache
+from library.models import *
+
+
+@override_settings(LIBRARY_RESPONSE_CACHE={'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300})
+class TestResponseCache(APITestCase):
+    """Tests the response cache and its invalidation"""
+
+    def setUp(self):
+        default_cache.clear()
+        self.client = APIClient()
+
+        self.author = Author.objects.create(
+            id=1,
+            name='John Doe',
+        )
+        self.author2 = Author.objects.create(
+            id=2,
+            name='Jane Doe',
+        )
+        self.genre = Genre.objects.create(
+            id=1,
+            name='Fiction',
+        )
+
+        self.book = Book.objects.create(
+            id=1,
+            title='Test',
+            type='ebook',
+            rating=4,
+        )
+        self.book.author.add(self.author)
+        self.book.genre.add(self.genre)
+        Inventory.objects.create(
+            book=self.book,
+            owned=2,
+            available=2,
+        )
+
+        self.book2 = Book.objects.create(
+            id=2,
+            title='Test2',
+            type='Hardcover',
+            rating=5,
+        )
+        self.book2.author.add(self.author2)
+        Inventory.objects.create(
+            book=self.book2,
+            owned=1,
+            available=1,
+        )
+
+    def get(self, url):
+        """
+        Send Get request for JSON and check the status code for 200
+        :return: response
+        """
+        response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertCached(self, url, cached=True):
+        self.assertEqual(self.get(url)['X-Cache'], 'HIT' if cached else 'MISS')
+
+    def warm(self, *urls):
+        for url in urls:
+            self.assertCached(url, cached=False)
+            self.assertCached(url)
+
+    def test_hit(self):
+        miss = self.get('/books/')
+        hit = self.get('/books/')
+
+        self.assertEqual(miss['X-Cache'], 'MISS')
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit.content, miss.content)
+        self.assertEqual(hit['Content-Type'], miss['Content-Type'])
+
+    def test_query_params_normalized(self):
+        self.warm('/books/?type=ebook&ordering=-rating')
+        self.assertCached('/books/?ordering=-rating&type=ebook')
+        self.assertCached('/books/?ordering=rating&type=ebook', cached=False)
+
+    @override_settings(ALLOWED_HOSTS=['internal.example', 'api.example.com'])
+    def test_links_per_host(self):
+        public = {'HTTP_ACCEPT': 'application/json', 'HTTP_HOST': 'api.example.com', 'secure': True}
+        with mock.patch('library.pagination.LibraryPagination.page_size', 1):
+            internal = self.client.get('/books/', HTTP_ACCEPT='application/json', HTTP_HOST='internal.example:8000')
+            public, hit = self.client.get('/books/', **public), self.client.get('/books/', **public)
+
+        self.assertEqual(internal['X-Cache'], 'MISS')
+        self.assertEqual(internal.json()['next'], 'http://internal.example:8000/books/?page=2')
+        self.assertEqual(public['X-Cache'], 'MISS')
+        self.assertEqual(public.json()['next'], 'https://api.example.com/books/?page=2')
+        self.assertEqual(hit['X-Cache'], 'HIT')
+        self.assertEqual(hit.content, public.content)
+
+    def test_browsable_api_not_cached(self):
+        self.client.get('/books/', HTTP_ACCEPT='text/html')
+        response = self.client.get('/books/', HTTP_ACCEPT='text/html')
+        self.assertFalse(response.has_header('X-Cache'))
+
+    def test_create_book(self):
+        self.warm('/books/', '/books/?title=New')
+
+        data = {
+            'title': 'New',
+            'type': 'ebook',
+            'inventory': {
+                'owned': 1,
+                'available': 1
+            }
+        }
+        response = self.client.post('/books/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertCached('/books/', cached=False)
+        self.assertEqual(len(self.get('/books/?title=New').json()['results']), 1)
+
+    def test_update_book(self):
+        self.warm('/books/', '/books/1/', '/authors/1/books/', '/genres/1/books/')
+
+        data = self.get('/books/1/').json()
+        data['title'] = 'Updated'
+        response = self.client.put('/books/1/', data, format='json')
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.get('/books/1/').json()['title'], 'Updated')
+        self.assertEqual(self.get('/books/').json()['results'][0]['title'], 'Updated')
+        self.assertEqual(self.get('/authors/1/books/').json()['results'][0]['title'], 'Updated')
+        self.assertEqual(self.get('/genres/1/books/').json()['results'][0]['title'], 'Updated')
+
+    def test_partial_update_inventory(self):
+        self.warm('/books/1/', '/books/2/', '/authors/2/books/')
+
+        response = self.client.patch('/books/1/', {'inventory': {'available': 0}}, format='json')
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.get('/books/1/').json()['inventory']['available'], 0)
+        # Nothing about book 2 changed
+        self.assertCached('/books/2/')
+        self.assertCached('/authors/2/books/')
+
+    def test_rename_author(self):
+        self.warm('/books/', '/books/1/', '/authors/1/', '/books/?author__name=Renamed', '/genres/1/authors/')
+
+        self.author.name = 'Renamed'
+        self.author.save()
+
+        self.assertEqual(self.get('/books/1/').json()['author'][0]['name'], 'Renamed')
+        self.assertEqual(self.get('/authors/1/').json()['name'], 'Renamed')
+        self.assertEqual(len(self.get('/books/?author__name=Renamed').json()['results']), 1)
+        self.assertEqual(self.get('/genres/1/authors/').json()['results'][0]['name'], 'Renamed')
+        # Book 2 doesn't include author 1
+        self.warm('/books/2/')
+
+    def test_rename_genre(self):
+        self.warm('/genres/1/books/', '/books/1/', '/books/2/')
+
+        self.genre.name = 'Renamed'
+        self.genre.save()
+
+        self.assertEqual(self.get('/genres/1/books/').json()['results'][0]['genre'][0]['name'], 'Renamed')
+        self.assertEqual(self.get('/books/1/').json()['genre'][0]['name'], 'Renamed')
+        self.assertCached('/books/2/')
+
+    def test_link_author(self):
+        self.warm('/authors/1/books/', '/authors/2/books/', '/books/2/', '/genres/1/authors/')
+
+        self.book2.author.add(self.author)
+        self.book.genre.add(Genre.objects.create(name='Other'))
+
+        self.assertEqual(self.get('/authors/1/books/').json()['count'], 2)
+        self.assertCached('/authors/2/books/', cached=False)
+        self.assertEqual(len(self.get('/books/2/').json()['author']), 2)
+        self.assertCached('/genres/1/authors/', cached=False)
+
+    def test_unlink_and_clear(self):
+        self.warm('/authors/2/books/', '/genres/1/books/')
+
+        self.author2.book_set.remove(self.book2)
+        self.genre.book_set.clear()
+
+        self.assertEqual(self.get('/authors/2/books/').json()['count'], 0)
+        self.assertEqual(self.get('/genres/1/books/').json()['count'], 0)
+
+    def test_delete_book(self):
+        self.warm('/books/', '/authors/1/books/', '/books/1/')
+
+        response = self.client.delete('/books/1/')
+        self.assertEqual(response.status_code, 204)
+
+        self.assertEqual(self.get('/books/').json()['count'], 1)
+        self.assertEqual(self.get('/authors/1/books/').json()['count'], 0)
+        self.assertEqual(self.client.get('/books/1/').status_code, 404)
+
+    def test_stats(self):
+        self.get('/books/')
+        self.get('/books/')
+        self.get('/books/')
+
+        response = self.get('/cache/stats/')
+        self.assertEqual(response.json()['hits'], 2)
+        self.assertEqual(response.json()['misses'], 1)
+        self.assertEqual(response.json()['hit_rate'], 0.6667)
+
+    def test_compressed(self):
+        plain = self.get('/books/')
+        miss = self.client.get('/books/1/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        hit = self.client.get('/books/1/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        listing = self.client.get('/books/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        for response in [miss, hit, listing]:
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('Accept', response['Vary'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(hit.content), gzip.decompress(miss.content))
+        self.assertEqual(gzip.decompress(listing.content), plain.content)
+
+    def test_compressed_once(self):
+        with mock.patch('library.cache.gzip.compress', wraps=gzip.compress) as compress:
+            for _ in range(3):
+                self.client.get('/books/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(compress.call_count, 1)
+
+            self.book.title = 'Updated'
+            self.book.save()
+            response = self.client.get('/books/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(compress.call_count, 2)
+            self.assertIn(b'Updated', gzip.decompress(response.content))
+
+    def test_brotli(self):
+        brotli = mock.Mock(MODE_TEXT=1, compress=lambda content, mode, quality: b'br')
+        with mock.patch('library.cache.brotli', brotli):
+            self.get('/books/')
+            response = self.client.get('/books/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(response.content, b'br')
+            response = self.client.get('/books/', HTTP_ACCEPT='application/json', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_choose_encoding(self):
+        variants = {'gzip': b'', 'br': b''}
+        cases = [
+            ('', None),
+            ('identity', None),
+            ('gzip', 'gzip'),
+            ('GZIP;Q=0.5', 'gzip'),
+            ('gzip, br', 'br'),
+            ('gzip;q=1, br;q=0.5', 'gzip'),
+            ('gzip;q=0', None),
+            ('*', 'br'),
+            ('*, br;q=0', 'gzip'),
+            ('gzip;q=bad', None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header):
+                request = mock.Mock(META={'HTTP_ACCEPT_ENCODING': header})
+                self.assertEqual(cache.choose_encoding(request, variants), expected)
+        request = mock.Mock(META={'HTTP_ACCEPT_ENCODING': 'br'})
+        self.assertIsNone(cache.choose_encoding(request, {'gzip': b''}))
+
+
+class TestResponseCacheDisabled(APITestCase):
+    """The test settings turn the cache off"""
+
+    def test_not_cached(self):
+        response = APIClient().get('/books/', HTTP_ACCEPT='application/json')
+
+        self.assertFalse(response.has_header('X-Cache'))
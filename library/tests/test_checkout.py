@@ -0,0 +1,118 @@
+import threading
+import unittest
+
+from django.db import connection
+from django.test import TransactionTestCase
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+
+
+class TestCheckout(APITestCase):
+    """Tests POST /books/<id>/checkout/ and /books/<id>/return/"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.book = Book.objects.create(
+            id=1,
+            title='Test',
+            type='ebook',
+        )
+        Inventory.objects.create(
+            book=self.book,
+            owned=2,
+            available=2,
+        )
+
+    def test_checkout_and_return(self):
+        response = self.client.post('/books/1/checkout/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'available': 1, 'owned': 2})
+
+        self.assertEqual(self.client.post('/books/1/checkout/').data['available'], 0)
+
+        response = self.client.post('/books/1/checkout/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Inventory.objects.get(book=self.book).available, 0)
+
+        self.assertEqual(self.client.post('/books/1/return/').data['available'], 1)
+        self.assertEqual(self.client.post('/books/1/return/').data['available'], 2)
+
+        response = self.client.post('/books/1/return/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Inventory.objects.get(book=self.book).available, 2)
+
+    def test_listing_updated(self):
+        self.client.post('/books/1/checkout/')
+
+        response = self.client.get('/books/1/')
+        self.assertEqual(response.data['inventory'], {'available': 1, 'owned': 2})
+
+    def test_not_found(self):
+        Book.objects.create(id=2, title='No inventory')
+
+        self.assertEqual(self.client.post('/books/2/checkout/').status_code, 404)
+        self.assertEqual(self.client.post('/books/3/return/').status_code, 404)
+        self.assertEqual(self.client.post('/books/abc/checkout/').status_code, 404)
+
+    def test_get_not_allowed(self):
+        self.assertEqual(self.client.get('/books/1/checkout/').status_code, 405)
+
+    def test_interleaved_checkouts(self):
+        """
+        Two clients that both saw two copies available each check one out. With PATCH the second write overwrites
+        the first and a copy is lost, checkout can't lose one.
+        """
+        seen = [self.client.get('/books/1/').data['inventory']['available'] for _ in range(2)]
+        for available in seen:
+            self.client.patch('/books/1/', {'inventory': {'available': available - 1}}, format='json')
+        self.assertEqual(Inventory.objects.get(book=self.book).available, 1)
+
+        Inventory.objects.filter(book=self.book).update(available=2)
+        for _ in seen:
+            self.client.post('/books/1/checkout/')
+        self.assertEqual(Inventory.objects.get(book=self.book).available, 0)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'SQLite serializes every write, so there is no race to test')
+class TestConcurrentCheckout(TransactionTestCase):
+    """Checks out from many threads at once"""
+    threads = 8
+    copies = 50
+
+    def setUp(self):
+        self.book = Book.objects.create(title='Test', type='ebook')
+        Inventory.objects.create(book=self.book, owned=self.copies, available=self.copies)
+
+    def run_threads(self, attempts):
+        """
+        Sends attempts checkouts from each thread
+        :return: list of int, status codes
+        """
+        statuses = []
+        lock = threading.Lock()
+
+        def worker():
+            client = APIClient()
+            try:
+                for _ in range(attempts):
+                    status_code = client.post('/books/{}/checkout/'.format(self.book.id)).status_code
+                    with lock:
+                        statuses.append(status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_no_lost_updates(self):
+        statuses = self.run_threads(attempts=self.copies // self.threads + 5)
+
+        self.assertEqual(statuses.count(200), self.copies)
+        self.assertEqual(set(statuses), {200, 409})
+        self.assertEqual(Inventory.objects.get(book=self.book).available, 0)
+        self.assertEqual(BookListing.objects.get(id=self.book.id).available, 0)
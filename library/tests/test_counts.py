@@ -0,0 +1,120 @@
+import unittest
+
+from django.core.cache import cache as default_cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from library import counts
+from library.models import *
+from Library.settings import API_PAGE_SIZE
+
+RESPONSE_CACHE = {'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300}
+
+
+def count_mode(mode, threshold=10000):
+    return override_settings(LIBRARY_COUNT={'MODE': mode, 'TIMEOUT': 300, 'ESTIMATE_THRESHOLD': threshold})
+
+
+class TestCounts(APITestCase):
+    """Tests the count modes of paginated listings"""
+
+    def setUp(self):
+        default_cache.clear()
+        self.client = APIClient()
+
+        self.author = Author.objects.create(
+            id=1,
+            name='John Doe',
+        )
+        for i in range(API_PAGE_SIZE + 2):
+            book = Book.objects.create(
+                title='Test{}'.format(i % 2),
+                type='ebook',
+            )
+            book.author.add(self.author)
+
+    def get(self, url):
+        """
+        :return: (dict, int), response data and number of COUNT(*) queries run
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data, len([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+
+    def test_exact(self):
+        data, queries = self.get('/books/')
+        self.assertEqual((data['count'], data['count_mode'], queries), (API_PAGE_SIZE + 2, 'exact', 1))
+
+    @count_mode('cached')
+    @override_settings(LIBRARY_RESPONSE_CACHE=RESPONSE_CACHE)
+    def test_cached(self):
+        data, queries = self.get('/books/?title=Test0')
+        self.assertEqual((data['count_mode'], queries), ('cached', 1))
+
+        # Another ordering, so it isn't a cached response, reuses the count
+        data, queries = self.get('/books/?title=Test0&ordering=-id')
+        self.assertEqual((data['count'], queries), (Book.objects.filter(title='Test0').count(), 0))
+
+        # Other filters have their own count
+        data, queries = self.get('/books/?title=Test1')
+        self.assertEqual(queries, 1)
+
+        Book.objects.create(title='Test0', type='ebook')
+        data, queries = self.get('/books/?title=Test0&ordering=title')
+        self.assertEqual((data['count'], queries), (Book.objects.filter(title='Test0').count(), 1))
+
+    @count_mode('cached')
+    @override_settings(LIBRARY_RESPONSE_CACHE=RESPONSE_CACHE)
+    def test_cached_nested(self):
+        self.assertEqual(self.get('/authors/1/books/')[0]['count'], API_PAGE_SIZE + 2)
+        self.assertEqual(self.get('/authors/1/books/?page=2')[1], 0)
+
+        Book.objects.create(title='Other', type='ebook').author.add(self.author)
+        data, queries = self.get('/authors/1/books/?page=2')
+        self.assertEqual((data['count'], queries), (API_PAGE_SIZE + 3, 1))
+
+        self.author.book_set.clear()
+        self.assertEqual(self.get('/authors/1/books/?page=1')[0]['count'], 0)
+
+    @count_mode('cached')
+    def test_cached_without_response_cache(self):
+        """Counts aren't cached when the response cache doesn't version its tags"""
+        self.assertEqual(self.get('/books/')[0]['count_mode'], 'exact')
+        self.assertEqual(self.get('/books/')[1], 1)
+
+    @count_mode('estimated', threshold=0)
+    def test_estimated_other_databases(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('PostgreSQL can estimate')
+        data, queries = self.get('/books/')
+        self.assertEqual((data['count'], data['count_mode'], queries), (API_PAGE_SIZE + 2, 'exact', 1))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            counts.count(Book.objects.all(), 'guessed')
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Only PostgreSQL has row estimates')
+class TestEstimatedCounts(TestCase):
+    """Tests estimated counts against the planner"""
+
+    def setUp(self):
+        Book.objects.bulk_create([Book(title='Test{}'.format(i % 2)) for i in range(1000)])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE {}'.format(Book._meta.db_table))
+
+    @count_mode('estimated', threshold=100)
+    def test_estimated(self):
+        count, mode = counts.count(Book.objects.all())
+        self.assertEqual(mode, 'estimated')
+        self.assertAlmostEqual(count, 1000, delta=100)
+
+        count, mode = counts.count(Book.objects.filter(title='Test0'))
+        self.assertEqual(mode, 'estimated')
+        self.assertAlmostEqual(count, 500, delta=100)
+
+    @count_mode('estimated', threshold=2000)
+    def test_small_counts_exact(self):
+        self.assertEqual(counts.count(Book.objects.all()), (1000, 'exact'))
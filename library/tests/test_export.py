@@ -0,0 +1,111 @@
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from library.management.commands.load_book_data import load_csv
+from library.models import *
+from library.serializers import *
+from library.views import BookViewSet
+
+
+class TestExport(TestCase):
+    """Tests GET /books/export/"""
+
+    def setUp(self):
+        self.author = Author.objects.create(name='John Doe')
+        self.author2 = Author.objects.create(name='村上 春樹')
+        self.genre = Genre.objects.create(name='Fiction')
+        self.genre2 = Genre.objects.create(name='Fantasy')
+
+        for i in range(5):
+            book = Book.objects.create(
+                isbn='9.78E+12',
+                title='Test, "{}"'.format(i),
+                type='Hardcover',
+                edition='1st',
+                pages=100 + i,
+                rating=4.25,
+                rating_count=10,
+                review_count=2,
+                image_url='http://example.com/{}.jpg'.format(i),
+                description='Line one\nLine two',
+            )
+            book.author.add(self.author2, self.author)
+            book.genre.add(self.genre)
+            Inventory.objects.create(book=book, owned=2, available=1)
+
+        # Blank fields are exported too
+        book = Book.objects.create(title='Blank')
+        book.author.add(self.author)
+        book.genre.add(self.genre2)
+
+    def export(self, export_format):
+        response = self.client.get('/books/export/?format={}'.format(export_format))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def catalog(self):
+        """
+        :return: list of tuple, every book's fields, author names and genre names, without ids or inventory
+        """
+        return sorted(
+            tuple(book[field] for field in BookValuesSerializer.book_fields if field != 'id') +
+            (tuple(author['name'] for author in book['author']), tuple(genre['name'] for genre in book['genre']))
+            for book in BookSerializer(Book.objects.with_related(), many=True).data
+        )
+
+    def test_ndjson(self):
+        lines = self.export('ndjson').splitlines()
+
+        expected = json.loads(json.dumps(BookSerializer(Book.objects.with_related().order_by('id'), many=True).data))
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_csv_round_trip(self):
+        expected = self.catalog()
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8', newline='') as csv_file:
+                csv_file.write(self.export('csv'))
+
+            for bulk in (False, True):
+                Book.objects.all().delete()
+                Author.objects.all().delete()
+                Genre.objects.all().delete()
+                with redirect_stdout(io.StringIO()) as output:
+                    load_csv(path, bulk=bulk)
+
+                self.assertNotIn('could not be loaded', output.getvalue())
+                self.assertEqual(self.catalog(), expected)
+        finally:
+            os.remove(path)
+
+    def test_chunks(self):
+        """Any chunk size streams the same content, in one query"""
+        content = self.export('ndjson')
+
+        with mock.patch.object(BookViewSet, 'export_chunk_size', 2):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get('/books/export/?format=ndjson')
+                pieces = list(response.streaming_content)
+
+        self.assertEqual(len(pieces), 3)
+        self.assertEqual(b''.join(pieces).decode('utf-8'), content)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_empty(self):
+        Book.objects.all().delete()
+        self.assertEqual(self.export('ndjson'), '')
+        self.assertEqual(self.export('csv').splitlines(), [
+            'book_authors,book_desc,book_edition,book_format,book_isbn,book_pages,book_rating,book_rating_count,'
+            'book_review_count,book_title,genres,image_url',
+        ])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/books/export/?format=xml').status_code, 404)
@@ -0,0 +1,104 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+
+
+class TestFacets(APITestCase):
+    """Tests ?facets= on book listings"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.authors = [Author.objects.create(name='Author{}'.format(i)) for i in range(3)]
+        self.genres = [Genre.objects.create(name='Genre{}'.format(i)) for i in range(3)]
+        for i in range(12):
+            book = Book.objects.create(
+                title='Dragon {}'.format(i) if i % 2 else 'Test{}'.format(i),
+                type=Book.TYPES[i % 3][0],
+            )
+            # Author0 has every book, Author1 every other one, Author2 every third
+            book.author.add(*[author for n, author in enumerate(self.authors) if i % (n + 1) == 0])
+            book.genre.add(self.genres[i % 2])
+
+    def expected(self, books):
+        """
+        Counts books by facet the slow way
+        :param books: QuerySet of Book
+        :return: dict, facet -> {value: count}
+        """
+        counts = {'genre': {}, 'type': {}, 'author': {}}
+        for book in books:
+            counts['type'][book.type] = counts['type'].get(book.type, 0) + 1
+            for genre in book.genre.all():
+                counts['genre'][genre.name] = counts['genre'].get(genre.name, 0) + 1
+            for author in book.author.all():
+                counts['author'][author.name] = counts['author'].get(author.name, 0) + 1
+        return counts
+
+    def buckets(self, facets):
+        return {
+            'genre': {bucket['name']: bucket['count'] for bucket in facets.get('genre', [])},
+            'type': {bucket['value']: bucket['count'] for bucket in facets.get('type', [])},
+            'author': {bucket['name']: bucket['count'] for bucket in facets.get('author', [])},
+        }
+
+    def get_facets(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['facets']
+
+    def test_unfiltered(self):
+        facets = self.get_facets('/books/?facets=genre,type,author')
+        self.assertEqual(list(facets), ['genre', 'type', 'author'])
+        self.assertEqual(self.buckets(facets), self.expected(Book.objects.all()))
+
+        # Most books first
+        self.assertEqual([bucket['name'] for bucket in facets['author']], ['Author0', 'Author1', 'Author2'])
+        self.assertEqual(facets['author'][0], {'id': self.authors[0].id, 'name': 'Author0', 'count': 12})
+
+    def test_filtered(self):
+        facets = self.get_facets('/books/?facets=genre,type,author&type=ebook')
+        self.assertEqual(self.buckets(facets), self.expected(Book.objects.filter(type='ebook')))
+
+        facets = self.get_facets('/books/?facets=type,author&genre__name=Genre1')
+        expected = self.expected(Book.objects.filter(genre__name='Genre1'))
+        self.assertEqual(self.buckets(facets), dict(expected, genre={}))
+
+        facets = self.get_facets('/books/?facets=genre&search=dragon')
+        expected = self.expected(Book.objects.filter(title__startswith='Dragon'))
+        self.assertEqual(self.buckets(facets)['genre'], expected['genre'])
+
+        facets = self.get_facets('/authors/{}/books/?facets=genre,author'.format(self.authors[2].id))
+        expected = self.expected(self.authors[2].book_set.all())
+        self.assertEqual(self.buckets(facets), dict(expected, type={}))
+
+        facets = self.get_facets('/books/?facets=genre&cursor=')
+        self.assertEqual(self.buckets(facets)['genre'], self.expected(Book.objects.all())['genre'])
+
+    def test_facet_size(self):
+        facets = self.get_facets('/books/?facets=author,type&facet_size=2')
+        self.assertEqual([bucket['name'] for bucket in facets['author']], ['Author0', 'Author1'])
+        self.assertEqual(len(facets['type']), 2)
+
+        facets = self.get_facets('/books/?facets=author&facet_size=2&title=Test0')
+        self.assertEqual(len(facets['author']), 2)
+
+    def test_queries(self):
+        """One query per facet, whatever the number of values"""
+        def count_queries(url):
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(url)
+            return len(context.captured_queries)
+
+        for filters in ('', '&type=ebook'):
+            without = count_queries('/books/?facet_size=100' + filters)
+            self.assertEqual(count_queries('/books/?facets=genre,type,author&facet_size=100' + filters), without + 3)
+
+    def test_no_facets(self):
+        response = self.client.get('/books/')
+        self.assertNotIn('facets', response.data)
+
+    def test_invalid(self):
+        self.assertEqual(self.client.get('/books/?facets=genre,publisher').status_code, 400)
+        self.assertEqual(self.client.get('/books/?facets=genre&facet_size=many').status_code, 400)
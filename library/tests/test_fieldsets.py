@@ -0,0 +1,120 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+from library.views import BookViewSet
+
+
+class TestFieldsets(APITestCase):
+    """Tests ?fields= and ?omit= on book responses"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.author = Author.objects.create(name='John Doe')
+        self.genre = Genre.objects.create(name='Fiction')
+        for i in range(3):
+            book = Book.objects.create(title='Dragon {}'.format(i), type='ebook', rating=4 - i, description='Long')
+            book.author.add(self.author)
+            book.genre.add(self.genre)
+            Inventory.objects.create(book=book, owned=3, available=i)
+        self.book = Book.objects.first()
+
+    def get(self, url):
+        """
+        :return: (Response, list of str), the response and the SQL it ran
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def assertFields(self, url, expected):
+        """Checks url's books against the full responses, restricted to expected"""
+        full = self.client.get(url.split('?')[0]).json()
+        response, queries = self.get(url)
+        data = response.json()
+        books = data['results'] if 'results' in data else [data]
+        full_books = full['results'] if 'results' in full else [full]
+        self.assertTrue(books)
+        for book, full_book in zip(books, full_books):
+            self.assertEqual(list(book), list(expected))
+            for field, nested in expected.items():
+                if nested is None or full_book[field] is None:
+                    self.assertEqual(book[field], full_book[field])
+                elif isinstance(full_book[field], list):
+                    self.assertEqual(book[field], [{key: item[key] for key in nested} for item in full_book[field]])
+                else:
+                    self.assertEqual(book[field], {key: full_book[field][key] for key in nested})
+        return queries
+
+    def paths(self):
+        """
+        Every way books are read: BookListing, values() with a search, and BookSerializer
+        :return: generator of (str, bool), query parameters and whether books are read as values() rows
+        """
+        yield '', True
+        yield 'search=dragon', True
+        BookViewSet.fast_read = False
+        try:
+            yield '', False
+        finally:
+            BookViewSet.fast_read = True
+
+    def test_fields(self):
+        expected = {'id': None, 'title': None, 'rating': None, 'inventory': ['available']}
+        for params, values in self.paths():
+            with self.subTest(params):
+                url = '/books/?fields=title,rating,inventory.available&' + params
+                queries = self.assertFields(url, expected)
+                self.assertFalse(any('description' in sql for sql in queries))
+                self.assertFalse(any('"owned"' in sql for sql in queries))
+                self.assertFalse(any('library_book_author' in sql or 'library_book_genre' in sql for sql in queries))
+
+                self.assertFields('/books/{}/?fields=title,author'.format(self.book.id),
+                                  {'id': None, 'title': None, 'author': ['id', 'name']})
+
+    def test_omit(self):
+        expected = {
+            'id': None, 'isbn': None, 'title': None, 'type': None, 'edition': None, 'pages': None, 'rating': None,
+            'rating_count': None, 'review_count': None, 'image_url': None, 'genre': ['id'], 'inventory': ['owned'],
+        }
+        for params, values in self.paths():
+            with self.subTest(params):
+                queries = self.assertFields(
+                    '/books/?omit=description,author,genre.name,inventory.available,id&' + params, expected,
+                )
+                self.assertFalse(any('description' in sql for sql in queries))
+                if values:
+                    # Genre ids are read without joining the genres
+                    self.assertFalse(any('library_genre"' in sql for sql in queries))
+
+    def test_ordering(self):
+        """Keyset pages seek on the ordering field, even when it isn't asked for"""
+        response, queries = self.get('/books/?cursor=&ordering=-rating&fields=title')
+        self.assertEqual([book['title'] for book in response.data['results']], ['Dragon 0', 'Dragon 1', 'Dragon 2'])
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+
+        response, queries = self.get('/books/?ordering=rating&fields=title&page_size=1')
+        self.assertEqual(response.data['results'][0]['title'], 'Dragon 2')
+
+    def test_nested(self):
+        url = '/authors/{}/books/?fields=title'.format(self.author.id)
+        queries = self.assertFields(url, {'id': None, 'title': None})
+        self.assertFalse(any('description' in sql for sql in queries))
+
+        url = '/genres/{}/books/?omit=description,author,genre,inventory,isbn,edition'.format(self.genre.id)
+        self.assertFields(url, {
+            'id': None, 'title': None, 'type': None, 'pages': None, 'rating': None, 'rating_count': None,
+            'review_count': None, 'image_url': None,
+        })
+
+    def test_invalid(self):
+        self.assertEqual(self.client.get('/books/?fields=title,publisher').status_code, 400)
+        self.assertEqual(self.client.get('/books/?omit=inventory.reserved').status_code, 400)
+
+    def test_writes_unaffected(self):
+        response = self.client.post('/books/?fields=title', {
+            'title': 'New', 'type': 'ebook', 'inventory': {'owned': 1, 'available': 1},
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
@@ -0,0 +1,59 @@
+import csv
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+
+from django.core.management import call_command
+from django.test import TestCase
+from library.management.commands.generate_book_data import generate_rows, write_csv
+from library.management.commands.load_book_data import load_csv, parse_row
+from library.models import *
+from library.tests.test_load_book_data import HEADER
+
+
+class TestGenerateBookData(TestCase):
+    """Tests the synthetic csv written by generate_book_data"""
+
+    def generate(self, rows, seed=0):
+        output = io.StringIO(newline='')
+        write_csv(output, rows, seed=seed, genres=40)
+        return output.getvalue()
+
+    def test_deterministic(self):
+        self.assertEqual(self.generate(200), self.generate(200))
+        self.assertNotEqual(self.generate(200), self.generate(200, seed=1))
+
+    def test_layout(self):
+        rows = list(csv.DictReader(io.StringIO(self.generate(500))))
+        self.assertEqual(len(rows), 500)
+        self.assertEqual(list(rows[0]), HEADER)
+        for row in rows:
+            values = parse_row(row)
+            self.assertEqual(len(set(values['authors'])), len(values['authors']))
+            self.assertTrue(1 <= values['rating'] <= 5)
+            self.assertTrue(values['pages'] is None or values['pages'] > 0)
+
+        # Popularity is skewed, the most common genre is on far more books than the median one
+        genre_counts = {}
+        for row in rows:
+            for genre in row['genres'].split('|'):
+                genre_counts[genre] = genre_counts.get(genre, 0) + 1
+        counts = sorted(genre_counts.values(), reverse=True)
+        self.assertGreater(counts[0], counts[len(counts) // 2] * 5)
+
+    def test_rows_are_lazy(self):
+        rows = generate_rows(10 ** 9)
+        self.assertEqual(set(next(rows)), set(HEADER))
+
+    def test_load(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        try:
+            with redirect_stdout(io.StringIO()):
+                call_command('generate_book_data', path, rows=300, stdout=io.StringIO())
+                load_csv(path, bulk=True)
+        finally:
+            os.remove(path)
+        self.assertEqual(Book.objects.count(), 300)
+        self.assertEqual(BookListing.objects.count(), 300)
@@ -0,0 +1,134 @@
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+
+# The filters and orderings documented in README.txt
+FILTERS = [
+    'isbn=9.78E%2B12',
+    'title=Test3',
+    'type=ebook',
+    'edition=2nd',
+    'pages=100',
+    'rating=4.5',
+    'rating_count=10',
+    'review_count=3',
+    'author__name=Author1',
+    'genre__name=Genre1',
+]
+ORDERINGS = ['id', 'title', 'pages', 'rating', 'edition']
+
+
+class TestIndexes(APITestCase):
+    """
+    Runs every documented filter and ordering of /books/ and checks with EXPLAIN that none of the queries it makes
+    reads a whole table, and that orderings come straight from an index without sorting
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+
+        authors = [Author.objects.create(name='Author{}'.format(i)) for i in range(5)]
+        genres = [Genre.objects.create(name='Genre{}'.format(i)) for i in range(5)]
+        for i in range(60):
+            book = Book.objects.create(
+                isbn='9.78E+12' if i % 3 else '',
+                title='Test{}'.format(i % 10),
+                type=Book.TYPES[i % 4][0],
+                edition='{}nd'.format(i % 5),
+                pages=None if i % 7 == 0 else 100 + i % 9,
+                rating=None if i % 8 == 0 else 3 + (i % 4) / 2,
+                rating_count=i % 20,
+                review_count=i % 6,
+            )
+            book.author.add(authors[i % 5])
+            book.genre.add(genres[i % 5])
+
+    def explain(self, sql):
+        """
+        :param sql: str, a query as it was run
+        :return: list of str, the lines of its plan
+        """
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small tables are cheaper to read whole, this leaves the planner a full scan only if no index fits
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def full_scans(self, sql, plan):
+        """
+        :param sql: str, the query
+        :param plan: list of str, see explain()
+        :return: list of str, the lines reading a whole table
+        """
+        if connection.vendor == 'postgresql':
+            return [line for line in plan if 'Seq Scan' in line]
+        if 'WHERE' not in sql and 'LIMIT' in sql and not self.sorts(plan):
+            # SQLite stores rows in the primary key's B-tree, so reading them in id order up to the limit is what
+            # PostgreSQL does with an index scan on the primary key
+            return []
+        # e.g. SCAN library_booklisting, but not SCAN library_booklisting USING INDEX ...
+        return [line for line in plan if re.match(r'\s*SCAN (TABLE )?\w+$', line)]
+
+    def sorts(self, plan):
+        if connection.vendor == 'postgresql':
+            return [line for line in plan if re.match(r'\s*(->\s*)?Sort ', line.strip())]
+        return [line for line in plan if 'TEMP B-TREE' in line]
+
+    def assertUsesIndexes(self, url, sorted_by_index=False):
+        """
+        Requests url and checks the plan of every query it ran
+        :param url: str
+        :param sorted_by_index: bool, also check that no query sorts its rows
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for query in context.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            plan = self.explain(query['sql'])
+            self.assertEqual(self.full_scans(query['sql'], plan), [], '{} reads a whole table:\n{}\n{}'.format(
+                url, query['sql'], '\n'.join(plan),
+            ))
+            if sorted_by_index and 'ORDER BY' in query['sql']:
+                self.assertEqual(self.sorts(plan), [], '{} sorts:\n{}\n{}'.format(
+                    url, query['sql'], '\n'.join(plan),
+                ))
+
+    def test_filters(self):
+        for params in FILTERS:
+            with self.subTest(params):
+                self.assertUsesIndexes('/books/?' + params)
+
+    def test_orderings(self):
+        for field in ORDERINGS:
+            for ordering in (field, '-' + field):
+                with self.subTest(ordering):
+                    self.assertUsesIndexes('/books/?ordering=' + ordering, sorted_by_index=True)
+                    self.assertUsesIndexes('/books/?cursor=&ordering=' + ordering, sorted_by_index=True)
+
+    def test_cursor_pages(self):
+        """Seeking past a cursor uses the (field, id) index too"""
+        for field in ORDERINGS:
+            with self.subTest(field):
+                next_url = self.client.get('/books/?cursor=&ordering=' + field).data['next']
+                self.assertUsesIndexes(next_url, sorted_by_index=True)
+
+    def test_documented_examples(self):
+        self.assertUsesIndexes('/books/?title=Test3')
+        self.assertUsesIndexes('/books/?author__name=Author1&ordering=pages')
+        self.assertUsesIndexes('/books/?type=ebook&ordering=-title')
+
+    def test_nested(self):
+        author = Author.objects.get(name='Author1')
+        genre = Genre.objects.get(name='Genre1')
+        self.assertUsesIndexes('/authors/{}/books/'.format(author.id))
+        self.assertUsesIndexes('/genres/{}/books/?ordering=title'.format(genre.id))
+        self.assertUsesIndexes('/authors/?name=Author1')
@@ -0,0 +1,105 @@
+from django.test import TestCase
+from library.listing import rebuild_listings
+from library.models import *
+from library.serializers import *
+
+
+class TestBookListing(TestCase):
+    """Tests that BookListing stays the same as what BookSerializer returns through every kind of write"""
+
+    def setUp(self):
+        self.author = Author.objects.create(name='John Doe')
+        self.author2 = Author.objects.create(name='村上 春樹')
+        self.genre = Genre.objects.create(name='Fiction')
+        self.genre2 = Genre.objects.create(name='Fantasy')
+
+        self.book = Book.objects.create(
+            isbn='9.78E+12',
+            title='Test',
+            type='ebook',
+            pages=123,
+            rating=4.5,
+        )
+        self.book.author.add(self.author2, self.author)
+        self.book.genre.add(self.genre)
+        Inventory.objects.create(
+            book=self.book,
+            owned=2,
+            available=1,
+        )
+
+        self.book2 = Book.objects.create(
+            title='Test2',
+            type='Hardcover',
+        )
+        self.book2.author.add(self.author)
+
+    def assertListingsMatch(self):
+        expected = BookSerializer(Book.objects.with_related().order_by('id'), many=True).data
+        rows = BookListing.objects.order_by('id').values(*BookListingSerializer.columns)
+        self.assertEqual(BookListingSerializer(rows, many=True).data, expected)
+
+    def test_create(self):
+        self.assertListingsMatch()
+
+    def test_update_book(self):
+        self.book.title = 'Updated'
+        self.book.save()
+        self.assertListingsMatch()
+
+    def test_inventory(self):
+        inventory = self.book.inventory
+        inventory.available = 2
+        inventory.save()
+        self.assertListingsMatch()
+
+        inventory.delete()
+        self.assertListingsMatch()
+
+    def test_links(self):
+        self.book2.author.add(self.author2)
+        self.genre2.book_set.add(self.book, self.book2)
+        self.assertListingsMatch()
+
+        self.book.author.remove(self.author)
+        self.genre2.book_set.clear()
+        self.assertListingsMatch()
+
+    def test_rename(self):
+        self.author.name = 'Renamed'
+        self.author.save()
+        self.genre.name = 'Renamed'
+        self.genre.save()
+        self.assertListingsMatch()
+
+    def test_delete(self):
+        self.author2.delete()
+        self.genre.delete()
+        self.assertListingsMatch()
+
+        self.book.delete()
+        self.assertListingsMatch()
+
+    def test_rebuild(self):
+        Book.objects.filter(id=self.book.id).update(title='Updated')
+        BookListing.objects.filter(id=self.book2.id).delete()
+
+        rebuild_listings()
+        self.assertListingsMatch()
+
+    def test_endpoints(self):
+        """GET responses read the listing and filters and nested listings still apply"""
+        response = self.client.get('/books/?author__name=村上 春樹', HTTP_ACCEPT='application/json')
+        self.assertEqual([book['id'] for book in response.json()['results']], [self.book.id])
+
+        response = self.client.get('/books/?genre__name=Fiction&type=ebook&ordering=-title')
+        self.assertEqual([book['id'] for book in response.data['results']], [self.book.id])
+
+        response = self.client.get('/authors/{}/books/?ordering=-id'.format(self.author.id))
+        self.assertEqual([book['id'] for book in response.data['results']], [self.book2.id, self.book.id])
+
+        response = self.client.get('/books/?type=Invalid')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/books/{}/'.format(self.book.id))
+        self.assertEqual(response.data, BookSerializer(Book.objects.with_related().get(id=self.book.id)).data)
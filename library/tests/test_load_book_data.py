@@ -0,0 +1,138 @@
+import csv
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase
+from library.management.commands.load_book_data import load_csv
+from library.models import *
+
+HEADER = ['book_authors', 'book_desc', 'book_edition', 'book_format', 'book_isbn', 'book_pages', 'book_rating',
+          'book_rating_count', 'book_review_count', 'book_title', 'genres', 'image_url']
+
+
+def make_row(title, authors='John Doe', genres='Fiction', rating='4.5'):
+    return {
+        'book_authors': authors,
+        'book_desc': 'About {}'.format(title),
+        'book_edition': '1st',
+        'book_format': 'Hardcover',
+        'book_isbn': '9.78E+12',
+        'book_pages': '123 pages',
+        'book_rating': rating,
+        'book_rating_count': '10',
+        'book_review_count': '2',
+        'book_title': title,
+        'genres': genres,
+        'image_url': 'http://example.com/{}.jpg'.format(title),
+    }
+
+
+ROWS = [
+    make_row('First', authors='John Doe|Jane Doe', genres='Fiction|Fantasy'),
+    make_row('Second', authors='Jane Doe', genres='Fantasy'),
+    make_row('Broken', rating='not a number'),
+    make_row('Third', authors='Zoë Doe|Zoë Doe', genres='Fiction'),
+]
+
+
+class TestLoadBookData(TestCase):
+    """Tests that the bulk load loads the same catalog as the row by row load"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as csv_file:
+            writer = csv.DictWriter(csv_file, HEADER)
+            writer.writeheader()
+            writer.writerows(ROWS)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def load(self, **kwargs):
+        """
+        Loads the csv
+        :return: str, what was printed
+        """
+        output = io.StringIO()
+        with redirect_stdout(output):
+            load_csv(self.path, **kwargs)
+        return output.getvalue()
+
+    def catalog(self):
+        """
+        :return: list of tuples, each book with its author and genre names
+        """
+        books = Book.objects.with_related().order_by('title')
+        return [(
+            book.title,
+            book.pages,
+            book.rating,
+            sorted(author.name for author in book.author.all()),
+            sorted(genre.name for genre in book.genre.all()),
+            book.inventory.owned == book.inventory.available,
+        ) for book in books]
+
+    def test_same_as_row_by_row(self):
+        self.load()
+        expected = self.catalog()
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        Genre.objects.all().delete()
+
+        self.load(bulk=True, batch_size=2)
+
+        self.assertEqual(self.catalog(), expected)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Genre.objects.count(), 2)
+
+    def test_errors_reported(self):
+        output = self.load(bulk=True)
+
+        self.assertEqual(output.count('Row could not be loaded'), 1)
+        self.assertIn("'book_title': 'Broken'", output)
+        self.assertEqual(Book.objects.count(), 3)
+
+    def test_existing_rows_skipped(self):
+        self.load()
+        self.load(bulk=True)
+
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 3)
+        self.assertEqual(Book.author.through.objects.count(), 4)
+
+    def test_reuses_existing_authors_and_genres(self):
+        author = Author.objects.create(name='Jane Doe')
+        genre = Genre.objects.create(name='Fantasy')
+
+        self.load(bulk=True)
+
+        self.assertEqual(list(Book.objects.get(title='Second').author.all()), [author])
+        self.assertEqual(list(Book.objects.get(title='Second').genre.all()), [genre])
+
+    def test_failing_batch_loaded_row_by_row(self):
+        with mock.patch.object(Inventory.objects, 'bulk_create', side_effect=IntegrityError('failed')):
+            output = self.load(bulk=True)
+
+        self.assertEqual(output.count('Row could not be loaded'), 1)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Inventory.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 3)
+
+    def test_workers(self):
+        self.load()
+        expected = self.catalog()
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        Genre.objects.all().delete()
+
+        output = self.load(bulk=True, batch_size=1, workers=2, progress=True)
+
+        self.assertEqual(self.catalog(), expected)
+        # Jane Doe is in rows parsed by different workers
+        self.assertEqual(Author.objects.filter(name='Jane Doe').count(), 1)
+        self.assertEqual(output.count('Row could not be loaded'), 1)
+        self.assertIn('4 rows, 100.0%', output)
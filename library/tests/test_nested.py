@@ -0,0 +1,116 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, APIClient
+from library.models import *
+from library.pagination import LibraryPagination
+from Library.settings import API_PAGE_SIZE
+
+
+class TestNestedList(APITestCase):
+    """Tests the nested author and genre actions"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.author = Author.objects.create(
+            id=1,
+            name='John Doe',
+        )
+        self.author2 = Author.objects.create(
+            id=2,
+            name='Jane Doe',
+        )
+        self.genre = Genre.objects.create(
+            id=1,
+            name='Fiction',
+        )
+
+        for i in range(API_PAGE_SIZE + 5):
+            book = Book.objects.create(
+                title='Test{}'.format(i % 3),
+                type='ebook' if i % 2 else 'Hardcover',
+                pages=i,
+                rating=4,
+                rating_count=12,
+                review_count=123,
+            )
+            book.author.add(self.author)
+            book.genre.add(self.genre)
+            if i % 2:
+                book.author.add(self.author2)
+
+    def get_results(self, url):
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return response, response.data['results']
+
+    def test_filter_nested_books(self):
+        response, results = self.get_results('/authors/1/books/?title=Test1&type=ebook')
+
+        expected = Book.objects.filter(author=self.author, title='Test1', type='ebook').count()
+        self.assertEqual(response.data['count'], expected)
+        for book in results:
+            self.assertEqual(book['title'], 'Test1')
+            self.assertEqual(book['type'], 'ebook')
+
+    def test_order_nested_books(self):
+        response, results = self.get_results('/genres/1/books/?ordering=-pages')
+
+        pages = [book['pages'] for book in results]
+        self.assertEqual(pages, sorted(pages, reverse=True))
+        self.assertEqual(pages[0], API_PAGE_SIZE + 4)
+
+    def test_filter_nested_authors(self):
+        """?name= filters the authors, not the genre the action belongs to"""
+        response, results = self.get_results('/genres/1/authors/?name=Jane+Doe')
+
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(results[0]['name'], 'Jane Doe')
+
+    def test_nested_authors_distinct(self):
+        response, results = self.get_results('/genres/1/authors/')
+
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([author['name'] for author in results], ['John Doe', 'Jane Doe'])
+
+    def test_nested_genres_distinct(self):
+        response, results = self.get_results('/authors/1/genres/?ordering=name')
+
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(results[0]['name'], 'Fiction')
+
+    def test_single_count(self):
+        with CaptureQueriesContext(connection) as context:
+            self.get_results('/authors/1/books/?page=2')
+
+        counts = [query for query in context.captured_queries if 'COUNT(' in query['sql']]
+        self.assertEqual(len(counts), 1)
+
+    def test_known_count(self):
+        """Passing a count skips the COUNT(*)"""
+        request = Request(APIRequestFactory().get('/books/'))
+        paginator = LibraryPagination()
+
+        with CaptureQueriesContext(connection) as context:
+            page = paginator.paginate_queryset(Book.objects.order_by('id'), request, count=API_PAGE_SIZE + 5)
+
+        self.assertEqual(len(page), API_PAGE_SIZE)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(paginator.get_paginated_response([]).data['count'], API_PAGE_SIZE + 5)
+
+    def test_links_keep_scheme_and_filters(self):
+        response = self.client.get('/authors/1/books/?ordering=pages', secure=True)
+
+        self.assertEqual(response.data['next'], 'https://testserver/authors/1/books/?ordering=pages&page=2')
+
+    def test_invalid_page(self):
+        response = self.client.get('/genres/1/books/?page=100')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_missing_parent(self):
+        response = self.client.get('/genres/100/books/')
+
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,127 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from library.listing import refresh_listings
+from library.models import *
+from library.views import BookViewSet
+from Library.settings import API_PAGE_SIZE
+
+
+class TestKeysetPagination(APITestCase):
+    """Tests ?cursor= pagination"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.author = Author.objects.create(
+            id=1,
+            name='John Doe',
+        )
+        self.genre = Genre.objects.create(
+            id=1,
+            name='Fiction',
+        )
+
+        # Repeated and NULL values so that the id tie breaker and NULL handling are exercised
+        for i in range(API_PAGE_SIZE * 2 + 3):
+            book = Book.objects.create(
+                title='Test{}'.format(i % 7),
+                type='ebook',
+                edition='{}th'.format(i % 4),
+                pages=None if i % 5 == 0 else i % 9,
+                rating=None if i % 6 == 0 else (i % 3) + 0.5,
+                rating_count=12,
+                review_count=123,
+            )
+            book.author.add(self.author)
+            book.genre.add(self.genre)
+
+    def walk(self, url):
+        """
+        Follows next links to the end and then previous links back to the start
+        :param url: str, url of the first page
+        :return: (list of int, list of int), book ids read forwards and backwards
+        """
+        forwards = []
+        pages = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append([book['id'] for book in response.data['results']])
+            forwards.extend(pages[-1])
+            last = response
+            url = response.data['next']
+
+        backwards = list(pages[-1])
+        url = last.data['previous']
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            backwards = [book['id'] for book in response.data['results']] + backwards
+            url = response.data['previous']
+
+        return forwards, backwards
+
+    def expected(self, ordering):
+        tie_breaker = '-id' if ordering.startswith('-') else 'id'
+        return list(Book.objects.order_by(ordering, tie_breaker).values_list('id', flat=True))
+
+    def test_every_ordering_field(self):
+        """Walk every ordering field in both directions"""
+        for field in BookViewSet.ordering_fields:
+            for ordering in [field, '-' + field]:
+                forwards, backwards = self.walk('/books/?cursor=&ordering={}'.format(ordering))
+                self.assertEqual(forwards, self.expected(ordering), ordering)
+                self.assertEqual(backwards, forwards, ordering)
+
+    def test_default_ordering(self):
+        forwards, backwards = self.walk('/books/?cursor=')
+        self.assertEqual(forwards, self.expected('id'))
+
+    def test_filtered(self):
+        Book.objects.filter(id__in=self.expected('id')[::2]).update(type='Hardcover')
+        refresh_listings(self.expected('id'))
+        forwards, backwards = self.walk('/books/?cursor=&type=Hardcover&ordering=-rating')
+        self.assertEqual(forwards, list(Book.objects.filter(type='Hardcover').order_by('-rating', '-id')
+                                         .values_list('id', flat=True)))
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/books/?cursor=&ordering=pages')
+
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/books/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_for_other_ordering(self):
+        response = self.client.get('/books/?cursor=&ordering=title')
+        next_url = response.data['next']
+
+        response = self.client.get(next_url.replace('ordering=title', 'ordering=pages'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_number_default(self):
+        """Without ?cursor the response is page number paginated"""
+        response = self.client.get('/books/')
+        self.assertEqual(response.data['count'], Book.objects.count())
+
+    def test_nested_books(self):
+        forwards, backwards = self.walk('/authors/1/books/?cursor=')
+        self.assertEqual(forwards, self.expected('id'))
+
+        forwards, backwards = self.walk('/genres/1/books/?cursor=')
+        self.assertEqual(forwards, self.expected('id'))
+
+    def test_nested_authors_and_genres(self):
+        response = self.client.get('/genres/1/authors/?cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'John Doe')
+
+        response = self.client.get('/authors/1/genres/?cursor=')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'Fiction')
@@ -0,0 +1,69 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.test import override_settings
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+from library.profiling import prune
+
+
+class TestProfiling(APITestCase):
+    """Tests library.profiling.ProfilingMiddleware"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        book = Book.objects.create(title='Test', type='ebook')
+        book.author.add(Author.objects.create(name='John Doe'))
+
+    def config(self, **config):
+        return override_settings(LIBRARY_PROFILING=dict(
+            {'HEADER': 'X-Library-Profile', 'TOKEN': 'secret', 'DIRECTORY': self.directory, 'SAMPLE_INTERVAL': 0.1},
+            **config
+        ))
+
+    def test_header(self):
+        with self.config():
+            response = self.client.get('/books/', HTTP_X_LIBRARY_PROFILE='secret')
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Library-Profile']
+        self.assertEqual(sorted(os.listdir(self.directory)), [name + '.collapsed', name + '.pstats'])
+        self.assertIn('GET-books', name)
+
+        stats = pstats.Stats(os.path.join(self.directory, name + '.pstats'))
+        self.assertTrue(any(func[2] == 'get_queryset' for func in stats.stats))
+
+        with open(os.path.join(self.directory, name + '.collapsed')) as collapsed_file:
+            lines = collapsed_file.read().splitlines()
+        for line in lines:
+            stack, samples = line.rsplit(' ', 1)
+            self.assertGreater(int(samples), 0)
+            self.assertFalse(stack.startswith('profiling.py'))
+
+    def test_not_profiled(self):
+        with self.config():
+            self.assertNotIn('X-Library-Profile', self.client.get('/books/'))
+            self.assertNotIn('X-Library-Profile', self.client.get('/books/', HTTP_X_LIBRARY_PROFILE='wrong'))
+        # Without a token the header does nothing
+        with self.config(TOKEN=None):
+            self.assertNotIn('X-Library-Profile', self.client.get('/books/', HTTP_X_LIBRARY_PROFILE=''))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_enabled(self):
+        with self.config(ENABLED=True):
+            self.assertIn('X-Library-Profile', self.client.get('/authors/'))
+
+    def test_retention(self):
+        with self.config(MAX_FILES=2):
+            names = [self.client.get('/books/', HTTP_X_LIBRARY_PROFILE='secret')['X-Library-Profile']
+                     for _ in range(4)]
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+        # By size, only whole profiles are deleted
+        prune(self.directory, 10, 0)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(len(set(names)), 4)
@@ -0,0 +1,63 @@
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+from library.tests.query_budget import QueryBudgetMixin
+
+
+class TestBookQueries(QueryBudgetMixin, APITestCase):
+    """Tests that the book returning endpoints run a constant number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.author = Author.objects.create(
+            id=1,
+            name='John Doe',
+        )
+        self.genre = Genre.objects.create(
+            id=1,
+            name='Fiction',
+        )
+
+    def seed_books(self, count):
+        """
+        Creates books that each have two authors, two genres and an inventory
+        :param count: int, number of books to create
+        """
+        for i in range(count):
+            book = Book.objects.create(
+                title='Test{}'.format(i),
+                type='ebook',
+                rating=4,
+                rating_count=12,
+                review_count=123,
+            )
+            book.author.add(self.author, Author.objects.create(name='Co-Author{}'.format(i)))
+            book.genre.add(self.genre, Genre.objects.create(name='Genre{}'.format(book.id)))
+            Inventory.objects.create(
+                book=book,
+                owned=2,
+                available=1,
+            )
+
+    def test_list_books(self):
+        """Count and page, both on BookListing"""
+        self.assertConstantQueries('/books/', self.seed_books, budget=2)
+
+    def test_list_books_filtered(self):
+        self.assertConstantQueries('/books/?genre__name=Fiction&ordering=-rating', self.seed_books, budget=2)
+
+    def test_search_books(self):
+        """Count, page, authors and genres"""
+        self.assertConstantQueries('/books/?search=test', self.seed_books, budget=4)
+
+    def test_book_detail(self):
+        """A single BookListing row"""
+        self.seed_books(1)
+        book = Book.objects.get()
+        self.assertQueryBudget('/books/{}/'.format(book.id), 1)
+
+    def test_nested_author_books(self):
+        self.assertConstantQueries('/authors/1/books/', self.seed_books)
+
+    def test_nested_genre_books(self):
+        self.assertConstantQueries('/genres/1/books/', self.seed_books)
@@ -0,0 +1,123 @@
+import datetime
+import decimal
+import io
+import json
+import uuid
+from collections import OrderedDict
+from unittest import mock, skipIf
+
+from django.test import TestCase
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from library.models import *
+from library.parsers import FastJSONParser
+from library.renderers import FastJSONRenderer, orjson
+
+# Values that orjson and json write or read differently, or that need DRF's encoder
+TRICKY = OrderedDict([
+    ('floats', [0.1, 4.25, -0.0, 1e16, 1.5e-7, 2.2790121708605243e274, 123456789.125]),
+    ('integers', [0, -1, 2 ** 63 - 1, 2 ** 64, -2 ** 70]),
+    ('strings', ['村上 春樹', 'quote " backslash \\ slash /', '\x00\x1f\x7f\b\f\n\r\t', 'line\u2028para\u2029']),
+    ('keys', {1: 'int', None: 'none', True: 'bool'}),
+    ('datetime', datetime.datetime(2019, 7, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc)),
+    ('date', datetime.date(2019, 7, 1)),
+    ('time', datetime.time(12, 30)),
+    ('decimal', decimal.Decimal('4.25')),
+    ('uuid', uuid.UUID('12345678-1234-5678-1234-567812345678')),
+    ('nested', [OrderedDict([('b', 1), ('a', [None, True, False, {}])])]),
+])
+
+
+@skipIf(orjson is None, 'orjson is not installed')
+class TestFastJSONRenderer(TestCase):
+    """Tests that FastJSONRenderer renders exactly what JSONRenderer does"""
+
+    def assertSameRender(self, data, accepted_media_type=None, renderer_context=None):
+        expected = JSONRenderer().render(data, accepted_media_type, renderer_context)
+        self.assertEqual(FastJSONRenderer().render(data, accepted_media_type, renderer_context), expected)
+
+    def test_tricky_values(self):
+        for name, value in TRICKY.items():
+            with self.subTest(name):
+                self.assertSameRender({name: value})
+        self.assertSameRender(TRICKY)
+        self.assertSameRender(None)
+
+    def test_indent(self):
+        self.assertSameRender(TRICKY, 'application/json; indent=4')
+        self.assertSameRender(TRICKY, renderer_context={'indent': 2})
+
+    def test_errors(self):
+        with self.assertRaises(TypeError):
+            JSONRenderer().render({'value': object()})
+        with self.assertRaises(TypeError):
+            FastJSONRenderer().render({'value': object()})
+
+    def test_nan(self):
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({'value': float('inf')})
+        # The one known difference, orjson writes null for what json refuses
+        self.assertEqual(FastJSONRenderer().render({'value': float('inf')}), b'{"value":null}')
+
+    def test_without_orjson(self):
+        with mock.patch('library.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(TRICKY), JSONRenderer().render(TRICKY))
+
+    def test_api_responses(self):
+        author = Author.objects.create(name='村上 春樹')
+        genre = Genre.objects.create(name='Fiction')
+        for i in range(3):
+            book = Book.objects.create(
+                title='Book {}'.format(i), type='Hardcover', rating=4.25, pages=100 + i,
+                description='Line one\nLine two "quoted"',
+            )
+            book.author.add(author)
+            book.genre.add(genre)
+            Inventory.objects.create(book=book, owned=2, available=1)
+
+        for path in ['/books/', '/books/{}/'.format(book.id), '/books/?search=Book', '/authors/', '/genres/']:
+            with self.subTest(path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+@skipIf(orjson is None, 'orjson is not installed')
+class TestFastJSONParser(TestCase):
+    """Tests that FastJSONParser parses exactly what JSONParser does"""
+
+    def parse(self, parser, body, encoding='utf-8'):
+        return parser.parse(io.BytesIO(body), 'application/json', {'encoding': encoding})
+
+    def test_same_data(self):
+        bodies = [
+            JSONRenderer().render(TRICKY),
+            json.dumps(TRICKY, cls=JSONRenderer.encoder_class, indent=2).encode(),
+            b'{"big": 12345678901234567890123, "small": -9223372036854775809, "a": 1, "a": 2}',
+            b'[1e400, 1E5, 0.5e-3]',
+        ]
+        for body in bodies:
+            with self.subTest(body[:40]):
+                expected = self.parse(JSONParser(), body)
+                self.assertEqual(self.parse(FastJSONParser(), body), expected)
+                self.assertEqual(repr(self.parse(FastJSONParser(), body)), repr(expected))
+
+    def test_errors(self):
+        for body in [b'{"title": ', b'NaN', b'\xef\xbb\xbf{}', b'{"title": "\xff"}']:
+            with self.subTest(body):
+                with self.assertRaises(ParseError) as expected:
+                    self.parse(JSONParser(), body)
+                with self.assertRaises(ParseError) as error:
+                    self.parse(FastJSONParser(), body)
+                self.assertEqual(str(error.exception), str(expected.exception))
+
+    def test_encoding(self):
+        body = '{"name": "村上 春樹"}'.encode('utf-16')
+        self.assertEqual(self.parse(FastJSONParser(), body, 'utf-16'), {'name': '村上 春樹'})
+
+    def test_api_request(self):
+        response = self.client.post('/authors/', '{"name": "村上 春樹"}', content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Author.objects.filter(name='村上 春樹').exists())
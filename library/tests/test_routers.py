@@ -0,0 +1,96 @@
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache as default_cache
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from library import routers
+from library.models import *
+
+REPLICAS = {'ALIASES': ['replica'], 'STICKY_SECONDS': 5, 'COOKIE': 'library_primary'}
+
+
+@override_settings(LIBRARY_REPLICAS=REPLICAS)
+class TestReplicaRouting(TransactionTestCase):
+    """
+    Tests reading from replicas. The replica is a separate database here, so the rows in each tell which one a
+    request read from. Transactions would pin reads to default, hence TransactionTestCase.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        default_cache.clear()
+        Author.objects.create(name='Primary')
+        Author.objects.using('replica').create(name='Replica')
+
+    def names(self):
+        response = self.client.get('/authors/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return [author['name'] for author in response.json()['results']]
+
+    def test_reads_from_replica(self):
+        self.assertEqual(self.names(), ['Replica'])
+        self.assertEqual(Author.objects.count(), 1)
+        # Outside of requests everything is read from default
+        self.assertEqual(Author.objects.get().name, 'Primary')
+
+    def test_write_to_primary_and_stick(self):
+        response = self.client.post('/authors/', {'name': 'New'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Author.objects.using('default').filter(name='New').exists())
+        self.assertFalse(Author.objects.using('replica').filter(name='New').exists())
+        self.assertEqual(response.cookies['library_primary']['max-age'], 5)
+
+        # The client sees its own write
+        self.assertEqual(self.names(), ['Primary', 'New'])
+
+        self.client.cookies['library_primary'] = repr(time.time() - 6)
+        self.assertEqual(self.names(), ['Replica'])
+        self.client.cookies['library_primary'] = 'invalid'
+        self.assertEqual(self.names(), ['Replica'])
+
+    def test_logged_in(self):
+        # Neither the user nor the session are on the replica
+        user = User.objects.create_user('reader', password='secret')
+        self.client.force_login(user)
+
+        response = self.client.get('/authors/', HTTP_ACCEPT='application/json')
+        self.assertEqual([author['name'] for author in response.json()['results']], ['Replica'])
+        self.assertEqual(response.wsgi_request.user, user)
+
+    def test_transactions_read_from_primary(self):
+        token = routers._read_alias.set('replica')
+        try:
+            self.assertEqual(Author.objects.get().name, 'Replica')
+            with transaction.atomic():
+                self.assertEqual(Author.objects.select_for_update().get().name, 'Primary')
+        finally:
+            routers._read_alias.reset(token)
+
+    @override_settings(LIBRARY_RESPONSE_CACHE={'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300})
+    def test_stale_reads_not_cached(self):
+        # A write by another client
+        Author.objects.create(name='Other')
+
+        for _ in range(2):
+            response = self.client.get('/authors/', HTTP_ACCEPT='application/json')
+            self.assertEqual(response['X-Cache'], 'MISS')
+
+        with mock.patch('library.routers.time.time', return_value=time.time() + 6):
+            self.client.get('/authors/', HTTP_ACCEPT='application/json')
+            response = self.client.get('/authors/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+
+class TestWithoutReplicas(TransactionTestCase):
+    """The test settings have no replicas"""
+    databases = {'default', 'replica'}
+
+    def test_primary_only(self):
+        Author.objects.create(name='Primary')
+
+        response = self.client.get('/authors/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['results'][0]['name'], 'Primary')
+        response = self.client.post('/authors/', {'name': 'New'})
+        self.assertNotIn('library_primary', response.cookies)
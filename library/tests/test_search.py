@@ -0,0 +1,84 @@
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+
+
+class TestBookSearch(APITestCase):
+    """Tests ?search= on books"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.author = Author.objects.create(
+            id=1,
+            name='John Doe',
+        )
+
+        self.dragon_title = self.create_book('Dragon Rider', 'A boy finds an egg.')
+        self.dragon_description = self.create_book('The Hoard', 'A dragon sleeps under the mountain.')
+        self.other = self.create_book('Circe', 'A witch on an island.')
+
+    def create_book(self, title, description):
+        book = Book.objects.create(
+            title=title,
+            type='ebook',
+            description=description,
+        )
+        book.author.add(self.author)
+        return book
+
+    def search(self, url):
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        return [book['id'] for book in response.data['results']]
+
+    def test_ranked_by_relevance(self):
+        """Title matches rank above description matches"""
+        self.assertEqual(self.search('/books/?search=dragon'), [self.dragon_title.id, self.dragon_description.id])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('/books/?search=dragon+mountain'), [self.dragon_description.id])
+
+    def test_no_match(self):
+        self.assertEqual(self.search('/books/?search=spaceship'), [])
+
+    def test_kept_up_to_date_on_write(self):
+        self.other.description = 'A witch meets a dragon.'
+        self.other.save()
+        self.assertIn(self.other.id, self.search('/books/?search=dragon'))
+
+        self.dragon_title.title = 'Egg Rider'
+        self.dragon_title.save()
+        self.assertNotIn(self.dragon_title.id, self.search('/books/?search=dragon'))
+
+        self.dragon_description.delete()
+        self.assertEqual(self.search('/books/?search=dragon'), [self.other.id])
+
+    def test_bulk_writes_are_indexed(self):
+        Book.objects.bulk_create([Book(title='Dragonfly', type='ebook', description='Another dragon.')])
+        self.assertEqual(len(self.search('/books/?search=another+dragon')), 1)
+
+    def test_with_filters_and_ordering(self):
+        self.dragon_description.type = 'Hardcover'
+        self.dragon_description.save()
+
+        self.assertEqual(self.search('/books/?search=dragon&type=Hardcover'), [self.dragon_description.id])
+        self.assertEqual(self.search('/books/?search=dragon&ordering=-id'),
+                         [self.dragon_description.id, self.dragon_title.id])
+
+    def test_search_syntax_is_literal(self):
+        """Quotes and FTS operators are matched as words, not parsed"""
+        self.assertEqual(self.search('/books/?search=%22dragon%22+OR+*'), [])
+        self.assertEqual(self.search('/books/?search=%22%28%29'), [])
+
+    def test_empty_search(self):
+        self.assertEqual(len(self.search('/books/?search=')), 3)
+
+    def test_cursor_pagination(self):
+        response = self.client.get('/books/?search=dragon&cursor=')
+
+        self.assertEqual([book['id'] for book in response.data['results']],
+                         [self.dragon_title.id, self.dragon_description.id])
+
+    def test_nested(self):
+        self.assertEqual(self.search('/authors/1/books/?search=witch'), [self.other.id])
@@ -0,0 +1,74 @@
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from library.models import *
+from library.serializers import *
+
+
+class TestBookValuesSerializer(TestCase):
+    """Tests that BookValuesSerializer renders exactly what BookSerializer does"""
+
+    def setUp(self):
+        self.authors = [Author.objects.create(name=name) for name in ['Zoë Doe', 'John Doe', '村上 春樹']]
+        self.genres = [Genre.objects.create(name=name) for name in ['Fiction', 'Fantasy']]
+
+        self.full = Book.objects.create(
+            isbn='9.78E+12',
+            title='Test "quoted"  ',
+            type='Kindle Edition',
+            edition='1st',
+            pages=123,
+            rating=4,
+            rating_count=12,
+            review_count=123456,
+            image_url='http://google.com',
+            description='Line one\nLine two',
+        )
+        # Added out of id order
+        self.full.author.add(self.authors[2], self.authors[0])
+        self.full.genre.add(*self.genres)
+        Inventory.objects.create(
+            book=self.full,
+            owned=3,
+            available=2,
+        )
+
+        # Nulls, blanks, no relations and no inventory
+        self.empty = Book.objects.create(
+            title='Empty',
+            rating=3.75,
+        )
+
+    def render_both(self, queryset):
+        """
+        Renders queryset with both serializers
+        :return: (bytes, bytes), BookSerializer and BookValuesSerializer output
+        """
+        books = list(queryset.with_related())
+        rows = list(queryset.values(*BookValuesSerializer.columns))
+        renderer = JSONRenderer()
+        return (
+            renderer.render(BookSerializer(books, many=True).data),
+            renderer.render(BookValuesSerializer(rows, many=True).data),
+        )
+
+    def test_identical_output(self):
+        expected, actual = self.render_both(Book.objects.order_by('id'))
+        self.assertEqual(actual, expected)
+
+    def test_single_book(self):
+        book = Book.objects.with_related().get(id=self.full.id)
+        row = Book.objects.values(*BookValuesSerializer.columns).get(id=self.full.id)
+        self.assertEqual(BookValuesSerializer(row).data, BookSerializer(book).data)
+
+    def test_empty_page(self):
+        self.assertEqual(BookValuesSerializer([], many=True).data, [])
+
+    def test_endpoints(self):
+        """GET responses match BookSerializer"""
+        expected, actual = self.render_both(Book.objects.order_by('id'))
+        response = self.client.get('/books/', HTTP_ACCEPT='application/json')
+        self.assertIn(expected[1:-1], response.content)
+
+        book = Book.objects.with_related().get(id=self.full.id)
+        response = self.client.get('/books/{}/'.format(self.full.id), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.content, JSONRenderer().render(BookSerializer(book).data))
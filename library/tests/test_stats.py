@@ -0,0 +1,188 @@
+import csv
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+
+from django.core.cache import cache as default_cache
+from django.test import TestCase, override_settings
+from library.management.commands.load_book_data import load_csv
+from library.models import *
+from library.stats import STAT_FIELDS, rebuild_stats
+from library.tests.test_load_book_data import HEADER, ROWS
+
+
+class TestBookStats(TestCase):
+    """Tests that the stats maintained on Author and Genre stay the same as recomputing them, through every write"""
+
+    def setUp(self):
+        self.author = Author.objects.create(name='John Doe')
+        self.author2 = Author.objects.create(name='Jane Doe')
+        self.genre = Genre.objects.create(name='Fiction')
+        self.genre2 = Genre.objects.create(name='Fantasy')
+
+        self.book = Book.objects.create(title='Test', type='ebook', rating=4.5)
+        self.book.author.add(self.author, self.author2)
+        self.book.genre.add(self.genre)
+        Inventory.objects.create(book=self.book, owned=3, available=1)
+
+        self.book2 = Book.objects.create(title='Test2', type='Hardcover', rating=3)
+        self.book2.author.add(self.author)
+        Inventory.objects.create(book=self.book2, owned=2, available=2)
+
+        # No rating and no inventory
+        self.book3 = Book.objects.create(title='Test3', type='ebook')
+        self.book3.genre.add(self.genre)
+
+    def stats(self):
+        return (
+            list(Author.objects.order_by('id').values_list(*STAT_FIELDS)),
+            list(Genre.objects.order_by('id').values_list(*STAT_FIELDS)),
+        )
+
+    def assertStatsMatch(self):
+        maintained = self.stats()
+        rebuild_stats()
+        recomputed = self.stats()
+        for maintained_rows, recomputed_rows in zip(maintained, recomputed):
+            for maintained_row, recomputed_row in zip(maintained_rows, recomputed_rows):
+                for value, expected in zip(maintained_row, recomputed_row):
+                    if isinstance(expected, float):
+                        self.assertAlmostEqual(value, expected)
+                    else:
+                        self.assertEqual(value, expected)
+
+    def test_create(self):
+        self.author.refresh_from_db()
+        self.assertEqual((self.author.book_count, self.author.avg_rating, self.author.copies_owned), (2, 3.75, 5))
+        self.genre.refresh_from_db()
+        self.assertEqual((self.genre.book_count, self.genre.avg_rating, self.genre.copies_owned), (2, 4.5, 3))
+        self.genre2.refresh_from_db()
+        self.assertEqual((self.genre2.book_count, self.genre2.avg_rating, self.genre2.copies_owned), (0, None, 0))
+        self.assertStatsMatch()
+
+    def test_links(self):
+        self.genre2.book_set.add(self.book, self.book2, self.book3)
+        self.book.author.add(self.author)
+        self.assertStatsMatch()
+
+        # Removing what isn't linked changes nothing
+        self.book3.author.remove(self.author, self.author2)
+        self.book.genre.remove(self.genre2)
+        self.assertStatsMatch()
+
+        self.author.book_set.clear()
+        self.book3.genre.clear()
+        self.assertStatsMatch()
+
+    def test_rating(self):
+        self.book.rating = 2
+        self.book.save()
+        self.assertStatsMatch()
+
+        self.book.rating = None
+        self.book.save()
+        self.assertStatsMatch()
+
+        self.book3.rating = 5
+        self.book3.save()
+        self.assertStatsMatch()
+
+    def test_inventory(self):
+        inventory = self.book.inventory
+        inventory.owned = 5
+        inventory.save()
+        self.assertStatsMatch()
+
+        inventory.delete()
+        self.assertStatsMatch()
+
+        Inventory.objects.create(book=self.book3, owned=4, available=4)
+        self.assertStatsMatch()
+
+    def test_delete(self):
+        self.book.delete()
+        self.assertStatsMatch()
+
+        self.author2.delete()
+        self.genre.delete()
+        self.book2.delete()
+        self.assertStatsMatch()
+
+    def test_save_stale(self):
+        # Loaded before the links below, with no books
+        stale = Genre.objects.get(id=self.genre2.id)
+        self.genre2.book_set.add(self.book, self.book2)
+        stale.name = 'Renamed'
+        stale.save()
+        self.genre2.refresh_from_db()
+        self.assertEqual((self.genre2.name, self.genre2.book_count, self.genre2.copies_owned), ('Renamed', 2, 5))
+
+        self.book3.author.add(self.author2)
+        response = self.client.patch('/authors/{}/'.format(self.author2.id), {'name': 'Renamed'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.author2.refresh_from_db()
+        self.assertEqual((self.author2.name, self.author2.book_count), ('Renamed', 2))
+        self.assertStatsMatch()
+
+    def test_bulk(self):
+        response = self.client.post('/books/bulk/', [
+            {'title': 'Bulk', 'type': 'ebook', 'rating': 1, 'author': [self.author.id, 'New'], 'genre': ['Fantasy'],
+             'inventory': {'owned': 4, 'available': 4}},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertStatsMatch()
+
+        response = self.client.patch('/books/bulk/', [
+            {'id': self.book.id, 'rating': 1, 'author': [self.author2.id], 'inventory': {'owned': 1, 'available': 1}},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertStatsMatch()
+
+    def test_load_book_data(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(handle, 'w') as csv_file:
+                writer = csv.DictWriter(csv_file, HEADER)
+                writer.writeheader()
+                writer.writerows(ROWS)
+            with redirect_stdout(io.StringIO()):
+                load_csv(path, bulk=True)
+        finally:
+            os.remove(path)
+        self.assertStatsMatch()
+
+    def test_endpoints(self):
+        response = self.client.get('/authors/{}/stats/'.format(self.author.id))
+        self.assertEqual(response.data, {
+            'id': self.author.id,
+            'name': 'John Doe',
+            'book_count': 2,
+            'avg_rating': 3.75,
+            'copies_owned': 5,
+        })
+        self.assertEqual(self.client.get('/genres/{}/stats/'.format(self.genre2.id)).data['book_count'], 0)
+        self.assertEqual(self.client.get('/genres/100/stats/').status_code, 404)
+
+        response = self.client.get('/authors/?ordering=-book_count')
+        self.assertEqual([author['id'] for author in response.data['results']], [self.author.id, self.author2.id])
+
+        self.genre2.book_set.add(self.book2)
+        response = self.client.get('/genres/?ordering=avg_rating')
+        self.assertEqual([genre['id'] for genre in response.data['results']], [self.genre2.id, self.genre.id])
+
+    @override_settings(LIBRARY_RESPONSE_CACHE={'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300})
+    def test_cached_stats_invalidated(self):
+        default_cache.clear()
+        url = '/genres/{}/stats/'.format(self.genre.id)
+        self.assertEqual(self.client.get(url).json()['copies_owned'], 3)
+        self.assertEqual(self.client.get('/genres/?ordering=-book_count').json()['results'][0]['id'], self.genre.id)
+
+        inventory = self.book.inventory
+        inventory.owned = 10
+        inventory.save()
+        self.assertEqual(self.client.get(url).json()['copies_owned'], 10)
+
+        self.genre2.book_set.add(self.book, self.book2, self.book3)
+        self.assertEqual(self.client.get('/genres/?ordering=-book_count').json()['results'][0]['id'], self.genre2.id)
@@ -0,0 +1,95 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache as default_cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APIClient
+from library.models import *
+from library.timing import RequestTiming
+
+SAMPLE_ALL = {'SAMPLE_RATE': 1.0, 'HEADER': True, 'LOG': True}
+
+
+class TestTiming(APITestCase):
+    """Tests the Server-Timing header and log line of library.timing.TimingMiddleware"""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.author = Author.objects.create(name='John Doe')
+        self.genre = Genre.objects.create(name='Fiction')
+        for i in range(3):
+            book = Book.objects.create(title='Test{}'.format(i), type='ebook')
+            book.author.add(self.author)
+            book.genre.add(self.genre)
+            Inventory.objects.create(book=book, owned=1, available=1)
+
+    def get(self, url):
+        """
+        :return: (Response, dict, int), the response, its log line and how many queries it ran
+        """
+        with self.assertLogs('library.timing', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return response, json.loads(logs.records[0].getMessage()), len(context.captured_queries)
+
+    def test_off(self):
+        response = self.client.get('/books/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(LIBRARY_TIMING=SAMPLE_ALL)
+    def test_header(self):
+        response, record, queries = self.get('/genres/{}/books/'.format(self.genre.id))
+        metrics = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['db', 'db-slowest', 'serialize', 'render', 'total'])
+        self.assertIn('db;desc="', response['Server-Timing'])
+
+    @override_settings(LIBRARY_TIMING=SAMPLE_ALL)
+    def test_log(self):
+        for url in ('/books/', '/books/?search=test', '/genres/{}/books/'.format(self.genre.id), '/authors/'):
+            with self.subTest(url):
+                response, record, queries = self.get(url)
+                self.assertEqual(record['path'], url.split('?')[0])
+                self.assertEqual(record['status'], 200)
+                self.assertEqual(record['queries'], queries)
+                self.assertIn(record['slowest_sql'].split(' ')[0], ('SELECT', 'WITH'))
+                self.assertLessEqual(record['slowest_sql_ms'], record['sql_ms'])
+                self.assertGreater(record['serialize_ms'], 0)
+                self.assertGreater(record['render_ms'], 0)
+                self.assertLessEqual(record['sql_ms'] + record['render_ms'], record['total_ms'])
+
+    @override_settings(LIBRARY_TIMING=dict(SAMPLE_ALL, HEADER=False))
+    def test_writes(self):
+        with self.assertLogs('library.timing', 'INFO') as logs:
+            response = self.client.patch('/books/{}/'.format(Book.objects.first().id), {'title': 'New'}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn('Server-Timing', response)
+        self.assertGreater(json.loads(logs.records[0].getMessage())['queries'], 0)
+
+    @override_settings(
+        LIBRARY_TIMING=SAMPLE_ALL,
+        LIBRARY_RESPONSE_CACHE={'ENABLED': True, 'ALIAS': 'default', 'TIMEOUT': 300},
+    )
+    def test_cached(self):
+        default_cache.clear()
+        response, record, queries = self.get('/books/')
+        self.assertGreater(record['render_ms'], 0)
+
+        # A hit is neither serialized nor rendered again
+        response, record, queries = self.get('/books/')
+        self.assertEqual((record['serialize_ms'], record['render_ms']), (0, 0))
+
+    def test_threads(self):
+        timing = RequestTiming()
+
+        def query(index):
+            timing.execute(lambda *args: None, 'SELECT {}'.format(index), None, False, None)
+
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(query, range(2000)))
+        self.assertEqual(timing.queries, 2000)
+        self.assertGreaterEqual(timing.sql, timing.slowest)
+        self.assertTrue(timing.slowest_sql.startswith('SELECT '))
@@ -1,5 +1,6 @@
 from rest_framework.test import APIRequestFactory, APITestCase, APIClient
 from django.test import TestCase
+from Library.settings import API_PAGE_SIZE
 from library.models import *
 from library.views import *
 from library.serializers import *
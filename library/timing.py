@@ -0,0 +1,184 @@
+"""
+Per-request instrumentation: how many queries a request ran, how long they took, the slowest of them, and the time
+spent serializing and rendering the response.
+
+TimingMiddleware measures a sample of requests, set by LIBRARY_TIMING['SAMPLE_RATE'] in settings, and reports them in
+a Server-Timing header, which browsers show next to the request, and as a JSON log line on the library.timing logger.
+Requests that aren't sampled skip all of it, so the overhead with a rate of 0 is a random number per request.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+DEFAULTS = {
+    # Fraction of requests measured, between 0 and 1
+    'SAMPLE_RATE': 0.0,
+    'HEADER': True,
+    'LOG': True,
+    # Characters of the slowest statement kept in the log line
+    'SQL_LENGTH': 500,
+}
+
+logger = logging.getLogger('library.timing')
+
+# The RequestTiming of the request being handled, None when it isn't sampled
+_current = ContextVar('library_timing', default=None)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'LIBRARY_TIMING', {}))
+    return config
+
+
+def current():
+    """
+    :return: RequestTiming or None
+    """
+    return _current.get()
+
+
+class RequestTiming:
+    """Totals for one request, in seconds"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.slowest_sql = None
+        self.slowest = 0.0
+        self.parts = {'serialize': 0.0, 'render': 0.0}
+        # How many timed() blocks are open, so nested serializers aren't counted twice
+        self.depth = 0
+        self.render_start = None
+        # The query threads of library.parallel record their queries here too
+        self.lock = threading.Lock()
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper, see connection.execute_wrapper()"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.queries += 1
+                self.sql += elapsed
+                if elapsed >= self.slowest:
+                    self.slowest = elapsed
+                    self.slowest_sql = sql
+
+    def add(self, part, elapsed):
+        self.parts[part] += elapsed
+
+    def server_timing(self, total):
+        """
+        :param total: float, seconds the whole request took
+        :return: str, value of the Server-Timing header
+        """
+        metrics = [
+            'db;desc="{} queries";dur={:.2f}'.format(self.queries, self.sql * 1000),
+            'db-slowest;dur={:.2f}'.format(self.slowest * 1000),
+            'serialize;dur={:.2f}'.format(self.parts['serialize'] * 1000),
+            'render;dur={:.2f}'.format(self.parts['render'] * 1000),
+            'total;dur={:.2f}'.format(total * 1000),
+        ]
+        return ', '.join(metrics)
+
+    def record(self, request, response, total, sql_length):
+        """
+        :return: dict, the log line
+        """
+        return {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            'queries': self.queries,
+            'sql_ms': round(self.sql * 1000, 3),
+            'slowest_sql_ms': round(self.slowest * 1000, 3),
+            'slowest_sql': self.slowest_sql[:sql_length] if self.slowest_sql else None,
+            'serialize_ms': round(self.parts['serialize'] * 1000, 3),
+            'render_ms': round(self.parts['render'] * 1000, 3),
+        }
+
+
+@contextmanager
+def timed(part):
+    """
+    Adds the time the block takes to a part of the current request's timing, if it is sampled. Blocks nested in
+    another timed() block are only counted once, by the outer block.
+    :param part: str, 'serialize' or 'render'
+    """
+    timing = current()
+    if timing is None or timing.depth:
+        yield
+        return
+    timing.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.depth -= 1
+        timing.add(part, time.perf_counter() - start)
+
+
+class TimedSerializerMixin:
+    """
+    Counts the time DRF serializers spend in to_representation() towards the request's serialize time. Lists are
+    timed per item, so the query that fetches the page is left out.
+    """
+
+    def to_representation(self, instance):
+        if current() is None:
+            return super().to_representation(instance)
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+class TimingMiddleware:
+    """Measures a sample of requests, see the module docstring. Should come first in MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        rate = config['SAMPLE_RATE']
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(timing.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        if config['HEADER']:
+            response['Server-Timing'] = timing.server_timing(total)
+        if config['LOG']:
+            record = timing.record(request, response, total, config['SQL_LENGTH'])
+            logger.info(json.dumps(record), extra={'timing': record})
+        return response
+
+    def process_template_response(self, request, response):
+        """Called just before DRF responses are rendered, times the rendering"""
+        timing = current()
+        if timing is not None and not response.is_rendered:
+            timing.render_start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timing.add('render', time.perf_counter() - timing.render_start)
+            )
+        return response
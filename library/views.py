@@ -1,182 +1,92 @@
 from copy import deepcopy
 
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, generics, status
+from rest_framework.exceptions import ParseError
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from rest_framework.filters import OrderingFilter
 
+from library import cache, listing
+from library.batch import BookBatch
+from library.bulk import chunks
+from library.facets import FACETS, facet_counts
+from library.fieldsets import Fieldset
+from library.filters import BookListingFilter
+from library.mixins import CachedResponseMixin, NestedListMixin
 from library.models import *
+from library.renderers import CSVRenderer, NDJSONRenderer
+from library.search import BookSearchFilter
+from library.signals import after_write
 from library.serializers import *
-from Library.settings import API_PAGE_SIZE
 
 # HOST = 'http://localhost:8000'
 
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(CachedResponseMixin, NestedListMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all().order_by('id')
     serializer_class = AuthorSerializer
+    cache_tag = 'author'
+    cached_actions = ['list', 'retrieve', 'books', 'genres', 'stats']
+    # Read actions whose independent queries run concurrently under library.asgi, see library.parallel
+    concurrent_actions = ['list', 'retrieve', 'books', 'genres']
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['name']
-    ordering_fields = ['name']
+    ordering_fields = ['name', 'book_count', 'avg_rating']
 
     @action(methods=['get'], detail=True)
     def books(self, request, pk=None):
-        author = self.get_object()
-        books = author.book_set.all().order_by('id')
-        books_paginator = Paginator(books, API_PAGE_SIZE)
-
-        count = books.count()
-
-        # Set Pagination Info
-        path = 'http://{}/authors/{}/books/'.format(request.get_host(), pk)
-        page = request.query_params.get('page', '1')
-        page = int(page)
-        # Get Paginated Results
-        books = books_paginator.page(page)
-        serializer = BookSerializer(books, many=True)
-
-        # Calculate Page
-        if page * API_PAGE_SIZE < count:
-            next_page = path + '?page={}'.format(page + 1)
-        else:
-            next_page = None
-
-        if page > 2:
-            prev_page = path + '?page={}'.format(page - 1)
-        elif page == 2:
-            prev_page = path
-        else:
-            prev_page = None
-
-        return Response({
-            'count': count,
-            'next': next_page,
-            'previous': prev_page,
-            'results': serializer.data,
-        })
+        author = self.get_parent_object()
+        return self.nested_list(BookViewSet, author=author)
 
     @action(methods=['get'], detail=True)
     def genres(self, request, pk=None):
-        author = self.get_object()
-        genres = Genre.objects.filter(book__author=author).order_by('id')
-        genres_paginator = Paginator(genres, API_PAGE_SIZE)
-
-        count = genres.count()
-
-        # Set Pagination Info
-        path = 'http://{}/authors/{}/genres/'.format(request.get_host(), pk)
-        page = request.query_params.get('page', '1')
-        page = int(page)
-        # Get Paginated Results
-        genres = genres_paginator.page(page).object_list
-        serializer = GenreSerializer(genres, many=True)
-
-        # Calculate Page
-        if page * API_PAGE_SIZE < count:
-            next_page = path + '?page={}'.format(page + 1)
-        else:
-            next_page = None
-
-        if page > 2:
-            prev_page = path + '?page={}'.format(page - 1)
-        elif page == 2:
-            prev_page = path
-        else:
-            prev_page = None
+        author = self.get_parent_object()
+        return self.nested_list(GenreViewSet, distinct=True, book__author=author)
 
-        return Response({
-            'count': count,
-            'next': next_page,
-            'previous': prev_page,
-            'results': serializer.data,
-        })
+    @action(methods=['get'], detail=True)
+    def stats(self, request, pk=None):
+        """Number of books, their average rating and the copies of them owned"""
+        return Response(AuthorStatsSerializer(self.get_parent_object()).data)
 
 
-class GenreViewSet(viewsets.ModelViewSet):
+class GenreViewSet(CachedResponseMixin, NestedListMixin, viewsets.ModelViewSet):
     queryset = Genre.objects.all().order_by('id')
     serializer_class = GenreSerializer
+    cache_tag = 'genre'
+    cached_actions = ['list', 'retrieve', 'books', 'authors', 'stats']
+    # Read actions whose independent queries run concurrently under library.asgi, see library.parallel
+    concurrent_actions = ['list', 'retrieve', 'books', 'authors']
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['name']
-    ordering_fields = ['name']
+    ordering_fields = ['name', 'book_count', 'avg_rating']
 
     @action(methods=['get'], detail=True)
     def books(self, request, pk=None):
-        genre = self.get_object()
-        books = genre.book_set.all().order_by('id')
-        books_paginator = Paginator(books, API_PAGE_SIZE)
-
-        count = books.count()
-
-        # Set Pagination Info
-        path = 'http://{}/genres/{}/books/'.format(request.get_host(), pk)
-        page = request.query_params.get('page', '1')
-        page = int(page)
-        # Get Paginated Results
-        books = books_paginator.page(page)
-        serializer = BookSerializer(books, many=True)
-
-        if page * API_PAGE_SIZE < count:
-            next_page = path + '?page={}'.format(page + 1)
-        else:
-            next_page = None
-
-        if page > 2:
-            prev_page = path + '?page={}'.format(page - 1)
-        elif page == 2:
-            prev_page = path
-        else:
-            prev_page = None
-
-        return Response({
-            'count': count,
-            'next': next_page,
-            'previous': prev_page,
-            'results': serializer.data,
-        })
+        genre = self.get_parent_object()
+        return self.nested_list(BookViewSet, genre=genre)
 
     @action(methods=['get'], detail=True)
     def authors(self, request, pk=None):
-        genre = self.get_object()
-        authors = Author.objects.filter(book__genre=genre).order_by('id')
-        authors_paginator = Paginator(authors, API_PAGE_SIZE)
-
-        count = authors.count()
-
-        # Set Pagination Info
-        path = 'http://{}/genres/{}/authors/'.format(request.get_host(), pk)
-        page = request.query_params.get('page', '1')
-        page = int(page)
-        # Get Paginated Results
-        authors = authors_paginator.page(page).object_list
-        serializer = GenreSerializer(authors, many=True)
-
-        # Calculate Page
-        if page * API_PAGE_SIZE < count:
-            next_page = path + '?page={}'.format(page + 1)
-        else:
-            next_page = None
-
-        if page > 2:
-            prev_page = path + '?page={}'.format(page - 1)
-        elif page == 2:
-            prev_page = path
-        else:
-            prev_page = None
+        genre = self.get_parent_object()
+        return self.nested_list(AuthorViewSet, distinct=True, book__genre=genre)
 
-        return Response({
-            'count': count,
-            'next': next_page,
-            'previous': prev_page,
-            'results': serializer.data,
-        })
+    @action(methods=['get'], detail=True)
+    def stats(self, request, pk=None):
+        """Number of books, their average rating and the copies of them owned"""
+        return Response(GenreStatsSerializer(self.get_parent_object()).data)
 
 
-class BookViewSet(viewsets.ModelViewSet):
-    queryset = Book.objects.all().order_by('id')
+class BookViewSet(CachedResponseMixin, viewsets.ModelViewSet):
+    queryset = Book.objects.with_related().order_by('id')
     serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    cache_tag = 'book'
+    # Read actions whose independent queries run concurrently under library.asgi, see library.parallel
+    concurrent_actions = ['list', 'retrieve']
+    # Search comes before ordering so that an explicit ?ordering= takes precedence over relevance
+    filter_backends = [DjangoFilterBackend, BookSearchFilter, OrderingFilter]
     filterset_fields = [
         'isbn',
         'title',
@@ -196,6 +106,217 @@ class BookViewSet(viewsets.ModelViewSet):
         'rating',
         'edition',
     ]
+    # Serve list and retrieve from values() rows with BookValuesSerializer
+    fast_read = True
+    # Serve list and retrieve from the BookListing table, except searches
+    read_from_listing = True
+    # Most books in one POST or PATCH /books/bulk/
+    bulk_limit = 1000
+    # Books read and rendered at a time by GET /books/export/
+    export_chunk_size = 2000
+    # ?facets=genre,type,author adds the number of matching books per value of each facet to paginated listings,
+    # ?facet_size= sets how many of the most common values are returned
+    facets_query_param = 'facets'
+    facet_size_query_param = 'facet_size'
+    facet_size = 10
+    max_facet_size = 100
+    # ?fields=title,inventory.available returns only those fields of each book, ?omit=description all but those
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def use_values_serializer(self):
+        """Checks whether this request only reads books, so BookValuesSerializer can be used"""
+        return self.fast_read and self.request.method in ('GET', 'HEAD') and self.action in ('list', 'retrieve')
+
+    def use_listing(self):
+        """Checks whether this request can be read from BookListing, i.e. it only reads books and doesn't search"""
+        return self.read_from_listing and self.use_values_serializer() and \
+            not self.request.query_params.get(BookSearchFilter.search_param, '').strip()
+
+    @property
+    def filterset_class(self):
+        # None makes DjangoFilterBackend build the filters from filterset_fields
+        return BookListingFilter if self.use_listing() else None
+
+    def get_fieldset(self):
+        """
+        :return: Fieldset or None, the fields asked for with ?fields= and ?omit=, None for all of them or if the
+            request doesn't read books
+        """
+        if self.request.method not in ('GET', 'HEAD') or self.action not in ('list', 'retrieve'):
+            return None
+        return Fieldset.from_query_params(self.request.query_params, self.fields_query_param, self.omit_query_param)
+
+    def get_columns(self, serializer_class, fieldset):
+        """
+        :param serializer_class: BookValuesSerializer or BookListingSerializer
+        :param fieldset: Fieldset or None
+        :return: list of str, the columns the serializer needs, plus the ones keyset pagination reads the ordering from
+        """
+        columns = serializer_class.get_columns(fieldset)
+        if fieldset is None:
+            return columns
+        ordering = OrderingFilter().get_ordering(self.request, None, self) or []
+        return list(dict.fromkeys(columns + [field.lstrip('-') for field in ordering]))
+
+    def get_queryset(self):
+        fieldset = self.get_fieldset()
+        if self.use_listing():
+            return BookListing.objects.order_by('id').values(*self.get_columns(BookListingSerializer, fieldset))
+        queryset = super().get_queryset()
+        if self.use_values_serializer():
+            # values() does the inventory join itself and BookValuesSerializer fetches authors and genres
+            return queryset.prefetch_related(None).values(*self.get_columns(BookValuesSerializer, fieldset))
+        if fieldset is not None:
+            # Only the columns and relations BookSerializer will return, the inventory columns of
+            # BookValuesSerializer are the lookups only() takes
+            queryset = queryset.select_related(None).prefetch_related(None).with_related(
+                author='author' in fieldset, genre='genre' in fieldset, inventory='inventory' in fieldset,
+            ).only(*self.get_columns(BookValuesSerializer, fieldset))
+        return queryset
+
+    def filter_related(self, queryset, **lookups):
+        """
+        Restricts queryset to the books matching lookups on Book, for listings nested under another resource
+        :param lookups: filter arguments on Book, e.g. author=author
+        :return: QuerySet
+        """
+        if self.use_listing():
+            return queryset.filter(id__in=Book.objects.filter(**lookups).values('id'))
+        return queryset.filter(**lookups)
+
+    def get_facet_names(self):
+        """
+        :return: list of str or None, the facets asked for in the query parameters, None if none were
+        """
+        param = self.request.query_params.get(self.facets_query_param, '')
+        names = [name.strip() for name in param.split(',') if name.strip()]
+        unknown = [name for name in names if name not in FACETS]
+        if unknown:
+            raise ParseError('Unknown facets: {}. Choose from: {}.'.format(', '.join(unknown), ', '.join(FACETS)))
+        return list(dict.fromkeys(names)) or None
+
+    def get_facet_size(self):
+        try:
+            size = int(self.request.query_params.get(self.facet_size_query_param, self.facet_size))
+        except ValueError:
+            raise ParseError('{} must be a number.'.format(self.facet_size_query_param))
+        return max(1, min(size, self.max_facet_size))
+
+    def paginate_queryset(self, queryset):
+        # Counted over the filtered books, before they are cut down to a page
+        names = self.get_facet_names()
+        self.facets = facet_counts(queryset, names, self.get_facet_size()) if names else None
+        return super().paginate_queryset(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if getattr(self, 'facets', None) is not None:
+            response.data['facets'] = self.facets
+        return response
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def get_serializer(self, *args, **kwargs):
+        if self.use_listing():
+            kwargs['context'] = self.get_serializer_context()
+            return BookListingSerializer(*args, **kwargs)
+        if self.use_values_serializer():
+            kwargs['context'] = self.get_serializer_context()
+            return BookValuesSerializer(*args, **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+    @action(methods=['post', 'patch'], detail=False)
+    def bulk(self, request):
+        """
+        Creates (POST) or updates (PATCH) a list of books in one transaction. Returns the result of each book: 201 or
+        200 with its id, or the errors that kept it from being written. The response is 201 or 200 if every book was
+        written, 207 if only some were and 400 if none were.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'reason': 'Expected a list of books.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.bulk_limit:
+            data = {
+                'reason': 'At most {} books per request.'.format(self.bulk_limit),
+            }
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+        batch = BookBatch(self.valid_inventory)
+        if request.method == 'POST':
+            results = batch.create(request.data)
+            success = status.HTTP_201_CREATED
+        else:
+            results = batch.update(request.data)
+            success = status.HTTP_200_OK
+
+        written = sum(1 for item in results if item['status'] == success)
+        if written == len(results):
+            response_status = success
+        elif written:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=response_status)
+
+    @action(methods=['get'], detail=False, renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Streams the whole catalog ordered by id, as NDJSON (?format=ndjson, the default) or in the format of
+        book_data.csv (?format=csv). Rows come from BookListing through a server-side cursor and are rendered a chunk
+        at a time, so memory use doesn't grow with the catalog.
+        """
+        rows = BookListing.objects.order_by('id').values(*BookListingSerializer.columns).iterator(
+            chunk_size=self.export_chunk_size,
+        )
+        books = (BookListingSerializer(batch, many=True).data for batch in chunks(rows, self.export_chunk_size))
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(books),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset),
+        )
+        response['Content-Disposition'] = 'attachment; filename="books.{}"'.format(renderer.extension)
+        return response
+
+    @action(methods=['post'], detail=True)
+    def checkout(self, request, pk=None):
+        """Takes a copy of the book out of the library"""
+        return self.change_available(pk, Inventory.objects.check_out, 'No copies available.')
+
+    @action(methods=['post'], detail=True, url_path='return', url_name='return')
+    def return_copy(self, request, pk=None):
+        """Returns a copy of the book to the library"""
+        return self.change_available(pk, Inventory.objects.check_in, 'All copies are already returned.')
+
+    def change_available(self, pk, update, conflict_reason):
+        """
+        Checks a copy out or in with a conditional UPDATE instead of reading and writing back the inventory, so that
+        concurrent requests never overwrite each other
+        :param pk: str, book id from the url
+        :param update: Inventory.objects.check_out or check_in
+        :param conflict_reason: str, reason given when there is no copy to check out or in
+        :return: Response, the inventory after the change, 409 if nothing changed or 404
+        """
+        try:
+            book_id = int(pk)
+        except ValueError:
+            return Response({'reason': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            if not update(book_id):
+                if not Inventory.objects.filter(book_id=book_id).exists():
+                    return Response({'reason': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+                return Response({'reason': conflict_reason}, status=status.HTTP_409_CONFLICT)
+
+            # queryset.update() sends no signals
+            inventory = Inventory.objects.values('available', 'owned').get(book_id=book_id)
+            listing.set_inventory(book_id, **inventory)
+            after_write(cache.invalidate_book_content, [book_id])
+
+        return Response(InventorySerializer(inventory).data)
 
     @staticmethod
     def valid_inventory(inventory_data):
@@ -370,6 +491,12 @@ class BookViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['GET'])
+def cache_stats(request):
+    """Hit and miss counters of the response cache"""
+    return Response(cache.stats())
+
+
 class InventoryViewSet(viewsets.ModelViewSet):
     queryset = Inventory.objects.all()
     serializer_class = InventorySerializer